@@ -1,5 +1,6 @@
-from flask import Flask, request, render_template, send_file, flash, jsonify
+from flask import Flask, request, render_template, send_file, flash, jsonify, g, Response, make_response
 import os
+import functools
 import io
 import json
 import secrets
@@ -9,6 +10,15 @@ from logging.handlers import RotatingFileHandler
 from werkzeug.utils import secure_filename
 from label_generator import LabelGenerator
 from label_generator_3x1 import LabelGenerator3x1
+from label_layout import LABEL_SIZES, compile_layout
+from sheet_layout import sheet_from_form
+from job_queue import LabelJobQueue
+from config_service import shared_config
+from batch_cache import shared_batch_cache, file_digest
+import label_bundle
+from timing import job_log_line
+from metrics import UPLOADS, REQUEST_SECONDS, SYNC_IN_PROGRESS, record_generation, exposition
+from profiling import RequestProfiler, profiling_enabled, requested_mode, shared_profile_store
 import tempfile
 
 app = Flask(__name__)
@@ -49,7 +59,7 @@ app.logger.info('Label Generator application startup')
 # Cleanup orphaned temp files on startup
 def cleanup_orphaned_temp_files(max_age_hours=24):
     """
-    Delete orphaned temp PDF files on application startup.
+    Delete orphaned temp output files (any of LABEL_FORMATS) on application startup.
     This catches files that were left behind from service restarts or crashes.
 
     Args:
@@ -63,9 +73,10 @@ def cleanup_orphaned_temp_files(max_age_hours=24):
         deleted_count = 0
         deleted_size = 0
 
-        # Find all tmp*.pdf files in temp directory
+        # Find all tmp*.pdf, tmp*.zpl, tmp*.pbm and tmp*.zip files in temp directory
+        suffixes = tuple(f'.{label_format}' for label_format in LABEL_FORMATS)
         for filename in os.listdir(temp_dir):
-            if filename.startswith('tmp') and filename.endswith('.pdf'):
+            if filename.startswith('tmp') and filename.endswith(suffixes):
                 filepath = os.path.join(temp_dir, filename)
                 try:
                     # Check file age
@@ -87,22 +98,112 @@ def cleanup_orphaned_temp_files(max_age_hours=24):
     except Exception as e:
         app.logger.error(f'Error during startup temp file cleanup: {e}', exc_info=True)
 
+ALLOWED_EXTENSIONS = {'xlsx', 'csv'}
+
+# Output formats and the content type each is served with
+LABEL_FORMATS = {
+    'pdf': 'application/pdf',
+    'zpl': 'text/plain',
+    'pbm': 'image/x-portable-bitmap',
+    'zip': 'application/zip'
+}
+
 # Run cleanup on startup
 cleanup_orphaned_temp_files()
 
-ALLOWED_EXTENSIONS = {'xlsx', 'csv'}
-
 # Track temp files for cleanup on next request (allows re-download if needed)
 previous_temp_files = []
 
+# Background label jobs for large files (status is shared between workers on disk)
+job_queue = LabelJobQueue(logger=app.logger)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def selected_label_size(label_size):
+    """Label size to render: the selected one if it exists, otherwise the 2x1 default"""
+    return label_size if label_size in LABEL_SIZES else '2x1'
+
+def create_generator(label_size, label_format='pdf', sheet=None):
+    """Create the label generator for the selected label size (2x1 is the default), output format and sheet layout"""
+    if label_size == '3x1':
+        generator = LabelGenerator3x1()
+    else:
+        # 3x1 labels carry a Code 128 order barcode; every other size uses the DataMatrix generator
+        generator = LabelGenerator(selected_label_size(label_size))
+    generator.label_format = label_format
+    generator.sheet = sheet
+    return generator
+
+def requested_sheet(label_size, label_format):
+    """
+    Sheet layout selected by the sheet form fields, or None for one label per page.
+
+    Raises:
+        ValueError: If the fields are invalid, the grid does not fit or the output is not a PDF
+    """
+    sheet = sheet_from_form(request.form, compile_layout(selected_label_size(label_size)).page_size)
+    if sheet is not None and label_format != 'pdf':
+        raise ValueError('sheet output requires label_format "pdf"')
+    return sheet
+
+def load_validated_batch(file, label_size):
+    """Parsed batch saved by /api/validate for this file (batch_token form field), or None"""
+    batch_token = request.form.get('batch_token')
+    if not batch_token:
+        return None
+
+    file_bytes = file.read()
+    file.seek(0)
+    batch, reason = shared_batch_cache.get(batch_token, file_digest(file_bytes), shared_config.snapshot().version, label_size)
+    if batch is None:
+        app.logger.info(f'Batch token not used for {file.filename} ({reason}); parsing the upload')
+    return batch
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request_duration(response):
+    """Record every request's duration by route pattern (so job IDs don't create new series)"""
+    started = getattr(g, 'request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.labels(endpoint, request.method, str(response.status_code)).observe(time.perf_counter() - started)
+    return response
+
+def profiled(view):
+    """
+    Profile a request when LABEL_PROFILING is enabled and the request asks for it
+    (X-Profile header or ?profile= flag: 1 / cprofile, or sampling). The saved
+    profile's ID is returned in the X-Profile-Id header.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        mode = requested_mode(request.headers.get('X-Profile'), request.args.get('profile'))
+        if mode is None:
+            return view(*args, **kwargs)
+
+        with RequestProfiler(mode) as profiler:
+            response = make_response(view(*args, **kwargs))
+
+        upload = request.files.get('file')
+        profile_id = shared_profile_store.save(
+            profiler, endpoint=request.path, filename=upload.filename if upload else None,
+            status=response.status_code, label_size=request.form.get('label_size', '2x1')
+        )
+        app.logger.info(f'Saved {mode} profile {profile_id} for {request.path} ({profiler.duration:.3f}s)')
+        response.headers['X-Profile-Id'] = profile_id
+        return response
+    return wrapper
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/upload', methods=['POST'])
+@profiled
 def upload_file():
     global previous_temp_files
 
@@ -134,49 +235,213 @@ def upload_file():
         # Get label size selection (default to 2x1 for backward compatibility)
         label_size = request.form.get('label_size', '2x1')
 
-        app.logger.info(f'Processing upload: {file.filename}, label_size: {label_size}')
+        # Output format: PDF (default), ZPL II for Zebra printers, or 1-bit bitmaps (PBM stream / ZIP of PNGs)
+        label_format = request.form.get('label_format', 'pdf')
+        if label_format not in LABEL_FORMATS:
+            app.logger.warning(f'Upload attempt with invalid label_format: {label_format}')
+            return jsonify({'error': 'label_format must be one of "pdf", "zpl", "pbm" or "zip"'}), 400
+
+        # Sheet stock: labels in a grid, several per PDF page
+        try:
+            sheet = requested_sheet(label_size, label_format)
+        except ValueError as e:
+            app.logger.warning(f'Upload attempt with invalid sheet layout: {str(e)}')
+            return jsonify({'error': str(e)}), 400
+
+        # Processing mode: 'sync' renders in this request, 'async' queues a background job
+        mode = request.form.get('mode', 'sync')
+
+        # Also record a bundle for re-rendering without the spreadsheet (background jobs only)
+        bundle = request.form.get('bundle', 'false').lower() in ('1', 'true', 'yes', 'on')
+        if bundle and mode != 'async':
+            app.logger.warning(f'Upload attempt with bundle in {mode} mode: {file.filename}')
+            return jsonify({'error': 'bundle requires mode "async"'}), 400
+
+        UPLOADS.labels(mode).inc()
+
+        # Rows already parsed by /api/validate for this file skip reading and parsing
+        batch = load_validated_batch(file, label_size)
+
+        if mode == 'async':
+            job_id = job_queue.submit(lambda: create_generator(label_size, sheet=sheet), file.filename, file.read(), label_size, label_format, batch, bundle)
+            app.logger.info(f'Queued job {job_id}: {file.filename}, label_size: {label_size}, label_format: {label_format}, bundle: {bundle}')
+            job = {
+                'job_id': job_id,
+                'status_url': f'/jobs/{job_id}',
+                f'{label_format}_url': f'/jobs/{job_id}/{label_format}'
+            }
+            if bundle:
+                job['bundle_url'] = f'/jobs/{job_id}/bundle'
+            return jsonify(job), 202
+
+        app.logger.info(f'Processing upload: {file.filename}, label_size: {label_size}, label_format: {label_format}')
 
         # Create appropriate label generator instance based on selection
-        if label_size == '3x1':
-            generator = LabelGenerator3x1()
-        else:
-            generator = LabelGenerator()
+        generator = create_generator(label_size, label_format, sheet)
+
+        # Create a temporary file and render the labels straight into it (no in-memory copies)
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=f'.{label_format}')
+
+        # Track temp file for cleanup on next request (allows re-download if needed)
+        previous_temp_files.append(temp_file.name)
+        app.logger.debug(f'Created temp file: {temp_file.name} (will cleanup on next request)')
+
+        # Fields of the structured log line written when the upload finishes
+        job_fields = {'event': 'label_upload', 'filename': file.filename, 'label_size': label_size,
+                      'label_format': label_format, 'batch_reused': batch is not None}
 
         # Process the file and generate PDF
         try:
-            pdf_buffer, label_count = generator.process_file_and_generate_pdf(file)
+            with temp_file, SYNC_IN_PROGRESS.track_inprogress():
+                if batch is not None:
+                    _, label_count = generator.render_batch(batch, output=temp_file)
+                else:
+                    _, label_count = generator.process_file_and_generate_pdf(file, output=temp_file)
             app.logger.info(f'Successfully generated {label_count} labels from {file.filename}')
+            app.logger.info(f'DataMatrix disk cache: {generator.disk_cache.stats()}')
+            app.logger.info(f'Item name parse cache: {generator.parse_cache.stats()}')
+            app.logger.info(job_log_line(generator.timings, **job_fields, state='done'))
+            record_generation(generator, 'upload', 'done', generator.layout.name, label_format, temp_file.name)
         except ValueError as e:
             app.logger.error(f'Validation error processing {file.filename}: {str(e)}')
+            app.logger.info(job_log_line(generator.timings, **job_fields, state='failed', error=str(e)))
+            record_generation(generator, 'upload', 'invalid', generator.layout.name, label_format)
             return jsonify({'error': str(e)}), 400
         except Exception as e:
             app.logger.error(f'Error processing {file.filename}: {str(e)}', exc_info=True)
+            app.logger.info(job_log_line(generator.timings, **job_fields, state='failed', error=str(e)))
+            record_generation(generator, 'upload', 'error', generator.layout.name, label_format)
             return jsonify({'error': f'Error processing file: {str(e)}'}), 500
 
-        # Create a temporary file for the PDF
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        temp_file.write(pdf_buffer.getvalue())
-        temp_file.close()
-
-        # Track temp file for cleanup on next request (allows re-download if needed)
-        previous_temp_files.append(temp_file.name)
-        app.logger.debug(f'Created temp file: {temp_file.name} (will cleanup on next request)')
-
-        # Return the PDF file with label count in header
+        # Stream the output file from disk with label count in header
         response = send_file(
             temp_file.name,
             as_attachment=True,
-            download_name=f'labels_{secure_filename(file.filename)}.pdf',
-            mimetype='application/pdf'
+            download_name=f'labels_{secure_filename(file.filename)}.{label_format}',
+            mimetype=LABEL_FORMATS[label_format]
         )
         response.headers['X-Label-Count'] = str(label_count)
+        response.headers['X-Batch-Reused'] = 'true' if batch is not None else 'false'
+        response.headers['Server-Timing'] = generator.timings.server_timing()
         return response
 
     except Exception as e:
         app.logger.error(f'Unexpected error in upload: {str(e)}', exc_info=True)
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Get the state and progress of a background label job"""
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/<any(pdf, zpl, pbm, zip):label_format>', methods=['GET'])
+def job_output(job_id, label_format):
+    """Download the output of a finished background label job"""
+    status = job_queue.status(job_id)
+    if status is None or status.get('label_format', 'pdf') != label_format:
+        return jsonify({'error': 'Job not found'}), 404
+
+    if status['state'] == 'failed':
+        return jsonify({'error': status['error']}), 400
+    if status['state'] != 'done':
+        return jsonify({'error': f'Job is not finished (state: {status["state"]})'}), 409
+
+    output_path = job_queue.output_path(job_id, label_format)
+    if not output_path:
+        return jsonify({'error': 'Job output not found'}), 404
+
+    response = send_file(
+        output_path,
+        as_attachment=True,
+        download_name=f'labels_{secure_filename(status["filename"])}.{label_format}',
+        mimetype=LABEL_FORMATS[label_format]
+    )
+    response.headers['X-Label-Count'] = str(status['label_count'])
+    return response
+
+@app.route('/jobs/<job_id>/bundle', methods=['GET'])
+def job_bundle(job_id):
+    """Download the bundle recorded by a finished background label job"""
+    status = job_queue.status(job_id)
+    if status is None or not status.get('bundle'):
+        return jsonify({'error': 'Job not found'}), 404
+
+    if status['state'] == 'failed':
+        return jsonify({'error': status['error']}), 400
+    if status['state'] != 'done':
+        return jsonify({'error': f'Job is not finished (state: {status["state"]})'}), 409
+
+    bundle_path = job_queue.output_path(job_id, 'bundle')
+    if not bundle_path:
+        return jsonify({'error': 'Job bundle not found'}), 404
+
+    return send_file(
+        bundle_path,
+        as_attachment=True,
+        download_name=f'labels_{secure_filename(status["filename"])}.bundle.zip',
+        mimetype='application/zip'
+    )
+
+@app.route('/api/bundles/render', methods=['POST'])
+def render_bundle():
+    """Re-render a bundle recorded by a background job, without the spreadsheet or any downloads"""
+    global previous_temp_files
+
+    if 'bundle' not in request.files or request.files['bundle'].filename == '':
+        app.logger.warning('Bundle render attempt with no bundle')
+        return jsonify({'error': 'No bundle selected'}), 400
+    file = request.files['bundle']
+
+    label_format = request.form.get('label_format', 'pdf')
+    if label_format not in LABEL_FORMATS:
+        app.logger.warning(f'Bundle render attempt with invalid label_format: {label_format}')
+        return jsonify({'error': 'label_format must be one of "pdf", "zpl", "pbm" or "zip"'}), 400
+
+    try:
+        bundle = label_bundle.read_bundle(io.BytesIO(file.read()))
+    except ValueError as e:
+        app.logger.warning(f'Bundle render attempt with invalid bundle {file.filename}: {str(e)}')
+        return jsonify({'error': str(e)}), 400
+
+    # Render at the recorded label size unless another one is selected
+    label_size = request.form.get('label_size') or bundle.label_size
+    try:
+        sheet = requested_sheet(label_size, label_format)
+    except ValueError as e:
+        app.logger.warning(f'Bundle render attempt with invalid sheet layout: {str(e)}')
+        return jsonify({'error': str(e)}), 400
+    generator = create_generator(label_size, label_format, sheet)
+
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=f'.{label_format}')
+    previous_temp_files.append(temp_file.name)
+
+    try:
+        with temp_file:
+            _, label_count = generator.render_bundle(bundle, output=temp_file)
+        app.logger.info(f'Rendered {label_count} labels from bundle {file.filename}, label_size: {label_size}, label_format: {label_format}')
+        app.logger.info(job_log_line(generator.timings, event='bundle_render', state='done', filename=file.filename,
+                                     label_size=label_size, label_format=label_format))
+        record_generation(generator, 'bundle', 'done', generator.layout.name, label_format, temp_file.name)
+    except Exception as e:
+        app.logger.error(f'Error rendering bundle {file.filename}: {str(e)}', exc_info=True)
+        record_generation(generator, 'bundle', 'error', generator.layout.name, label_format)
+        return jsonify({'error': f'Error rendering bundle: {str(e)}'}), 500
+
+    response = send_file(
+        temp_file.name,
+        as_attachment=True,
+        download_name=f'labels_{secure_filename(file.filename)}.{label_format}',
+        mimetype=LABEL_FORMATS[label_format]
+    )
+    response.headers['X-Label-Count'] = str(label_count)
+    response.headers['Server-Timing'] = generator.timings.server_timing()
+    return response
+
 @app.route('/api/validate', methods=['POST'])
+@profiled
 def validate_file():
     """Validate file and return detailed report of matched/unmatched rows"""
     try:
@@ -199,16 +464,28 @@ def validate_file():
         app.logger.info(f'Validating file: {file.filename}, label_size: {label_size}')
 
         # Create appropriate label generator instance based on selection
-        if label_size == '3x1':
-            generator = LabelGenerator3x1()
-        else:
-            generator = LabelGenerator()
+        generator = create_generator(label_size)
 
         # Validate the file and generate report
         try:
-            report = generator.validate_file_and_generate_report(file)
+            file_bytes = file.read()
+            file.seek(0)
+            df = generator.read_upload(file)
+            with generator.timings.span('validate'):
+                report = generator.validate_dataframe(df)
+
+            # Keep the parsed rows so /upload can skip parsing when it gets the same file and this token
+            try:
+                batch = generator.parse_batch(df)
+                report['batch_token'] = shared_batch_cache.put(batch, file_digest(file_bytes), generator.config_version, label_size)
+            except ValueError:
+                report['batch_token'] = None  # Nothing printable in this file
+
             app.logger.info(f'Validation completed for {file.filename}')
-            return jsonify(report), 200
+            app.logger.info(f'Item name parse cache: {generator.parse_cache.stats()}')
+            response = jsonify(report)
+            response.headers['Server-Timing'] = generator.timings.server_timing()
+            return response, 200
         except ValueError as e:
             app.logger.error(f'Validation error for {file.filename}: {str(e)}')
             return jsonify({'error': str(e)}), 400
@@ -225,7 +502,7 @@ def validate_file():
 def get_settings():
     """Get current product mappings configuration"""
     try:
-        config_file = 'product_mappings.json'
+        config_file = shared_config.config_file
         if os.path.exists(config_file):
             with open(config_file, 'r', encoding='utf-8') as f:
                 config = json.load(f)
@@ -295,19 +572,17 @@ def save_settings():
             return jsonify({'error': 'overflow_name must be a non-empty string'}), 400
 
         # Validate default_label_size
-        if data['default_label_size'] not in ['2x1', '3x1']:
+        if data['default_label_size'] not in LABEL_SIZES:
             app.logger.warning(f'Settings save attempt with invalid default_label_size: {data.get("default_label_size")}')
-            return jsonify({'error': 'default_label_size must be either "2x1" or "3x1"'}), 400
+            return jsonify({'error': 'default_label_size must be one of "2x1", "3x1", "4x2" or "4x6"'}), 400
 
         # Validate deadman_mode
         if not isinstance(data['deadman_mode'], bool):
             app.logger.warning(f'Settings save attempt with invalid deadman_mode: {data.get("deadman_mode")}')
             return jsonify({'error': 'deadman_mode must be a boolean'}), 400
 
-        # Save to file
-        config_file = 'product_mappings.json'
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        # Save to file atomically so other workers never read a partial file
+        shared_config.save(data)
 
         app.logger.info(f'Settings saved successfully (product_types: {len(data["product_types"])}, rules: {len(data["shortening_rules"])})')
         return jsonify({'message': 'Settings saved successfully'})
@@ -320,7 +595,7 @@ def save_settings():
 def export_settings():
     """Export current settings as downloadable JSON file"""
     try:
-        config_file = 'product_mappings.json'
+        config_file = shared_config.config_file
         if os.path.exists(config_file):
             app.logger.info('Settings exported successfully')
             return send_file(
@@ -368,10 +643,8 @@ def import_settings():
             app.logger.warning(f'Invalid data types in {file.filename}')
             return jsonify({'error': 'Invalid data types in configuration'}), 400
 
-        # Save the imported configuration
-        config_file = 'product_mappings.json'
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        # Save the imported configuration atomically
+        shared_config.save(data)
 
         app.logger.info(f'Settings imported successfully from {file.filename}')
         return jsonify({'message': 'Settings imported successfully'})
@@ -387,6 +660,34 @@ def import_settings():
 def health_check():
     return jsonify({'status': 'healthy'})
 
+@app.route('/profiles', methods=['GET'])
+def list_profiles():
+    """Saved request profiles, newest first (only while LABEL_PROFILING is enabled)"""
+    if not profiling_enabled():
+        return jsonify({'error': 'Profiling is not enabled'}), 404
+    return jsonify({'profiles': shared_profile_store.list()})
+
+@app.route('/profiles/<profile_id>/<any(pstats, collapsed):kind>', methods=['GET'])
+def download_profile(profile_id, kind):
+    """Download a saved profile as pstats data or collapsed stacks for flame graphs"""
+    if not profiling_enabled():
+        return jsonify({'error': 'Profiling is not enabled'}), 404
+    path = shared_profile_store.path(profile_id, kind)
+    if not path:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(
+        path,
+        as_attachment=True,
+        download_name=os.path.basename(path),
+        mimetype='application/octet-stream' if kind == 'pstats' else 'text/plain'
+    )
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics, added up across all gunicorn workers"""
+    body, content_type = exposition()
+    return Response(body, content_type=content_type)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
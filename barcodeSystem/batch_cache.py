@@ -0,0 +1,164 @@
+import os
+import re
+import json
+import stat
+import time
+import hashlib
+import secrets
+import tempfile
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Parquet schema metadata key holding the batch's file format and what it was parsed with
+METADATA_KEY = b'label_batch'
+
+
+def file_digest(file_bytes):
+    """SHA-256 of an uploaded file's contents"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+class BatchCache:
+    """
+    Parsed upload batches kept between /api/validate and /upload.
+
+    /api/validate stores the batch it parsed and returns a random token;
+    /upload can send that token with the same file to skip reading and
+    parsing. A batch is only handed back for the same file contents,
+    configuration version and label size it was parsed with, and only
+    until it expires. Batches are stored as Parquet files (data only, so a
+    planted or damaged file can never run code) in a private directory
+    shared by all gunicorn workers, since the two requests may land on
+    different ones.
+    """
+
+    TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{32}$')
+
+    def __init__(self, cache_dir=None, ttl_seconds=None):
+        self.cache_dir = cache_dir or os.environ.get(
+            'LABEL_BATCH_DIR',
+            os.path.join(tempfile.gettempdir(), 'label_batches')
+        )
+        self.ttl_seconds = ttl_seconds or int(os.environ.get('LABEL_BATCH_TTL_MINUTES', 30)) * 60
+
+    def _path(self, token):
+        if not self.TOKEN_PATTERN.match(token or ''):
+            return None
+        return os.path.join(self.cache_dir, f'{token}.parquet')
+
+    def _ensure_private_dir(self):
+        """
+        Create the cache directory readable by this user only.
+
+        Returns:
+            True if the directory is owned by this user and private, False if it must not be used
+        """
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        st = os.lstat(self.cache_dir)
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+            return False  # Created (or swapped for a symlink) by someone else
+        if stat.S_IMODE(st.st_mode) & 0o077:
+            os.chmod(self.cache_dir, 0o700)
+        return True
+
+    def put(self, batch, file_hash, config_version, label_size):
+        """
+        Store a parsed batch.
+
+        Returns:
+            The batch token, or None if the batch cannot be stored
+        """
+        if not self._ensure_private_dir():
+            return None
+        self.cleanup_expired()
+
+        file_format, df = batch
+        entry = {
+            'file_hash': file_hash,
+            'config_version': config_version,
+            'label_size': label_size,
+            'file_format': file_format
+        }
+        try:
+            table = pa.Table.from_pandas(df)
+        except (pa.ArrowException, TypeError, ValueError):
+            return None  # Columns mixing types Parquet can't hold; the upload is parsed as usual
+        metadata = dict(table.schema.metadata or {})
+        metadata[METADATA_KEY] = json.dumps(entry).encode('utf-8')
+        table = table.replace_schema_metadata(metadata)
+
+        # Write atomically (temp file + rename) so a concurrent upload never reads a partial batch
+        token = secrets.token_urlsafe(24)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pq.write_table(table, f)
+            os.replace(temp_path, self._path(token))
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        return token
+
+    def get(self, token, file_hash, config_version, label_size):
+        """
+        Load a batch for an upload.
+
+        Returns:
+            (batch, None), or (None, reason) if the token cannot be used for this upload
+        """
+        path = self._path(token)
+        if path is None:
+            return None, 'invalid token'
+
+        if not self._ensure_private_dir():
+            return None, 'unsafe cache directory'
+
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                return None, 'expired'
+            # Check the metadata before reading the rows
+            entry = json.loads(pq.read_schema(path).metadata[METADATA_KEY])
+            if entry['file_hash'] != file_hash:
+                return None, 'file changed'
+            if entry['config_version'] != config_version:
+                return None, 'settings changed'
+            if entry['label_size'] != label_size:
+                return None, 'label size changed'
+            return (entry['file_format'], self._restore_missing(pq.read_table(path).to_pandas())), None
+        except FileNotFoundError:
+            return None, 'unknown or expired'
+        except Exception:
+            # Truncated, corrupt or written by an incompatible version: parse the upload instead
+            return None, 'unreadable'
+
+    @staticmethod
+    def _restore_missing(df):
+        """
+        Put back NaN for missing text values, which Parquet returns as None.
+
+        Parsed uploads mark missing cells with NaN, and the labels show them
+        as such, so a stored batch must render exactly like parsing the file.
+        """
+        for name in df.columns:
+            if df[name].dtype == object:
+                df[name] = df[name].where(df[name].notna(), np.nan)
+        return df
+
+    def cleanup_expired(self):
+        """Remove batches past their TTL (and temp files left by interrupted writes)"""
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        cutoff = time.time() - self.ttl_seconds
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+            except OSError:
+                pass  # Already removed by another worker
+
+
+# Process-wide batch store (the directory is shared by all workers)
+shared_batch_cache = BatchCache()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Offline render benchmark using label bundles as fixtures.
+
+A bundle (see label_bundle.py) holds prepared label records and their
+DataMatrix bitmaps, so rendering it involves no spreadsheet parsing and
+no network. This times, for each bundle and label size:
+
+- read: read_bundle (unzipping the manifest and bitmaps)
+- render: render_bundle, excluding PDF serialization
+- save: Canvas.save, writing the PDF to a file on disk
+
+Bundles recorded from real batches can be passed on the command line.
+Without any, bundles are recorded once from synthetic new-format exports
+(see exports.py) against the local stub server, and can be kept with
+--save-bundles for later runs.
+
+Usage:
+    python benchmarks/bench_bundle.py [bundle.zip ...] [--rows 1000 10000] [--label-sizes 2x1 3x1]
+        [--save-bundles DIR] [--repeat 3]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import label_bundle
+from image_cache import DiskImageCache
+from parallel_render import ParallelRenderer
+from text_metrics import shared_text_metrics
+from exports import ExportProfile, Upload, new_format_export, write_export
+from stub_server import StubDataMatrixServer
+from run_benchmarks import SaveTimer
+
+
+def record_bundles(rows_list, directory):
+    """Record a 2x1 bundle from a synthetic export of each size, returning their paths"""
+    profile = ExportProfile()
+    paths = []
+    with StubDataMatrixServer(latency=0) as server:
+        for rows in rows_list:
+            export_path = os.path.join(directory, f'orders_{rows}.csv')
+            write_export(new_format_export(profile, rows, server.base_url), export_path)
+
+            generator = label_bundle.create_generator('2x1')
+            generator.disk_cache = DiskImageCache(cache_dir=tempfile.mkdtemp(dir=directory))
+            bundle_path = os.path.join(directory, f'orders_{rows}.bundle.zip')
+            with open(export_path, 'rb') as f, open(bundle_path, 'wb') as bundle_output, \
+                    open(os.devnull, 'wb') as output:
+                generator.bundle_output = bundle_output
+                generator.process_file_and_generate_pdf(Upload(f, export_path), output=output)
+            paths.append(bundle_path)
+            print(f'Recorded {bundle_path} ({os.path.getsize(bundle_path) / 1024:.0f} KB)', flush=True)
+    return paths
+
+
+def run_case(bundle_path, label_size, directory):
+    """Time reading and rendering one bundle at one label size"""
+    shared_text_metrics.clear()
+    stages = {}
+
+    start = time.perf_counter()
+    bundle = label_bundle.read_bundle(bundle_path)
+    stages['read'] = time.perf_counter() - start
+
+    generator = label_bundle.create_generator(label_size)
+    generator.renderer = ParallelRenderer(processes=1)
+    output_path = os.path.join(directory, 'labels.pdf')
+    start = time.perf_counter()
+    with SaveTimer() as save_timer:
+        with open(output_path, 'wb') as output:
+            _, label_count = generator.render_bundle(bundle, output=output)
+    elapsed = time.perf_counter() - start
+    stages['render'] = elapsed - save_timer.elapsed
+    stages['save'] = save_timer.elapsed
+    return label_count, stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('bundles', nargs='*', help='bundle files (default: record from synthetic exports)')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--label-sizes', nargs='+', choices=['2x1', '3x1'], default=['2x1', '3x1'])
+    parser.add_argument('--save-bundles', help='directory to keep the recorded bundles in')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        bundles = args.bundles
+        if not bundles:
+            if args.save_bundles:
+                os.makedirs(args.save_bundles, exist_ok=True)
+            bundles = record_bundles(args.rows, args.save_bundles or directory)
+
+        for bundle_path in bundles:
+            for label_size in args.label_sizes:
+                # Best of the repeats, per stage
+                runs = [run_case(bundle_path, label_size, directory) for _ in range(args.repeat)]
+                label_count = runs[0][0]
+                best = {stage: min(stages[stage] for _, stages in runs) for stage in runs[0][1]}
+                total = sum(best.values())
+                timings = ' '.join(f'{stage} {seconds:.3f}s' for stage, seconds in best.items())
+                print(f'{os.path.basename(bundle_path):<28} {label_size}  {label_count:>7} labels  {timings}  '
+                      f'total {total:.3f}s ({label_count / total:.0f} labels/s)', flush=True)
+
+
+if __name__ == '__main__':
+    main()
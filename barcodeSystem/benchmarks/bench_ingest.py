@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Ingest benchmark for new-format CSV exports.
+
+Writes synthetic ShipStation-style exports (see exports.py; the label
+columns plus the wide "Item - Options" column of tariff codes and a few
+unused columns) and times reading them:
+
+- pandas full: pd.read_csv of every column, the reader before header-first ingest
+- pandas pruned: the header-first reader forced to pandas (the fallback path)
+- arrow pruned: the header-first reader with pyarrow and explicit column types
+
+Usage:
+    python benchmarks/bench_ingest.py [--rows 1000 10000 100000] [--options-bytes N] [--repeat 3]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import sheet_reader
+from sheet_reader import open_sheet
+from label_generator import LabelGenerator
+from exports import ExportProfile, Upload, new_format_export
+
+
+def write_export(path, rows, options_bytes):
+    """Write a synthetic new-format export with rows rows"""
+    df = new_format_export(ExportProfile(), rows, 'https://cdn.example.com', options_bytes=options_bytes)
+    df['Customer - Email'] = [f'customer{i}@example.com' for i in range(rows)]
+    df['Ship To - Address'] = '1 Example Street, Springfield'
+    df.to_csv(path, index=False)
+
+
+def read_full(path):
+    return pd.read_csv(path)
+
+
+def read_pruned(path, engine):
+    """Read the label columns; returns the frame and the reader that was used ('pyarrow' or 'pandas')"""
+    sheet_reader.CSV_ENGINE = engine
+    with open(path, 'rb') as f, open_sheet(Upload(f, path)) as sheet:
+        df = sheet.read(LabelGenerator.NEW_FORMAT_COLUMNS, LabelGenerator.COLUMN_TYPES)
+    return df, sheet.engine
+
+
+def best_time(function, repeat):
+    """Fastest of repeat runs, in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--options-bytes', type=int, help='size of each Item - Options cell (default: the sample export\'s cells)')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    readers = [
+        ('pandas full', read_full),
+        ('pandas pruned', lambda path: read_pruned(path, 'pandas')),
+        ('arrow pruned', lambda path: read_pruned(path, 'auto')),
+    ]
+
+    print(f'{"rows":>8} {"MB":>8} ' + ' '.join(f'{name:>14}' for name, _ in readers))
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.rows:
+            path = os.path.join(directory, f'export_{rows}.csv')
+            write_export(path, rows, args.options_bytes)
+            size_mb = os.path.getsize(path) / 1e6
+            times = [best_time(lambda: reader(path), args.repeat) for _, reader in readers]
+            print(f'{rows:>8} {size_mb:>8.1f} ' + ' '.join(f'{t:>13.3f}s' for t in times))
+            if read_pruned(path, 'auto')[1] == 'pandas':
+                print(f'{"":>8} arrow pruned fell back to pandas for this file (a column did not fit its declared type)')
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
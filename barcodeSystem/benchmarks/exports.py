@@ -0,0 +1,197 @@
+"""
+Synthetic order exports for benchmarks.
+
+Exports are modelled on the sample files in the repository:
+new-orders-format.csv (ShipStation) and shirt_orders.xlsx (original
+format). The samples provide:
+
+- item name HTML shapes, which are turned into templates and filled
+  with the configured product types, sample colors, sizes and titles
+- the share of rows without a SKU (promotional items)
+- the multi-item order mix (items per order)
+- quantities, store names, ship dates and tariff code options
+- the duplicate DataMatrix URL ratio (rows that reuse a design's URL)
+
+URLs point at a base URL, normally a local stub server (see
+stub_server.py).
+"""
+import os
+import re
+import json
+import random
+import pandas as pd
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Item name in a sample: optional highlight span around the product base, then color, size and title
+ITEM_NAME_SHAPE = re.compile(
+    r'^(?P<prefix>.*?)(?P<base>[A-Z][A-Z ]*[A-Z])(?P<suffix></span>)? - (?P<color>[^<]+?) - (?P<size>[^<-]+?)</span> - (?P<title>.+)$'
+)
+
+COLORS = ['Black', 'White', 'Vintage Black', 'Stone Wash', 'Pepper']
+
+
+class ExportProfile:
+    """Distributions drawn from the sample exports"""
+
+    def __init__(self, new_sample=None, old_sample=None, config_file=None):
+        new_df = pd.read_csv(new_sample or os.path.join(REPO_DIR, 'new-orders-format.csv'))
+        old_df = pd.read_excel(old_sample or os.path.join(REPO_DIR, 'shirt_orders.xlsx'))
+        with open(config_file or os.path.join(REPO_DIR, 'product_mappings.json'), 'r', encoding='utf-8') as f:
+            self.product_types = json.load(f).get('product_types', [])
+
+        items = new_df[new_df['Item - SKU'].notna()]
+        promotions = new_df[new_df['Item - SKU'].isna()]
+
+        # Item name templates and the titles, colors and sizes they were filled with
+        self.name_templates = []
+        self.titles = list(old_df['Product'].dropna().unique())
+        for name in items['Item - Name']:
+            match = ITEM_NAME_SHAPE.match(name)
+            if match:
+                template = f"{match['prefix']}{{base}}{match['suffix'] or ''} - {{color}} - {{size}}</span> - {{title}}"
+                if template not in self.name_templates:
+                    self.name_templates.append(template)
+                self.titles.append(match['title'])
+        self.titles = list(dict.fromkeys(self.titles))
+        self.sizes = list(old_df['Size'].dropna())
+
+        # Promotional rows are copied as they are
+        self.promotion_rows = promotions.to_dict('records')
+        self.promotion_ratio = len(promotions) / len(new_df)
+
+        # Items per order, as a list to draw from
+        self.order_sizes = list(new_df.groupby('Order - Number').size())
+
+        self.new_quantities = list(items['Item - Qty'].astype(int))
+        self.old_quantities = list(old_df['Quantity'].astype(int))
+        self.options = list(items['Item - Options'].dropna()) or ['']
+        self.store_names = list(new_df['Market - Store Name'].dropna().unique())
+        self.ship_dates = list(new_df['Date - Ship By Date'].dropna().unique())
+
+        # Share of item rows that reuse a DataMatrix URL already used by an earlier row
+        self.new_duplicate_url_ratio = 1 - items['Item - Image URL'].nunique() / len(items)
+        self.old_duplicate_url_ratio = 1 - old_df['Datamatrix URL'].nunique() / len(old_df)
+
+    def summary(self):
+        return {
+            'name_templates': len(self.name_templates),
+            'titles': len(self.titles),
+            'promotion_ratio': round(self.promotion_ratio, 3),
+            'order_sizes': sorted(set(self.order_sizes)),
+            'new_duplicate_url_ratio': round(self.new_duplicate_url_ratio, 3),
+            'old_duplicate_url_ratio': round(self.old_duplicate_url_ratio, 3),
+        }
+
+
+class Upload:
+    """Export file opened from disk, with a filename like an uploaded werkzeug FileStorage"""
+
+    def __init__(self, stream, path):
+        self.stream = stream
+        self.filename = os.path.basename(path)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def design_ids(rows, duplicate_url_ratio, max_designs, rnd):
+    """
+    Design (DataMatrix URL) for each of rows item rows
+
+    About duplicate_url_ratio of the rows repeat an earlier row's design;
+    large batches are capped at max_designs distinct designs, like a real catalog.
+    """
+    distinct = max(1, min(max_designs, round(rows * (1 - duplicate_url_ratio))))
+    ids = list(range(min(distinct, rows))) + [rnd.randrange(distinct) for _ in range(rows - min(distinct, rows))]
+    rnd.shuffle(ids)
+    return ids
+
+
+def design_url(base_url, design):
+    return f'{base_url}/files/QR_design_{design}_png.png?v=1752178354'
+
+
+def design_title(profile, design):
+    """Sample title for a design; designs past the number of sample titles get a numbered variant"""
+    title = profile.titles[design % len(profile.titles)]
+    variant = design // len(profile.titles)
+    return f'{title} {variant + 1}' if variant else title
+
+
+def new_format_export(profile, rows, base_url, max_designs=1000, options_bytes=None, seed=0):
+    """DataFrame of a ShipStation export with rows rows (item and promotional rows)"""
+    rnd = random.Random(seed)
+    item_rows = rows - round(rows * profile.promotion_ratio)
+    designs = design_ids(item_rows, profile.new_duplicate_url_ratio, max_designs, rnd)
+
+    records = [None] * rows
+
+    # Decide which positions are promotional, then fill every row
+    promotion_positions = set(rnd.sample(range(rows), rows - item_rows))
+    design_iter = iter(designs)
+    order_number = 47000
+    remaining_in_order = 0
+    for index in range(rows):
+        if remaining_in_order == 0:
+            order_number += 1
+            remaining_in_order = rnd.choice(profile.order_sizes)
+        remaining_in_order -= 1
+
+        if index in promotion_positions:
+            record = dict(rnd.choice(profile.promotion_rows))
+            record['Order - Number'] = f'BR-{order_number}'
+            records[index] = record
+            continue
+
+        design = next(design_iter)
+        product_type = profile.product_types[design % len(profile.product_types)]
+        base, _, color = product_type.partition(' - ')
+        template = profile.name_templates[design % len(profile.name_templates)]
+        size = rnd.choice(profile.sizes)
+        options = rnd.choice(profile.options)
+        if options_bytes is not None:
+            options = (options * (options_bytes // max(len(options), 1) + 1))[:options_bytes]
+
+        records[index] = {
+            'Order - Number': f'BR-{order_number}',
+            'Item - SKU': f'BRSHIRT-{design:05d}-{size}',
+            'Item - Name': template.format(
+                base=base.upper(), color=color or rnd.choice(COLORS), size=size, title=design_title(profile, design)
+            ),
+            'Item - Options': options,
+            'Item - Qty': rnd.choice(profile.new_quantities),
+            'Item - Image URL': design_url(base_url, design),
+            'Market - Store Name': rnd.choice(profile.store_names),
+            'Date - Ship By Date': rnd.choice(profile.ship_dates),
+        }
+
+    return pd.DataFrame(records, columns=['Order - Number', 'Item - SKU', 'Item - Name', 'Item - Options', 'Item - Qty',
+                                          'Item - Image URL', 'Market - Store Name', 'Date - Ship By Date'])
+
+
+def old_format_export(profile, rows, base_url, max_designs=1000, seed=0):
+    """DataFrame of an original format sheet (Product, Size, Quantity, Unit Price, Total, Datamatrix URL)"""
+    rnd = random.Random(seed)
+    designs = design_ids(rows, profile.old_duplicate_url_ratio, max_designs, rnd)
+
+    records = []
+    for design in designs:
+        quantity = rnd.choice(profile.old_quantities)
+        records.append({
+            'Product': design_title(profile, design),
+            'Size': rnd.choice(profile.sizes),
+            'Quantity': quantity,
+            'Unit Price': 17.99,
+            'Total': round(17.99 * quantity, 2),
+            'Datamatrix URL': design_url(base_url, design),
+        })
+    return pd.DataFrame(records)
+
+
+def write_export(df, path):
+    """Write an export as .csv or .xlsx by the path's extension"""
+    if path.endswith('.xlsx'):
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False)
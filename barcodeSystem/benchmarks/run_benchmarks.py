@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+End-to-end label generation benchmark.
+
+Generates synthetic new-format and original-format exports (see
+exports.py), serves their DataMatrix images from a local stub server and
+times each stage for LabelGenerator (2x1) and LabelGenerator3x1:
+
+- ingest: read_upload (reading the .csv / .xlsx file)
+- parse: parse_batch (format detection, item name parsing)
+- fetch: prefetch_datamatrix_images (downloads into an empty disk cache)
+- codes: order number encoding (DataMatrix on 2x1, Code 128 on 3x1 labels)
+- render: render_batch, excluding PDF serialization
+- save: Canvas.save, writing the PDF to a file on disk
+
+Every case starts cold: fresh generator, empty image caches, and cleared
+parse and text measurement memos. Results are written as JSON and can be
+compared against a stored baseline.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--rows 100 1000 10000 50000] [--latency 0.05]
+        [--output report.json] [--baseline baseline.json] [--threshold 0.25] [--fail-on-regression]
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from reportlab.pdfgen import canvas
+from label_generator import LabelGenerator
+from label_generator_3x1 import LabelGenerator3x1
+from image_cache import DiskImageCache
+from parallel_render import ParallelRenderer
+from parse_cache import shared_parse_cache
+from text_metrics import shared_text_metrics
+from exports import ExportProfile, Upload, new_format_export, old_format_export, write_export
+from stub_server import StubDataMatrixServer
+
+# Generator class and the method that encodes an order number for its labels
+GENERATORS = {
+    '2x1': (LabelGenerator, 'generate_order_datamatrix'),
+    '3x1': (LabelGenerator3x1, 'generate_order_barcode'),
+}
+STAGES = ['ingest', 'parse', 'fetch', 'codes', 'render', 'save']
+
+# Stages faster than this are too noisy to flag as regressions
+MIN_COMPARED_SECONDS = 0.01
+
+
+class SaveTimer:
+    """Accumulates the time spent in Canvas.save while active"""
+
+    def __init__(self):
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        original_save = self.original_save = canvas.Canvas.save
+        timer = self
+
+        def timed_save(c):
+            start = time.perf_counter()
+            try:
+                return original_save(c)
+            finally:
+                timer.elapsed += time.perf_counter() - start
+
+        canvas.Canvas.save = timed_save
+        return self
+
+    def __exit__(self, *exc_info):
+        canvas.Canvas.save = self.original_save
+
+
+def run_case(generator_class, code_method, path, directory, processes):
+    """Time each stage of generating labels for one export file"""
+    generator = generator_class()
+    generator.disk_cache = DiskImageCache(cache_dir=tempfile.mkdtemp(dir=directory))
+    generator.renderer = ParallelRenderer(processes=processes)
+    shared_parse_cache.clear()
+    shared_text_metrics.clear()
+
+    stages = {}
+
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        df = generator.read_upload(Upload(f, path))
+    stages['ingest'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = generator.parse_batch(df)
+    stages['parse'] = time.perf_counter() - start
+    file_format, frame = batch
+
+    start = time.perf_counter()
+    generator.prefetch_datamatrix_images(frame['Datamatrix URL'])
+    stages['fetch'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if 'OrderNumber' in frame.columns:
+        encode = getattr(generator, code_method)
+        for order_number in frame['OrderNumber'].unique():
+            encode(order_number)
+    stages['codes'] = time.perf_counter() - start
+
+    output_path = os.path.join(directory, 'labels.pdf')
+    start = time.perf_counter()
+    with SaveTimer() as save_timer:
+        with open(output_path, 'wb') as output:
+            _, label_count = generator.render_batch(batch, output)
+    elapsed = time.perf_counter() - start
+    stages['render'] = elapsed - save_timer.elapsed
+    stages['save'] = save_timer.elapsed
+
+    total = sum(stages.values())
+    return {
+        'format': file_format,
+        'labels': label_count,
+        'distinct_urls': int(frame['Datamatrix URL'].nunique()),
+        'output_bytes': os.path.getsize(output_path),
+        'stages': {name: round(stages[name], 4) for name in STAGES},
+        'total': round(total, 4),
+        'labels_per_second': round(label_count / total, 1) if total else None,
+    }
+
+
+def environment():
+    """Machine and code version the report was made on"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit,
+    }
+
+
+def compare(report, baseline, threshold):
+    """
+    Print per-stage changes against a baseline report
+
+    Returns:
+        List of (case, stage, baseline seconds, current seconds) slower than the threshold allows
+    """
+    baseline_cases = {case['name']: case for case in baseline.get('cases', [])}
+    regressions = []
+
+    print(f'\nCompared with baseline from {baseline.get("created", "unknown")} ({baseline.get("environment", {}).get("commit")}):')
+    for case in report['cases']:
+        previous = baseline_cases.get(case['name'])
+        if previous is None:
+            print(f'  {case["name"]}: not in baseline')
+            continue
+
+        for stage in STAGES + ['total']:
+            before = previous['total'] if stage == 'total' else previous['stages'].get(stage)
+            after = case['total'] if stage == 'total' else case['stages'][stage]
+            if before is None:
+                continue
+            change = (after - before) / before if before else 0.0
+            flag = ''
+            if max(before, after) >= MIN_COMPARED_SECONDS and change > threshold:
+                flag = '  REGRESSION'
+                regressions.append((case['name'], stage, before, after))
+            print(f'  {case["name"]:<18} {stage:<7} {before:>9.3f}s -> {after:>9.3f}s {change:>+8.1%}{flag}')
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000, 50000])
+    parser.add_argument('--generators', nargs='+', choices=sorted(GENERATORS), default=sorted(GENERATORS))
+    parser.add_argument('--formats', nargs='+', choices=['new', 'old'], default=['new', 'old'])
+    parser.add_argument('--latency', type=float, default=0.05, help='stub server delay per image, in seconds')
+    parser.add_argument('--max-designs', type=int, default=1000, help='distinct DataMatrix URLs per export at most')
+    parser.add_argument('--processes', type=int, default=1, help='render processes (1 keeps render and save separate)')
+    parser.add_argument('--output', default='benchmark_report.json')
+    parser.add_argument('--baseline', help='report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='slowdown that counts as a regression (0.25 = 25%%)')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    profile = ExportProfile()
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'settings': {
+            'latency': args.latency,
+            'max_designs': args.max_designs,
+            'processes': args.processes,
+        },
+        'profile': profile.summary(),
+        'cases': [],
+    }
+
+    with tempfile.TemporaryDirectory() as directory, StubDataMatrixServer(latency=args.latency) as server:
+        for file_format in args.formats:
+            for rows in args.rows:
+                # ShipStation exports are CSV files, original format sheets are workbooks
+                if file_format == 'new':
+                    df = new_format_export(profile, rows, server.base_url, args.max_designs)
+                    path = os.path.join(directory, f'orders_{rows}.csv')
+                else:
+                    df = old_format_export(profile, rows, server.base_url, args.max_designs)
+                    path = os.path.join(directory, f'orders_{rows}.xlsx')
+                write_export(df, path)
+
+                for label_size in args.generators:
+                    case = {'name': f'{label_size}/{file_format}/{rows}', 'generator': label_size, 'rows': rows}
+                    case.update(run_case(*GENERATORS[label_size], path, directory, args.processes))
+                    report['cases'].append(case)
+
+                    stages = ' '.join(f'{name} {case["stages"][name]:.3f}s' for name in STAGES)
+                    print(f'{case["name"]:<18} {case["labels"]:>7} labels  {stages}  total {case["total"]:.3f}s '
+                          f'({case["labels_per_second"]} labels/s)', flush=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nReport written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} stage(s) slower than the baseline by more than {args.threshold:.0%}')
+            if args.fail_on_regression:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Local stand-in for the CDN that serves product DataMatrix images.
+
+Every path gets one of a fixed set of random module patterns as a PNG,
+the same size as the real images, after a configurable delay. The
+server runs in its own process, like a real CDN, so handling requests
+does not compete with the benchmarked code for the GIL.
+"""
+import io
+import time
+import zlib
+import random
+import multiprocessing
+from functools import lru_cache
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from PIL import Image
+
+
+# Distinct images served; each is encoded once, so the stub spends little CPU per request
+PATTERNS = 64
+
+
+@lru_cache(maxsize=PATTERNS)
+def datamatrix_png(pattern, modules=24, size=300):
+    """PNG of a random module pattern"""
+    rnd = random.Random(pattern)
+    img = Image.new('L', (modules, modules), 255)
+    img.putdata([0 if rnd.random() < 0.5 else 255 for _ in range(modules * modules)])
+    output = io.BytesIO()
+    img.resize((size, size), Image.NEAREST).save(output, 'PNG')
+    return output.getvalue()
+
+
+def make_handler(latency, request_count):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep connections alive like a CDN, and send headers and body without waiting on delayed ACKs
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with request_count.get_lock():
+                request_count.value += 1
+            time.sleep(latency)
+            data = datamatrix_png(zlib.crc32(self.path.encode('utf-8')) % PATTERNS)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def serve(latency, host, port, request_count, ready):
+    """Run the server (in the server process), reporting its port through ready"""
+    server = ThreadingHTTPServer((host, port), make_handler(latency, request_count))
+    server.daemon_threads = True
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+class StubDataMatrixServer:
+    """HTTP server for DataMatrix PNGs with a fixed per-request latency"""
+
+    def __init__(self, latency=0.05, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.base_url = None
+
+        context = multiprocessing.get_context('spawn')
+        self._request_count = context.Value('i', 0)
+        self._ready = context.Queue()
+        self._process = context.Process(
+            target=serve, args=(latency, host, port, self._request_count, self._ready), daemon=True
+        )
+
+    @property
+    def requests(self):
+        """Number of images served so far"""
+        return self._request_count.value
+
+    def start(self):
+        self._process.start()
+        self.port = self._ready.get(timeout=30)
+        self.base_url = f'http://{self.host}:{self.port}'
+        return self
+
+    def stop(self):
+        self._process.terminate()
+        self._process.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,51 @@
+import barcode
+
+
+def code128_modules(data):
+    """
+    Encode data as Code 128 and return its module pattern.
+
+    python-barcode picks the code sets and check digit; only its symbol
+    encoder is used, so no image is rendered. The result is a string of
+    '1' (bar) and '0' (space) modules without quiet zones.
+    """
+    return barcode.get('code128', str(data)).build()[0]
+
+
+def module_runs(modules):
+    """Collapse a module pattern into (start module, width in modules) runs of bars"""
+    runs = []
+    index = 0
+    while index < len(modules):
+        if modules[index] != '1':
+            index += 1
+            continue
+        start = index
+        while index < len(modules) and modules[index] == '1':
+            index += 1
+        runs.append((start, index - start))
+    return runs
+
+
+def draw_code128(c, modules, x, y, width, height, dpi=203):
+    """
+    Draw a Code 128 module pattern as filled rectangles on a ReportLab canvas.
+
+    Each module is a whole number of printer dots so bar and space widths
+    stay exact at the printer's resolution; the barcode is left aligned in
+    the width x height box whose bottom-left corner is (x, y). Patterns too
+    long for one dot per module are stretched to the box width instead.
+    """
+    dot = 72.0 / dpi
+    module_dots = int(width / dot) // len(modules)
+    module_width = module_dots * dot if module_dots else width / len(modules)
+
+    # Align the origin and height to the dot grid
+    origin_x = round(x / dot) * dot
+    origin_y = round(y / dot) * dot
+    bar_height = max(round(height / dot), 1) * dot
+
+    path = c.beginPath()
+    for start, run_width in module_runs(modules):
+        path.rect(origin_x + start * module_width, origin_y, run_width * module_width, bar_height)
+    c.drawPath(path, stroke=0, fill=1)
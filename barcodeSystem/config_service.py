@@ -0,0 +1,145 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from product_matcher import ProductTypeMatcher
+
+# Used when product_mappings.json does not exist
+DEFAULT_PRODUCT_TYPES = [
+    'Soft Premium Tee - Black',
+    'Soft Premium Tee - White',
+    'Luxury Heavy Tee - Black',
+    'Luxury Heavy Tee - Vintage Black',
+    'Luxury Heavy Tee - Stone Wash',
+    'Vintage Crew Sweatshirt - Pepper',
+    'Luxury Hoodie - Vintage Black',
+    'Unisex Fleece Sweat Shorts',
+    'Insulated Can Cooler',
+    'Trucker Hat'
+]
+
+# Used when product_mappings.json cannot be read
+FALLBACK_PRODUCT_TYPES = [
+    'Soft Premium Tee - Black',
+    'Soft Premium Tee - White',
+    'Luxury Heavy Tee - Black'
+]
+
+
+def configuration_version(*parts):
+    """Short content hash of configuration values; equal in every worker for equal content"""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class ConfigSnapshot:
+    """
+    Read-only view of one version of the configuration, with everything
+    derived from it compiled up front: the product type matcher and the
+    shortening rules with their patterns upper-cased.
+    """
+
+    def __init__(self, config):
+        product_types = tuple(config.get('product_types', []))
+        shortening_rules = tuple(config.get('shortening_rules', []))
+        max_bins = config.get('max_bins', 12)
+        overflow_name = config.get('overflow_name', 'THEPIT')
+
+        # (rule index, upper-cased pattern, ((condition index, is default, upper-cased contains text or None, condition), ...))
+        compiled_rules = tuple(
+            (rule_index, rule.get('pattern', '').upper(), tuple(
+                (condition_index, bool(condition.get('default', False)),
+                 condition['contains'].upper() if 'contains' in condition else None, condition)
+                for condition_index, condition in enumerate(rule.get('conditions', []))
+            ))
+            for rule_index, rule in enumerate(shortening_rules)
+        )
+
+        values = {
+            'product_types': product_types,
+            'shortening_rules': shortening_rules,
+            'compiled_rules': compiled_rules,
+            'max_bins': max_bins,
+            'overflow_name': overflow_name,
+            'product_matcher': ProductTypeMatcher(product_types),
+            'version': configuration_version(product_types, shortening_rules, max_bins, overflow_name),
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Configuration snapshots are read-only')
+
+
+class ConfigService:
+    """
+    Loads and compiles the product mappings file once per change.
+
+    snapshot() only stats the file; the file is read and compiled again
+    when its inode, modification time or size changes. Settings are saved
+    by writing a temp file and renaming it over the old one, so a save in
+    one gunicorn worker always gives the file a new inode and every other
+    worker picks it up on its next request.
+    """
+
+    def __init__(self, config_file):
+        self.config_file = config_file
+        self._lock = threading.Lock()
+        self._file_key = None
+        self._snapshot = None
+
+    def _stat_key(self):
+        try:
+            stat = os.stat(self.config_file)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def snapshot(self):
+        """Current configuration snapshot"""
+        file_key = self._stat_key()
+        snapshot = self._snapshot
+        if snapshot is not None and file_key == self._file_key:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None or file_key != self._file_key:
+                new_snapshot = ConfigSnapshot(self._read())
+                # Keep the compiled snapshot when only the file changed, not its contents
+                if self._snapshot is None or new_snapshot.version != self._snapshot.version:
+                    self._snapshot = new_snapshot
+                self._file_key = file_key
+            return self._snapshot
+
+    def _read(self):
+        """Configuration dict from the file, or the built-in defaults"""
+        try:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'product_types': DEFAULT_PRODUCT_TYPES}
+        except json.JSONDecodeError as e:
+            print(f"Error loading configuration: {e}. Using defaults.")
+            return {'product_types': FALLBACK_PRODUCT_TYPES}
+
+    def save(self, config):
+        """Write the configuration atomically (temp file + rename)"""
+        directory = os.path.dirname(os.path.abspath(self.config_file))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.product_mappings.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=2, ensure_ascii=False)
+            # mkstemp creates the file owner-only; keep the permissions of the file being replaced
+            try:
+                os.chmod(temp_path, os.stat(self.config_file).st_mode & 0o777)
+            except FileNotFoundError:
+                os.chmod(temp_path, 0o644)
+            os.replace(temp_path, self.config_file)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+# Process-wide configuration shared by every generator instance and the settings API
+shared_config = ConfigService('product_mappings.json')
@@ -0,0 +1,372 @@
+"""
+In-process ECC200 DataMatrix encoder.
+
+Turns a string into a module matrix (ASCII encodation, Reed-Solomon error
+correction, ISO/IEC 16022 module placement) without spawning ghostscript.
+The matrix can be rendered as an exact 1-bit bitmap or drawn as vector
+rectangles on a ReportLab canvas.
+"""
+from PIL import Image
+
+# Square ECC200 symbols:
+# (symbol size, data region size, regions per side, data codewords, error correction codewords, interleaved blocks)
+SYMBOL_SIZES = [
+    (10, 8, 1, 3, 5, 1),
+    (12, 10, 1, 5, 7, 1),
+    (14, 12, 1, 8, 10, 1),
+    (16, 14, 1, 12, 12, 1),
+    (18, 16, 1, 18, 14, 1),
+    (20, 18, 1, 22, 18, 1),
+    (22, 20, 1, 30, 20, 1),
+    (24, 22, 1, 36, 24, 1),
+    (26, 24, 1, 44, 28, 1),
+    (32, 14, 2, 62, 36, 1),
+    (36, 16, 2, 86, 42, 1),
+    (40, 18, 2, 114, 48, 1),
+    (44, 20, 2, 144, 56, 1),
+    (48, 22, 2, 174, 68, 1),
+    (52, 24, 2, 204, 84, 2),
+    (64, 14, 4, 280, 112, 2),
+    (72, 16, 4, 368, 144, 4),
+    (80, 18, 4, 456, 192, 4),
+    (88, 20, 4, 576, 224, 4),
+    (96, 22, 4, 696, 272, 4),
+    (104, 24, 4, 816, 336, 6),
+    (120, 18, 6, 1050, 408, 6),
+    (132, 20, 6, 1304, 496, 8),
+    (144, 22, 6, 1558, 620, 10),
+]
+
+# GF(256) arithmetic tables for the ECC200 primitive polynomial x^8 + x^5 + x^3 + x^2 + 1
+GF_EXP = [0] * 512
+GF_LOG = [0] * 256
+_value = 1
+for _i in range(255):
+    GF_EXP[_i] = _value
+    GF_LOG[_value] = _i
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x12D
+for _i in range(255, 512):
+    GF_EXP[_i] = GF_EXP[_i - 255]
+
+# Reed-Solomon generator polynomials and placement maps, built on first use
+_generator_cache = {}
+_placement_cache = {}
+
+
+def _gf_multiply(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return GF_EXP[GF_LOG[a] + GF_LOG[b]]
+
+
+def encode_ascii(data):
+    """ASCII encodation: digit pairs pack into one codeword, bytes above 127 use Upper Shift"""
+    if isinstance(data, str):
+        try:
+            data = data.encode('latin-1')
+        except UnicodeEncodeError:
+            data = data.encode('utf-8')
+
+    codewords = []
+    i = 0
+    while i < len(data):
+        byte = data[i]
+        # Two consecutive digits are packed into a single codeword (130-229)
+        if 48 <= byte <= 57 and i + 1 < len(data) and 48 <= data[i + 1] <= 57:
+            codewords.append(130 + (byte - 48) * 10 + (data[i + 1] - 48))
+            i += 2
+            continue
+        if byte > 127:
+            codewords.append(235)  # Upper Shift
+            byte -= 128
+        codewords.append(byte + 1)
+        i += 1
+    return codewords
+
+
+def _select_symbol(data_length):
+    """Smallest square symbol that holds the data codewords"""
+    for symbol in SYMBOL_SIZES:
+        if symbol[3] >= data_length:
+            return symbol
+    raise ValueError(f"Data too long for a DataMatrix symbol ({data_length} codewords)")
+
+
+def _pad(codewords, capacity):
+    """Fill unused capacity with the pad character and its 253-state randomized successors"""
+    padded = list(codewords)
+    if len(padded) < capacity:
+        padded.append(129)
+    while len(padded) < capacity:
+        position = len(padded) + 1
+        pad = 129 + ((149 * position) % 253) + 1
+        padded.append(pad - 254 if pad > 254 else pad)
+    return padded
+
+
+def _generator_polynomial(ecc_length):
+    """Coefficients of prod(x - a^i) for i = 1..ecc_length, highest degree first"""
+    if ecc_length not in _generator_cache:
+        poly = [1]
+        for i in range(1, ecc_length + 1):
+            root = GF_EXP[i]
+            next_poly = poly + [0]
+            for j in range(1, len(next_poly)):
+                next_poly[j] ^= _gf_multiply(poly[j - 1], root)
+            poly = next_poly
+        _generator_cache[ecc_length] = poly
+    return _generator_cache[ecc_length]
+
+
+def _reed_solomon(data, ecc_length):
+    """Error correction codewords for one block"""
+    generator = _generator_polynomial(ecc_length)
+    remainder = [0] * ecc_length
+    for codeword in data:
+        factor = codeword ^ remainder[0]
+        remainder = remainder[1:] + [0]
+        if factor:
+            for j in range(ecc_length):
+                remainder[j] ^= _gf_multiply(generator[j + 1], factor)
+    return remainder
+
+
+def _add_error_correction(data, ecc_total, blocks):
+    """Append interleaved Reed-Solomon codewords to the data codewords"""
+    ecc_per_block = ecc_total // blocks
+    result = list(data) + [0] * ecc_total
+    for block in range(blocks):
+        block_data = data[block::blocks]
+        ecc = _reed_solomon(block_data, ecc_per_block)
+        for j, codeword in enumerate(ecc):
+            result[len(data) + block + j * blocks] = codeword
+    return result
+
+
+def _placement(nrow, ncol):
+    """
+    ISO/IEC 16022 module placement for the data area.
+
+    Returns a nrow x ncol grid where each entry is (codeword index, bit mask)
+    or True/False for the fixed pattern in an unused bottom-right corner.
+    """
+    key = (nrow, ncol)
+    if key in _placement_cache:
+        return _placement_cache[key]
+
+    grid = [[None] * ncol for _ in range(nrow)]
+
+    def module(row, col, index, bit):
+        if row < 0:
+            row += nrow
+            col += 4 - ((nrow + 4) % 8)
+        if col < 0:
+            col += ncol
+            row += 4 - ((ncol + 4) % 8)
+        grid[row][col] = (index, 1 << (8 - bit))
+
+    def utah(row, col, index):
+        module(row - 2, col - 2, index, 1)
+        module(row - 2, col - 1, index, 2)
+        module(row - 1, col - 2, index, 3)
+        module(row - 1, col - 1, index, 4)
+        module(row - 1, col, index, 5)
+        module(row, col - 2, index, 6)
+        module(row, col - 1, index, 7)
+        module(row, col, index, 8)
+
+    def corner1(index):
+        module(nrow - 1, 0, index, 1)
+        module(nrow - 1, 1, index, 2)
+        module(nrow - 1, 2, index, 3)
+        module(0, ncol - 2, index, 4)
+        module(0, ncol - 1, index, 5)
+        module(1, ncol - 1, index, 6)
+        module(2, ncol - 1, index, 7)
+        module(3, ncol - 1, index, 8)
+
+    def corner2(index):
+        module(nrow - 3, 0, index, 1)
+        module(nrow - 2, 0, index, 2)
+        module(nrow - 1, 0, index, 3)
+        module(0, ncol - 4, index, 4)
+        module(0, ncol - 3, index, 5)
+        module(0, ncol - 2, index, 6)
+        module(0, ncol - 1, index, 7)
+        module(1, ncol - 1, index, 8)
+
+    def corner3(index):
+        module(nrow - 3, 0, index, 1)
+        module(nrow - 2, 0, index, 2)
+        module(nrow - 1, 0, index, 3)
+        module(0, ncol - 2, index, 4)
+        module(0, ncol - 1, index, 5)
+        module(1, ncol - 1, index, 6)
+        module(2, ncol - 1, index, 7)
+        module(3, ncol - 1, index, 8)
+
+    def corner4(index):
+        module(nrow - 1, 0, index, 1)
+        module(nrow - 1, ncol - 1, index, 2)
+        module(0, ncol - 3, index, 3)
+        module(0, ncol - 2, index, 4)
+        module(0, ncol - 1, index, 5)
+        module(1, ncol - 3, index, 6)
+        module(1, ncol - 2, index, 7)
+        module(1, ncol - 1, index, 8)
+
+    index = 0
+    row, col = 4, 0
+    while True:
+        # Special corner cases
+        if row == nrow and col == 0:
+            corner1(index)
+            index += 1
+        if row == nrow - 2 and col == 0 and ncol % 4:
+            corner2(index)
+            index += 1
+        if row == nrow - 2 and col == 0 and ncol % 8 == 4:
+            corner3(index)
+            index += 1
+        if row == nrow + 4 and col == 2 and not ncol % 8:
+            corner4(index)
+            index += 1
+
+        # Sweep upward diagonally
+        while True:
+            if row < nrow and col >= 0 and grid[row][col] is None:
+                utah(row, col, index)
+                index += 1
+            row -= 2
+            col += 2
+            if not (row >= 0 and col < ncol):
+                break
+        row += 1
+        col += 3
+
+        # Sweep downward diagonally
+        while True:
+            if row >= 0 and col < ncol and grid[row][col] is None:
+                utah(row, col, index)
+                index += 1
+            row += 2
+            col -= 2
+            if not (row < nrow and col >= 0):
+                break
+        row += 3
+        col += 1
+
+        if not (row < nrow or col < ncol):
+            break
+
+    # Fixed pattern for the unused bottom-right corner
+    if grid[nrow - 1][ncol - 1] is None:
+        grid[nrow - 1][ncol - 1] = True
+        grid[nrow - 2][ncol - 2] = True
+        grid[nrow - 1][ncol - 2] = False
+        grid[nrow - 2][ncol - 1] = False
+
+    _placement_cache[key] = grid
+    return grid
+
+
+def encode_datamatrix(data):
+    """
+    Encode a string as an ECC200 DataMatrix.
+
+    Returns:
+        List of rows (top row first), each a list of booleans where True is a dark module
+    """
+    data_codewords = encode_ascii(data)
+    size, region_size, regions, capacity, ecc_total, blocks = _select_symbol(len(data_codewords))
+    codewords = _add_error_correction(_pad(data_codewords, capacity), ecc_total, blocks)
+
+    # Map codeword bits into the data area
+    mapping_size = region_size * regions
+    placement = _placement(mapping_size, mapping_size)
+    data_area = [
+        [cell if isinstance(cell, bool) else bool(codewords[cell[0]] & cell[1]) for cell in row]
+        for row in placement
+    ]
+
+    # Surround each data region with its finder and timing patterns
+    block = region_size + 2
+    matrix = []
+    for symbol_row in range(size):
+        region_row, r = divmod(symbol_row, block)
+        row = []
+        for symbol_col in range(size):
+            region_col, c = divmod(symbol_col, block)
+            if c == 0 or r == block - 1:
+                row.append(True)  # Solid L-shaped finder (left and bottom edges)
+            elif r == 0:
+                row.append(c % 2 == 0)  # Alternating timing pattern along the top
+            elif c == block - 1:
+                row.append(r % 2 == 1)  # Alternating timing pattern down the right side
+            else:
+                row.append(data_area[region_row * region_size + r - 1][region_col * region_size + c - 1])
+        matrix.append(row)
+    return matrix
+
+
+def matrix_to_image(matrix, size_px):
+    """
+    Render a module matrix as a 1-bit image exactly size_px pixels square.
+
+    Every module is a whole number of pixels, so nothing is resampled; any
+    leftover pixels become an even white border around the symbol.
+    """
+    modules = len(matrix)
+    module_px = max(size_px // modules, 1)
+    symbol_px = module_px * modules
+    offset = max((size_px - symbol_px) // 2, 0)
+
+    img = Image.new('1', (max(size_px, symbol_px), max(size_px, symbol_px)), 1)
+    pixels = img.load()
+    for row_index, row in enumerate(matrix):
+        for col_index, dark in enumerate(row):
+            if not dark:
+                continue
+            x0 = offset + col_index * module_px
+            y0 = offset + row_index * module_px
+            for y in range(y0, y0 + module_px):
+                for x in range(x0, x0 + module_px):
+                    pixels[x, y] = 0
+    return img
+
+
+def draw_matrix(c, matrix, x, y, size, dpi=203):
+    """
+    Draw a module matrix as filled rectangles on a ReportLab canvas.
+
+    Modules are snapped to the printer's dot grid so each one is a whole
+    number of dots wide; the symbol is centered in the size x size box
+    whose bottom-left corner is (x, y).
+    """
+    modules = len(matrix)
+    dot = 72.0 / dpi
+    module_dots = int(size / dot) // modules
+    module_size = module_dots * dot if module_dots else size / modules
+    symbol_size = module_size * modules
+
+    # Center in the box, then align the origin to the dot grid
+    origin_x = round((x + (size - symbol_size) / 2) / dot) * dot
+    origin_y = round((y + (size - symbol_size) / 2) / dot) * dot
+
+    path = c.beginPath()
+    for row_index, row in enumerate(matrix):
+        row_y = origin_y + (modules - 1 - row_index) * module_size
+        col_index = 0
+        while col_index < modules:
+            if not row[col_index]:
+                col_index += 1
+                continue
+            # Merge horizontal runs of dark modules into one rectangle
+            run_start = col_index
+            while col_index < modules and row[col_index]:
+                col_index += 1
+            path.rect(origin_x + run_start * module_size, row_y,
+                      (col_index - run_start) * module_size, module_size)
+    c.drawPath(path, stroke=0, fill=1)
@@ -0,0 +1,136 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import FETCH_ERRORS, FETCH_SECONDS, fetch_error_reason
+
+
+class DataMatrixFetcher:
+    """Concurrent, connection-pooled downloader for product DataMatrix images"""
+
+    # Status codes worth retrying - rate limiting and transient CDN failures
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, max_workers=None, per_host_limit=None, max_retries=3,
+                 backoff_factor=0.5, max_retry_after=30, timeout=10):
+        # Worker pool size and per-host concurrency (overridable from the environment)
+        self.max_workers = max_workers or int(os.environ.get('DATAMATRIX_FETCH_WORKERS', 16))
+        self.per_host_limit = per_host_limit or int(os.environ.get('DATAMATRIX_FETCH_PER_HOST', 8))
+
+        # Retry settings
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_retry_after = max_retry_after  # Never sleep longer than this for a Retry-After header
+        self.timeout = timeout
+
+        # Shared session so connections to the CDN are kept alive between downloads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # One semaphore per host to cap concurrent requests against a single server
+        self._host_semaphores = {}
+        self._host_lock = threading.Lock()
+
+    def _host_semaphore(self, url):
+        """Get (or create) the concurrency limiter for the URL's host"""
+        host = urlsplit(url).netloc.lower()
+        with self._host_lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_semaphores[host]
+
+    def _retry_delay(self, response, attempt):
+        """Seconds to wait before the next attempt, honoring Retry-After when present"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                # Retry-After is either a number of seconds or an HTTP date
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                return min(max(delay, 0), self.max_retry_after)
+
+        # Exponential backoff: 0.5s, 1s, 2s, ...
+        return self.backoff_factor * (2 ** attempt)
+
+    def fetch(self, url):
+        """Download a single URL, retrying rate-limited and transient failures"""
+        start = time.perf_counter()
+        try:
+            return self._fetch(url)
+        except Exception as e:
+            FETCH_ERRORS.labels(fetch_error_reason(e)).inc()
+            raise
+        finally:
+            FETCH_SECONDS.observe(time.perf_counter() - start)
+
+    def _fetch(self, url):
+        semaphore = self._host_semaphore(url)
+        attempt = 0
+
+        while True:
+            response = None
+            try:
+                with semaphore:
+                    response = self.session.get(url, timeout=self.timeout)
+                if response.status_code not in self.RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response.content
+                error = requests.HTTPError(f"{response.status_code} Error for url: {url}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if attempt >= self.max_retries:
+                raise error
+
+            # Sleep outside the semaphore so other downloads can use the slot
+            time.sleep(self._retry_delay(response, attempt))
+            attempt += 1
+
+    def fetch_many(self, urls, process=None, timings=None):
+        """
+        Download unique URLs concurrently.
+
+        Args:
+            urls: Iterable of URLs (duplicates and empty values are ignored)
+            process: Optional callable applied to each downloaded body in the worker thread
+            timings: Optional StageTimings that records how long each download took
+
+        Returns:
+            dict mapping each URL to its (processed) result, or None if it failed
+        """
+        unique_urls = list(dict.fromkeys(url for url in urls if isinstance(url, str) and url.strip()))
+        if not unique_urls:
+            return {}
+
+        def worker(url):
+            start = time.perf_counter()
+            error = None
+            try:
+                content = self.fetch(url)
+                return process(content) if process else content
+            except Exception as e:
+                print(f"Error fetching DataMatrix from {url}: {e}")
+                error = str(e)
+                return None
+            finally:
+                if timings is not None:
+                    timings.record_url(url, time.perf_counter() - start, error)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(unique_urls))) as executor:
+            results = executor.map(worker, unique_urls)
+            return dict(zip(unique_urls, results))
+
+
+# Process-wide fetcher so every request reuses the same connection pool
+shared_fetcher = DataMatrixFetcher()
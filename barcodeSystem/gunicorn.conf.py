@@ -0,0 +1,36 @@
+"""
+Gunicorn settings for the label service.
+
+Prometheus metrics run in multiprocess mode: each worker (and each
+parallel render process) writes its values to files in
+PROMETHEUS_MULTIPROC_DIR, and /metrics adds them up, so counters and
+histograms cover every worker whichever one answers the scrape.
+"""
+import os
+import shutil
+import tempfile
+
+# Must be set before the workers import prometheus_client
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'label_metrics'))
+
+
+def on_starting(server):
+    """Start from empty metrics: files left by a previous run would be added to the new totals"""
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+    # Parallel render pools divide the CPUs between the workers (see ParallelRenderer.default_processes)
+    os.environ['LABEL_SERVER_WORKERS'] = str(server.cfg.workers)
+
+
+def worker_exit(server, worker):
+    """Stop the worker's parallel render processes with it"""
+    from parallel_render import shared_renderer
+    shared_renderer.shutdown()
+
+
+def child_exit(server, worker):
+    """Drop an exited worker's live gauges (in-flight jobs and uploads); its counters are kept"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,154 @@
+import os
+import io
+import time
+import hashlib
+import tempfile
+import threading
+from PIL import Image
+
+
+class DiskImageCache:
+    """
+    Content-addressed on-disk cache of processed 1-bit DataMatrix bitmaps.
+
+    Entries are written atomically (temp file + rename) so several gunicorn
+    workers can share one directory. File modification times double as the
+    LRU clock: reads touch the file, and eviction removes the oldest files
+    once the directory grows past the byte-size cap. Temp files left by a
+    worker that died mid-write count towards the cap and are removed by
+    eviction once they are old enough not to belong to a write in progress.
+    """
+
+    # Seconds after which a temp file can no longer be a write in progress
+    STALE_TEMP_SECONDS = 300
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or os.environ.get(
+            'DATAMATRIX_CACHE_DIR',
+            os.path.join(tempfile.gettempdir(), 'label_datamatrix_cache')
+        )
+        self.max_bytes = max_bytes or int(os.environ.get('DATAMATRIX_CACHE_MAX_MB', 256)) * 1024 * 1024
+
+        # Hit/miss counters for this process
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # Approximate directory size, recalculated whenever eviction runs
+        self._approx_bytes = None
+
+    def _path(self, key):
+        """File path for a cache key"""
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{digest}.png')
+
+    def get(self, key):
+        """Load a cached bitmap, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                img = Image.open(io.BytesIO(f.read()))
+                img.load()
+            # Touch the file so eviction treats it as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return img
+
+    def put(self, key, img):
+        """Store a bitmap atomically"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            buffer = io.BytesIO()
+            img.save(buffer, format='PNG', optimize=True)
+            data = buffer.getvalue()
+
+            # Write to a temp file in the same directory, then rename into place
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, self._path(key))
+            except OSError:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+        except OSError as e:
+            print(f"Error writing DataMatrix cache entry: {e}")
+            return
+
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = self._directory_size()
+            self._approx_bytes += len(data)
+            needs_eviction = self._approx_bytes > self.max_bytes
+
+        if needs_eviction:
+            self.evict()
+
+    def _entries(self):
+        """List (mtime, size, path) for every cache file and stale temp file"""
+        entries = []
+        stale_cutoff = time.time() - self.STALE_TEMP_SECONDS
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith(('.png', '.tmp')):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # Removed by another worker
+                    if entry.name.endswith('.tmp') and stat.st_mtime >= stale_cutoff:
+                        continue  # Another worker may still be writing it
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _directory_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Remove stale temp files, then least recently used entries until the cache is under 90% of its cap"""
+        # Stale temp files go first, whatever their age relative to the entries
+        entries = sorted(self._entries(), key=lambda entry: (not entry[2].endswith('.tmp'), entry[0]))
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+
+        for _, size, path in entries:
+            if total <= target and not path.endswith('.tmp'):
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass  # Already evicted by another worker
+            total -= size
+
+        with self._lock:
+            self._approx_bytes = total
+
+    def approximate_bytes(self):
+        """Directory size as last measured plus the entries written since, or None before the first write"""
+        with self._lock:
+            return self._approx_bytes
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+# Process-wide cache shared by every generator instance
+shared_image_cache = DiskImageCache()
@@ -0,0 +1,251 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.datastructures import FileStorage
+from timing import job_log_line
+from metrics import JOBS, record_generation
+
+
+class LabelJobQueue:
+    """
+    Background label generation jobs.
+
+    Jobs run on a thread pool inside the worker that accepted the upload.
+    Each job's status is kept as a JSON file next to its upload and PDF,
+    so any gunicorn worker can answer status and download requests.
+
+    While a job is queued or running, its worker touches the status file
+    every few seconds. If the worker exits (restart, deploy, crash), the
+    heartbeat stops and the job is reported as failed instead of staying
+    queued or running forever.
+    """
+
+    JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+    # Minimum seconds between progress writes while a job is rendering
+    PROGRESS_INTERVAL = 0.5
+
+    # Seconds between heartbeats of unfinished jobs, and without one after which their worker is considered gone
+    HEARTBEAT_INTERVAL = 10
+    STALE_AFTER = 60
+
+    def __init__(self, jobs_dir=None, max_workers=None, max_age_hours=24, logger=None):
+        self.jobs_dir = jobs_dir or os.environ.get(
+            'LABEL_JOBS_DIR',
+            os.path.join(tempfile.gettempdir(), 'label_jobs')
+        )
+        self.max_workers = max_workers or int(os.environ.get('LABEL_JOB_WORKERS', 2))
+        self.max_age_seconds = max_age_hours * 3600
+        self.logger = logger
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # IDs of the queued and running jobs of this process, kept alive by the heartbeat thread
+        self._active_jobs = set()
+        self._active_lock = threading.Lock()
+
+    def _get_executor(self):
+        """Create the worker pool (and its heartbeat thread) lazily so it is started inside each gunicorn worker"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='label-job')
+                threading.Thread(target=self._heartbeat, name='label-job-heartbeat', daemon=True).start()
+            return self._executor
+
+    def _heartbeat(self):
+        """Touch the status file of every unfinished job of this process"""
+        while True:
+            time.sleep(self.HEARTBEAT_INTERVAL)
+            with self._active_lock:
+                job_ids = list(self._active_jobs)
+            for job_id in job_ids:
+                try:
+                    os.utime(os.path.join(self._job_dir(job_id), 'status.json'))
+                except OSError:
+                    pass  # Removed by cleanup
+
+    def _job_dir(self, job_id):
+        if not self.JOB_ID_PATTERN.match(job_id or ''):
+            return None
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _write_status(self, job_id, status):
+        """Write the job's status file atomically"""
+        job_dir = self._job_dir(job_id)
+        fd, temp_path = tempfile.mkstemp(dir=job_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(status, f)
+        os.replace(temp_path, os.path.join(job_dir, 'status.json'))
+
+    def submit(self, generator_factory, filename, file_bytes, label_size, label_format='pdf', batch=None, bundle=False):
+        """
+        Queue a label job.
+
+        Args:
+            generator_factory: Callable returning a fresh label generator
+            filename: Original upload filename (used for format detection)
+            file_bytes: Uploaded file contents
+            label_size: Label size selection, recorded for reporting
+            label_format: Output format ('pdf', 'zpl', 'pbm' or 'zip')
+            batch: Optional batch already parsed from this file (by /api/validate), rendered without re-parsing
+            bundle: Also record the prepared labels and DataMatrix bitmaps as a bundle (see label_bundle.py)
+
+        Returns:
+            The new job ID
+        """
+        self.cleanup_old_jobs()
+
+        job_id = uuid.uuid4().hex
+        job_dir = self._job_dir(job_id)
+        os.makedirs(job_dir)
+
+        extension = filename.rsplit('.', 1)[1].lower()
+        upload_path = os.path.join(job_dir, f'upload.{extension}')
+        with open(upload_path, 'wb') as f:
+            f.write(file_bytes)
+
+        status = {
+            'job_id': job_id,
+            'pid': os.getpid(),
+            'state': 'queued',
+            'filename': filename,
+            'label_size': label_size,
+            'label_format': label_format,
+            'bundle': bundle,
+            'labels_rendered': 0,
+            'label_count': None,
+            'error': None,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None
+        }
+        self._write_status(job_id, status)
+
+        JOBS.labels('queued').inc()
+        with self._active_lock:
+            self._active_jobs.add(job_id)
+        self._get_executor().submit(self._run, job_id, generator_factory, upload_path, status, batch)
+        return job_id
+
+    def _run(self, job_id, generator_factory, upload_path, status, batch=None):
+        """Process one job in a worker thread"""
+        JOBS.labels('queued').dec()
+        JOBS.labels('running').inc()
+        status['state'] = 'running'
+        status['started_at'] = time.time()
+        self._write_status(job_id, status)
+
+        last_write = [0.0]
+
+        def report_progress(labels_rendered):
+            status['labels_rendered'] = labels_rendered
+            now = time.time()
+            if now - last_write[0] >= self.PROGRESS_INTERVAL:
+                last_write[0] = now
+                self._write_status(job_id, status)
+
+        output_path = os.path.join(self._job_dir(job_id), f'labels.{status["label_format"]}')
+        bundle_path = os.path.join(self._job_dir(job_id), 'labels.bundle')
+        bundle_output = None
+        generator = None
+        outcome = 'done'
+        try:
+            generator = generator_factory()
+            generator.label_format = status['label_format']
+            generator.progress_callback = report_progress
+            if status.get('bundle'):
+                bundle_output = generator.bundle_output = open(bundle_path, 'wb')
+
+            with open(upload_path, 'rb') as stream, open(output_path, 'wb') as output:
+                if batch is not None:
+                    _, label_count = generator.render_batch(batch, output=output)
+                else:
+                    upload = FileStorage(stream=stream, filename=status['filename'])
+                    _, label_count = generator.process_file_and_generate_pdf(upload, output=output)
+
+            status['state'] = 'done'
+            status['labels_rendered'] = label_count
+            status['label_count'] = label_count
+            if self.logger:
+                self.logger.info(f'Job {job_id}: generated {label_count} labels from {status["filename"]}')
+                self.logger.info(f'Job {job_id}: item name parse cache: {generator.parse_cache.stats()}')
+        except Exception as e:
+            outcome = 'invalid' if isinstance(e, ValueError) else 'error'
+            status['state'] = 'failed'
+            status['error'] = str(e) if isinstance(e, ValueError) else f'Error processing file: {str(e)}'
+            if self.logger:
+                self.logger.error(f'Job {job_id}: error processing {status["filename"]}: {str(e)}',
+                                  exc_info=not isinstance(e, ValueError))
+            for path in (output_path, bundle_path):
+                if os.path.exists(path):
+                    os.unlink(path)
+        finally:
+            if bundle_output is not None:
+                bundle_output.close()
+            JOBS.labels('running').dec()
+
+        status['finished_at'] = time.time()
+        if generator is not None:
+            # Stage durations and cache hit ratios, also reported by /jobs/<job_id>
+            status['timings'] = generator.timings.summary()
+            record_generation(generator, 'job', outcome, generator.layout.name, status['label_format'],
+                              output_path if outcome == 'done' else None)
+            if self.logger:
+                self.logger.info(job_log_line(
+                    generator.timings, event='label_job', job_id=job_id, state=status['state'], error=status['error'],
+                    filename=status['filename'], label_size=status['label_size'], label_format=status['label_format']
+                ))
+        self._write_status(job_id, status)
+        with self._active_lock:
+            self._active_jobs.discard(job_id)
+
+    def status(self, job_id):
+        """Current status of a job, or None if it does not exist"""
+        job_dir = self._job_dir(job_id)
+        if not job_dir:
+            return None
+        status_path = os.path.join(job_dir, 'status.json')
+        try:
+            with open(status_path, 'r', encoding='utf-8') as f:
+                status = json.load(f)
+            heartbeat_at = os.path.getmtime(status_path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        # An unfinished job whose worker stopped sending heartbeats will never finish
+        if status['state'] in ('queued', 'running') and time.time() - heartbeat_at > self.STALE_AFTER:
+            status['state'] = 'failed'
+            status['error'] = 'worker exited'
+            status['finished_at'] = heartbeat_at
+
+        # Processing time so far, or the total once finished
+        end = status['finished_at'] or time.time()
+        start = status['started_at'] or end
+        status['elapsed_seconds'] = round(end - start, 3)
+        return status
+
+    def output_path(self, job_id, label_format='pdf'):
+        """Path of a finished job's output file ('bundle' for its bundle), or None if it is not available"""
+        job_dir = self._job_dir(job_id)
+        if not job_dir:
+            return None
+        path = os.path.join(job_dir, f'labels.{label_format}')
+        return path if os.path.exists(path) else None
+
+    def cleanup_old_jobs(self):
+        """Delete job directories older than the retention period"""
+        if not os.path.isdir(self.jobs_dir):
+            return
+        cutoff = time.time() - self.max_age_seconds
+        for name in os.listdir(self.jobs_dir):
+            job_dir = os.path.join(self.jobs_dir, name)
+            try:
+                if os.path.getmtime(job_dir) < cutoff:
+                    shutil.rmtree(job_dir, ignore_errors=True)
+            except OSError:
+                pass
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Self-contained label batch bundles.
+
+A bundle records everything needed to print a batch again: the
+normalized, sorted label records (with their bin numbers and "A of X"
+positions already assigned) and the processed 1-bit DataMatrix bitmaps.
+Rendering a bundle reads no spreadsheet and makes no network requests,
+so a print run can be redone after a printer jam or on different label
+stock, and bundles can be used as fixtures for offline benchmarks.
+
+A bundle is a ZIP file with a manifest.json and one PNG per DataMatrix
+URL. Bitmaps are stored at the size of the label they were recorded for
+and resized like a fresh download when rendered at another size.
+
+Usage:
+    python label_bundle.py create orders.csv labels.bundle.zip [--label-size 2x1]
+    python label_bundle.py render labels.bundle.zip labels.pdf [--label-size 3x1] [--label-format pdf]
+"""
+import io
+import json
+import time
+import zipfile
+import argparse
+import numpy as np
+from werkzeug.datastructures import FileStorage
+from label_layout import LABEL_SIZES, LAYOUT_FIELDS
+
+BUNDLE_VERSION = 1
+
+
+def _json_value(value):
+    """JSON encoding for the numpy scalars pandas hands out"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'Cannot store {type(value).__name__} in a label bundle')
+
+
+class LabelBundle:
+    """Label records and DataMatrix bitmaps read from a bundle file"""
+
+    def __init__(self, layout, labels, images, label_size=None, created_at=None):
+        self.layout = layout
+        self.labels = labels          # List of (label_fields tuple, quantity)
+        self.images = images          # Dict of DataMatrix URL -> PNG bytes, or None for failed downloads
+        self.label_size = label_size  # Label size the bundle was recorded for, e.g. '2x1'
+        self.created_at = created_at
+
+    @property
+    def label_count(self):
+        return sum(quantity for _, quantity in self.labels)
+
+
+def write_bundle(output, layout, labels, images, label_size):
+    """
+    Write a bundle.
+
+    Args:
+        output: Writable binary file object
+        layout: 'enhanced' or 'basic'
+        labels: List of (label_fields, quantity) in print order
+        images: Dict of DataMatrix URL -> processed PIL bitmap, or None for failed downloads
+        label_size: Label size the labels were prepared for, e.g. '2x1'
+    """
+    url_index = LAYOUT_FIELDS[layout].index('datamatrix_url')
+    urls = [url for url in dict.fromkeys(label_fields[url_index] for label_fields, _ in labels) if isinstance(url, str)]
+
+    image_paths = {}
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        for number, url in enumerate(urls):
+            img = images.get(url)
+            if img is None:
+                image_paths[url] = None
+                continue
+            png = io.BytesIO()
+            img.save(png, 'PNG', optimize=True)
+            image_paths[url] = f'images/{number}.png'
+            # PNG data is already compressed
+            bundle.writestr(image_paths[url], png.getvalue(), compress_type=zipfile.ZIP_STORED)
+
+        manifest = {
+            'version': BUNDLE_VERSION,
+            'layout': layout,
+            'label_size': label_size,
+            'created_at': time.time(),
+            'label_count': sum(quantity for _, quantity in labels),
+            'fields': LAYOUT_FIELDS[layout] + ['quantity'],
+            # Missing values are kept as NaN so labels draw exactly as they did (json writes them as NaN)
+            'labels': [list(label_fields) + [quantity] for label_fields, quantity in labels],
+            'images': image_paths,
+        }
+        bundle.writestr('manifest.json', json.dumps(manifest, default=_json_value))
+
+
+def read_bundle(file):
+    """
+    Read a bundle from a path or binary file object.
+
+    Raises:
+        ValueError: If the file is not a label bundle this version can read
+    """
+    try:
+        with zipfile.ZipFile(file) as bundle:
+            manifest = json.loads(bundle.read('manifest.json'))
+            if manifest.get('version') != BUNDLE_VERSION or manifest.get('layout') not in LAYOUT_FIELDS:
+                raise ValueError('Unsupported label bundle version or layout')
+
+            images = {
+                url: bundle.read(path) if path is not None else None
+                for url, path in manifest['images'].items()
+            }
+            field_count = len(LAYOUT_FIELDS[manifest['layout']])
+            labels = [(tuple(record[:field_count]), int(record[field_count])) for record in manifest['labels']]
+    except (zipfile.BadZipFile, KeyError, IndexError, TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f'Not a valid label bundle: {e}')
+
+    return LabelBundle(manifest['layout'], labels, images, manifest.get('label_size'), manifest.get('created_at'))
+
+
+def label_size_name(generator):
+    """Label size of a generator as it is selected in the app, e.g. '2x1'"""
+    return generator.layout.name
+
+
+def create_generator(label_size):
+    from label_generator import LabelGenerator
+    from label_generator_3x1 import LabelGenerator3x1
+    return LabelGenerator3x1() if label_size == '3x1' else LabelGenerator(label_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    create = commands.add_parser('create', help='generate labels from a spreadsheet and record them in a bundle')
+    create.add_argument('spreadsheet')
+    create.add_argument('bundle')
+    create.add_argument('--label-size', choices=LABEL_SIZES, default='2x1')
+    create.add_argument('--output', help='also write the labels here')
+
+    render = commands.add_parser('render', help='render a bundle offline')
+    render.add_argument('bundle')
+    render.add_argument('output')
+    render.add_argument('--label-size', choices=LABEL_SIZES, help="default: the bundle's label size")
+    render.add_argument('--label-format', choices=['pdf', 'zpl', 'pbm', 'zip'], default='pdf')
+
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        generator = create_generator(args.label_size)
+        with open(args.spreadsheet, 'rb') as spreadsheet, open(args.bundle, 'wb') as bundle_output:
+            upload = FileStorage(stream=spreadsheet, filename=args.spreadsheet)
+            generator.bundle_output = bundle_output
+            output = open(args.output, 'wb') if args.output else io.BytesIO()
+            with output:
+                _, label_count = generator.process_file_and_generate_pdf(upload, output=output)
+        print(f'Recorded {label_count} labels in {args.bundle}')
+    else:
+        bundle = read_bundle(args.bundle)
+        generator = create_generator(args.label_size or bundle.label_size)
+        generator.label_format = args.label_format
+        with open(args.output, 'wb') as output:
+            _, label_count = generator.render_bundle(bundle, output=output)
+        print(f'Rendered {label_count} labels to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
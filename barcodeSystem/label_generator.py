@@ -1,94 +1,130 @@
 import pandas as pd
 import io
-import requests
 import json
 import os
 from PIL import Image
 from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import inch
 from reportlab.lib.colors import black
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.fonts import addMapping
-from reportlab.lib.utils import ImageReader
 import textwrap
 import os
 import tempfile
 import re
+import hashlib
+import time
 from datetime import datetime
 import barcode
 from barcode.writer import ImageWriter
-import treepoem
+from datamatrix_fetcher import shared_fetcher
+from image_cache import shared_image_cache
+from parallel_render import shared_renderer
+from zpl_writer import ZPLCanvas
+from raster_renderer import RasterCanvas, RasterLabelWriter
+from parse_cache import shared_parse_cache
+from config_service import shared_config
+from text_metrics import shared_text_metrics
+from timing import StageTimings
+from metrics import ORDER_CODE_SECONDS
+import label_bundle
+from sheet_reader import open_sheet
+from datamatrix_encoder import encode_datamatrix
+from label_layout import compile_layout
 
 class LabelGenerator:
-    def __init__(self):
-        # Label dimensions for 2" x 1" at 203 DPI
-        self.label_width = 2 * inch  # 144 points
-        self.label_height = 1 * inch  # 72 points
-        self.dpi = 203
-
-        # Layout dimensions
-        self.margin = 5  # 5 points margin
-        self.datamatrix_size = 0.3825 * inch  # 15% smaller than original 0.45" for space optimization
-        self.title_width = self.label_width * 0.7   # 70% for title, 30% for datamatrix
-
-        # Font sizes
-        self.size_font_size = 10  # Same as product type font size
-        self.title_font_size = 4   # Reduced further to fit vertically
-        self.product_type_font_size = 10  # Increased to 10pt
-        self.bottom_text_font_size = 4  # Same - will use 2 rows
-
-        # Image cache for DataMatrix
+    # HTML tags are stripped from item names before parsing
+    HTML_TAG_PATTERN = r'<[^>]+>'
+
+    # Patterns for the "Product Type - Color - Size - Title" item name layout. They do not depend on
+    # where the product type matched, so they can also run over a whole column at once.
+    # Dash, comma, and forward slash separators are supported.
+    # IMPORTANT: Order matters! Match longest patterns first
+    START_SIZE_PATTERN = r'-\s*(Black|White|Vintage Black|Stone Wash|Pepper)[-,/]\s*(?P<size>[0-9]+X-Large|[0-9]+XL|XL(?![A-Z])|X{1,6}-?Large|Small|Medium|Large|[SML](?![A-Z]))\s*[-,/]'
+    START_SIZE_FALLBACK_PATTERN = r'[-,/]\s*(?P<size>[0-9]+X-Large|[0-9]+XL|XL(?![A-Z])|X{1,6}-?Large|Small|Medium|Large|[SML](?![A-Z]))\s*([-,/]|$)'
+    START_TITLE_PATTERN = r'[-,/]\s*([0-9]+X-Large|[0-9]+XL|XL(?![A-Z])|X{1,6}-?Large|Small|Medium|Large|[SML](?![A-Z]))\s*[-,/]\s*(?P<title>.*?)$'
+
+    # Columns used from each file format; other columns of an upload are never loaded
+    NEW_FORMAT_COLUMNS = ['Order - Number', 'Item - SKU', 'Item - Name', 'Item - Qty', 'Item - Image URL', 'Market - Store Name', 'Date - Ship By Date']
+    OLD_FORMAT_COLUMNS = ['Product', 'Size', 'Quantity', 'Datamatrix URL']
+
+    # Column types for CSV uploads: order numbers and SKUs stay text, quantities are whole numbers
+    COLUMN_TYPES = {
+        'Order - Number': 'string', 'Item - SKU': 'string', 'Item - Name': 'string', 'Item - Qty': 'integer',
+        'Item - Image URL': 'string', 'Market - Store Name': 'string', 'Date - Ship By Date': 'string',
+        'Product': 'string', 'Size': 'string', 'Quantity': 'integer', 'Datamatrix URL': 'string'
+    }
+
+    # Order code symbology this generator encodes; sizes drawn with the other one belong to LabelGenerator3x1
+    ORDER_CODE_SYMBOLOGY = 'datamatrix'
+
+    def __init__(self, label_size='2x1'):
+        # Geometry, fonts and draw operations of the label size (2" x 1" at 203 DPI unless another is given)
+        self.layout = compile_layout(label_size)
+        if self.layout.order_code_symbology != self.ORDER_CODE_SYMBOLOGY:
+            raise ValueError(f'{label_size} labels carry a {self.layout.order_code_symbology} order code; use LabelGenerator3x1')
+        self.label_width, self.label_height = self.layout.page_size
+        self.dpi = self.layout.dpi
+
+        # Product DataMatrix size, which downloaded images are scaled to
+        self.datamatrix_size = self.layout.product_datamatrix_size
+
+        # Image cache for DataMatrix (filled by prefetch_datamatrix_images before rendering)
         self.image_cache = {}
+        self.fetcher = shared_fetcher
+
+        # On-disk cache of processed DataMatrix bitmaps shared across requests and workers
+        self.disk_cache = shared_image_cache
+
+        # Process pool used to render large batches in parallel shards
+        self.renderer = shared_renderer
+
+        # Optional callable receiving the running label count while a PDF is generated
+        self.progress_callback = None
+
+        # Time spent in each stage (read, parse, fetch, render, save, ...) for the logs and Server-Timing header
+        self.timings = StageTimings()
+
+        # Optional writable file that also receives a bundle of the prepared labels and their
+        # DataMatrix bitmaps, which render_bundle can print again offline (see label_bundle.py)
+        self.bundle_output = None
+
+        # Optional SheetLayout: PDF labels are placed in a grid on sheet stock instead of one per page
+        self.sheet = None
+
+        # Output format: 'pdf' (one page per label), 'zpl' (ZPL II for Zebra printers),
+        # or 'pbm' / 'zip' (1-bit bitmaps as a PBM stream or a ZIP of PNGs)
+        self.label_format = 'pdf'
 
         # Barcode cache for order numbers
         self.barcode_cache = {}
 
-        # DataMatrix cache for order numbers
+        # DataMatrix module matrix cache for order numbers
         self.datamatrix_cache = {}
 
-        # Load configuration from JSON file
-        self.config_file = 'product_mappings.json'
+        # Parse results memoized across rows and requests, keyed by configuration version
+        self.parse_cache = shared_parse_cache
+
+        # Text widths, truncations and wrapped title lines memoized across labels and requests
+        self.text_metrics = shared_text_metrics
+
+        # Configuration from the JSON file, shared by all generators and reloaded when the file changes
+        self.config_service = shared_config
         self.load_configuration()
 
     def load_configuration(self):
-        """Load product types and shortening rules from JSON configuration file"""
-        try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    self.product_types = config.get('product_types', [])
-                    self.shortening_rules = config.get('shortening_rules', [])
-                    self.max_bins = config.get('max_bins', 12)
-                    self.overflow_name = config.get('overflow_name', 'THEPIT')
-            else:
-                # Fallback to default configuration if file doesn't exist
-                self.product_types = [
-                    'Soft Premium Tee - Black',
-                    'Soft Premium Tee - White',
-                    'Luxury Heavy Tee - Black',
-                    'Luxury Heavy Tee - Vintage Black',
-                    'Luxury Heavy Tee - Stone Wash',
-                    'Vintage Crew Sweatshirt - Pepper',
-                    'Luxury Hoodie - Vintage Black',
-                    'Unisex Fleece Sweat Shorts',
-                    'Insulated Can Cooler',
-                    'Trucker Hat'
-                ]
-                self.shortening_rules = []
-                self.max_bins = 12
-                self.overflow_name = 'THEPIT'
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            print(f"Error loading configuration: {e}. Using defaults.")
-            # Use default fallback
-            self.product_types = [
-                'Soft Premium Tee - Black',
-                'Soft Premium Tee - White',
-                'Luxury Heavy Tee - Black'
-            ]
-            self.shortening_rules = []
-            self.max_bins = 12
-            self.overflow_name = 'THEPIT'
+        """Take the current configuration snapshot (loaded and compiled once per change of the JSON file)"""
+        self.config = self.config_service.snapshot()
+        self.product_types = self.config.product_types
+        self.shortening_rules = self.config.shortening_rules
+        self.max_bins = self.config.max_bins
+        self.overflow_name = self.config.overflow_name
+
+        # Product types compiled into one matcher per configuration version
+        self.product_matcher = self.config.product_matcher
+
+        # Keys the shared parse cache
+        self.config_version = self.config.version
 
     def reload_configuration(self):
         """Reload configuration from file - useful for settings updates"""
@@ -96,12 +132,13 @@ class LabelGenerator:
 
     def detect_file_format(self, df):
         """Detect whether this is the old or new format"""
-        new_format_columns = ['Order - Number', 'Item - SKU', 'Item - Name', 'Item - Qty', 'Item - Image URL', 'Market - Store Name', 'Date - Ship By Date']
-        old_format_columns = ['Product', 'Size', 'Quantity', 'Datamatrix URL']
+        return self.detect_format_from_columns(df.columns)
 
+    def detect_format_from_columns(self, columns):
+        """Detect the old or new format from a sheet's column names"""
         # Check if this looks like the new format
-        new_format_score = sum(1 for col in new_format_columns if col in df.columns)
-        old_format_score = sum(1 for col in old_format_columns if col in df.columns)
+        new_format_score = sum(1 for col in self.NEW_FORMAT_COLUMNS if col in columns)
+        old_format_score = sum(1 for col in self.OLD_FORMAT_COLUMNS if col in columns)
 
         if new_format_score >= 5:  # Most new format columns present
             return 'new'
@@ -110,28 +147,62 @@ class LabelGenerator:
         else:
             raise ValueError("Unable to detect file format. Please ensure your file has the required columns.")
 
-    def process_file_and_generate_pdf(self, file):
-        """Main method to process uploaded file and generate PDF"""
-        # Read file based on extension
-        filename = file.filename.lower()
-
-        if filename.endswith('.xlsx'):
-            df = pd.read_excel(file)
-        elif filename.endswith('.csv'):
-            df = pd.read_csv(file)
-        else:
-            raise ValueError("File must be .xlsx or .csv")
-
-        # Detect format and process accordingly
-        file_format = self.detect_file_format(df)
+    def process_file_and_generate_pdf(self, file, output=None):
+        """
+        Main method to process uploaded file and generate PDF
+
+        Args:
+            file: Uploaded .xlsx or .csv file
+            output: Optional writable file object to render the PDF into (default: a new BytesIO)
+        """
+        return self.render_batch(self.parse_batch(self.read_upload(file)), output)
+
+    def read_upload(self, file):
+        """
+        Read an uploaded .xlsx or .csv file into a DataFrame
+
+        The header row is read first to detect the format, and only the
+        columns that format uses are loaded from the rest of the file.
+        """
+        with self.timings.span('read'), open_sheet(file) as sheet:
+            file_format = self.detect_format_from_columns(sheet.columns)
+            df = sheet.read(self.NEW_FORMAT_COLUMNS if file_format == 'new' else self.OLD_FORMAT_COLUMNS, self.COLUMN_TYPES)
+        self.timings.count('rows', len(df))
+        return df
+
+    def parse_batch(self, df):
+        """
+        Validate and parse an uploaded sheet into the rows that get rendered
+
+        Returns:
+            (file format, DataFrame) batch for render_batch: the sheet itself for the
+            old format, or the parsed and normalized rows for the new format
+        """
+        with self.timings.span('parse'):
+            # Detect format and process accordingly
+            file_format = self.detect_file_format(df)
+
+            if file_format == 'new':
+                return file_format, self.parse_new_format(df)
+            else:
+                return file_format, self.parse_old_format(df)
 
+    def render_batch(self, batch, output=None):
+        """Sort, fetch images for and render a batch from parse_batch"""
+        file_format, df = batch
         if file_format == 'new':
-            return self.process_new_format(df)
+            buffer, label_count = self.generate_enhanced_pdf(df, output)
         else:
-            return self.process_old_format(df)
+            buffer, label_count = self.generate_pdf(df, output)
+        self.timings.count('labels', label_count)
+        return buffer, label_count
 
-    def process_old_format(self, df):
+    def process_old_format(self, df, output=None):
         """Process the original format"""
+        return self.generate_pdf(self.parse_old_format(df), output)
+
+    def parse_old_format(self, df):
+        """Check that an original format sheet has the required columns"""
         # Validate required columns
         required_columns = ['Product', 'Size', 'Quantity', 'Datamatrix URL']
         missing_columns = [col for col in required_columns if col not in df.columns]
@@ -139,11 +210,14 @@ class LabelGenerator:
         if missing_columns:
             raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
 
-        # Generate PDF using old format
-        return self.generate_pdf(df)
+        return df
 
-    def process_new_format(self, df):
+    def process_new_format(self, df, output=None):
         """Process the new format with order details"""
+        return self.generate_enhanced_pdf(self.parse_new_format(df), output)
+
+    def parse_new_format(self, df):
+        """Parse new format rows into the normalized label rows (product, type, size, order details)"""
         # Validate required columns for new format
         required_columns = ['Item - Name', 'Item - Qty', 'Item - Image URL']
         missing_columns = [col for col in required_columns if col not in df.columns]
@@ -157,43 +231,56 @@ class LabelGenerator:
         if df_filtered.empty:
             raise ValueError("No valid product rows found in the file.")
 
-        # Parse item names to extract product types and sizes
-        parsed_data = []
-        for _, row in df_filtered.iterrows():
-            parsed_item = self.parse_item_name(row['Item - Name'])
-            if parsed_item:  # Only process if we could extract the info
-                data_row = {
-                    'Product': parsed_item['title'],
-                    'ProductType': parsed_item['product_type'],
-                    'Size': parsed_item['size'],
-                    'Quantity': int(row['Item - Qty']) if pd.notna(row['Item - Qty']) else 1,
-                    'Datamatrix URL': row['Item - Image URL'],
-                    'OrderNumber': row.get('Order - Number', ''),
-                    'SKU': row.get('Item - SKU', ''),
-                    'StoreName': row.get('Market - Store Name', ''),
-                    'ShipDate': self.format_date(row.get('Date - Ship By Date', ''))
-                }
-
-                # Add sorting metadata if available
-                if 'rule_index' in parsed_item:
-                    data_row['RuleIndex'] = parsed_item['rule_index']
-                    data_row['ConditionIndex'] = parsed_item['condition_index']
-                    data_row['OriginalProductType'] = parsed_item['original_product_type']
-                else:
-                    # No rule matched - assign high values for sorting to end
-                    data_row['RuleIndex'] = 9999
-                    data_row['ConditionIndex'] = 9999
-                    data_row['OriginalProductType'] = parsed_item.get('original_product_type', parsed_item['product_type'])
-
-                parsed_data.append(data_row)
+        # Parse item names to extract product types and sizes (vectorized over the whole column)
+        with self.timings.span('parse_items'):
+            parsed_items = self.parse_item_names(df_filtered['Item - Name'])
+        matched = [parsed_item is not None for parsed_item in parsed_items]
+        parsed_items = [parsed_item for parsed_item in parsed_items if parsed_item is not None]
 
-        if not parsed_data:
+        if not parsed_items:
             raise ValueError("Could not extract product information from any items.")
 
-        parsed_df = pd.DataFrame(parsed_data)
-
-        # Generate PDF using enhanced format
-        return self.generate_enhanced_pdf(parsed_df)
+        # Only process rows where we could extract the info
+        rows = df_filtered[matched]
+        self.timings.count('unparsed_items', len(df_filtered) - len(rows))
+
+        def column(name, default=''):
+            """Column values for the matched rows, or a constant when the export does not have the column"""
+            return rows[name].to_numpy() if name in rows.columns else default
+
+        # Missing quantities default to 1; any other value must be one int() accepts
+        quantities = self.parse_quantities(rows['Item - Qty'])
+
+        parsed_df = pd.DataFrame({
+            'Product': [parsed_item['title'] for parsed_item in parsed_items],
+            'ProductType': [parsed_item['product_type'] for parsed_item in parsed_items],
+            'Size': [parsed_item['size'] for parsed_item in parsed_items],
+            'Quantity': quantities.to_numpy(),
+            'Datamatrix URL': rows['Item - Image URL'].to_numpy(),
+            'OrderNumber': column('Order - Number'),
+            'SKU': column('Item - SKU'),
+            'StoreName': column('Market - Store Name'),
+            'ShipDate': self.format_dates(rows['Date - Ship By Date']).to_numpy() if 'Date - Ship By Date' in rows.columns else '',
+
+            # Sorting metadata; rows where no rule matched get high values to sort to the end
+            'RuleIndex': [parsed_item.get('rule_index', 9999) for parsed_item in parsed_items],
+            'ConditionIndex': [parsed_item.get('condition_index', 9999) for parsed_item in parsed_items],
+            'OriginalProductType': [parsed_item.get('original_product_type', parsed_item['product_type']) for parsed_item in parsed_items]
+        })
+
+        return parsed_df
+
+    def parse_quantities(self, quantities):
+        """
+        Label counts of an Item - Qty column, as int() reads them row by row.
+
+        Missing quantities are 1. Each distinct value is converted once with
+        int(), so a value that is not a number (such as "2x") raises
+        ValueError instead of silently printing one label.
+        """
+        present = quantities.notna()
+        converted = {value: int(value) for value in pd.unique(quantities[present])}
+        return quantities.map(converted).where(present, 1).astype(int)
 
     def parse_item_name(self, item_name):
         """Extract product type, size, and title from HTML item name"""
@@ -201,41 +288,87 @@ class LabelGenerator:
             return None
 
         # Remove HTML tags
-        clean_text = re.sub(r'<[^>]+>', '', item_name)
-
-        # Try to match each product type (case insensitive), prioritizing longer matches
-        product_type_found = None
-        best_match = ""
-        product_type_match = None
-
-        for product_type in self.product_types:
-            # Create a flexible pattern for the full product type
-            full_pattern = product_type.replace(' - ', r'\s*-\s*').replace(' ', r'\s+')
-            match = re.search(full_pattern, clean_text, re.IGNORECASE)
-
-            if match:
-                matched_text = match.group(0)
-                # Prefer longer matches (more specific)
-                if len(matched_text) > len(best_match):
-                    product_type_found = matched_text
-                    best_match = matched_text
-                    product_type_match = match
-
-        # If no full match found, try base types as fallback
-        if not product_type_found:
-            for product_type in self.product_types:
-                base_type = product_type.split(' - ')[0]  # e.g., "Soft Premium Tee"
-                pattern = base_type.replace(' ', r'\s+')
-                match = re.search(pattern, clean_text, re.IGNORECASE)
-                if match:
-                    matched_text = match.group(0)
-                    if len(matched_text) > len(best_match):
-                        product_type_found = matched_text
-                        best_match = matched_text
-                        product_type_match = match
-
-        if not product_type_found:
+        clean_text = re.sub(self.HTML_TAG_PATTERN, '', item_name)
+
+        found, result = self.parse_cache.get(type(self).__name__, self.config_version, clean_text)
+        if not found:
+            result = self.parse_clean_item_name(clean_text)
+            self.parse_cache.put(type(self).__name__, self.config_version, clean_text, result)
+        return result
+
+    def parse_item_names(self, item_names):
+        """
+        Parse a whole column of HTML item names.
+
+        HTML stripping and the fixed size/title patterns run as vectorized
+        string operations, and each distinct name is parsed once; only the
+        product type match and the steps that depend on its position run
+        per name. Names parsed before under the same configuration come
+        from the shared parse cache.
+
+        Returns:
+            List of parse results (dict, or None if a name could not be parsed) in item_names order
+        """
+        names = item_names.astype(object)
+        valid = names.notna() & names.astype(str).str.strip().ne('')
+
+        clean_texts = names[valid].astype(str).str.replace(self.HTML_TAG_PATTERN, '', regex=True)
+        codes, distinct_texts = pd.factorize(clean_texts)
+
+        # Names already parsed by an earlier upload, validation or job come from the shared memo
+        parser = type(self).__name__
+        cached = self.parse_cache.get_many(parser, self.config_version, distinct_texts)
+
+        new_texts = pd.Series([clean_text for clean_text in distinct_texts if clean_text not in cached], dtype=object)
+        self.timings.count('parse_cache_hits', len(cached))
+        self.timings.count('parse_cache_misses', len(new_texts))
+        parsed = {
+            clean_text: self.parse_clean_item_name(clean_text, start_layout_fields)
+            for clean_text, start_layout_fields in zip(new_texts, self.extract_start_layout_columns(new_texts))
+        }
+        self.parse_cache.put_many(parser, self.config_version, parsed)
+
+        distinct_results = [cached[clean_text] if clean_text in cached else parsed[clean_text] for clean_text in distinct_texts]
+
+        results = [None] * len(names)
+        for position, code in zip(valid.to_numpy().nonzero()[0], codes):
+            results[position] = distinct_results[code]
+        return results
+
+    def extract_start_layout_fields(self, clean_text):
+        """Raw size and title for the "Product Type - Color - Size - Title" layout (None where not found)"""
+        size_match = (re.search(self.START_SIZE_PATTERN, clean_text, re.IGNORECASE)
+                      or re.search(self.START_SIZE_FALLBACK_PATTERN, clean_text, re.IGNORECASE))
+        title_match = re.search(self.START_TITLE_PATTERN, clean_text, re.IGNORECASE)
+        return (size_match.group('size') if size_match else None,
+                title_match.group('title') if title_match else None)
+
+    def extract_start_layout_columns(self, clean_texts):
+        """Vectorized extract_start_layout_fields over a Series of cleaned item names"""
+        sizes = clean_texts.str.extract(self.START_SIZE_PATTERN, flags=re.IGNORECASE)['size']
+        fallback_sizes = clean_texts.str.extract(self.START_SIZE_FALLBACK_PATTERN, flags=re.IGNORECASE)['size']
+        titles = clean_texts.str.extract(self.START_TITLE_PATTERN, flags=re.IGNORECASE)['title']
+
+        sizes = sizes.where(sizes.notna(), fallback_sizes)
+        return [
+            (size if isinstance(size, str) else None, title if isinstance(title, str) else None)
+            for size, title in zip(sizes, titles)
+        ]
+
+    def parse_clean_item_name(self, clean_text, start_layout_fields=None):
+        """
+        Extract product type, size, and title from an item name with HTML already removed
+
+        Args:
+            clean_text: Item name without HTML tags
+            start_layout_fields: Optional (raw size, raw title) already extracted by extract_start_layout_columns
+        """
+        # Find the configured product type (case insensitive): the longest full match wins,
+        # with base types (e.g., "Soft Premium Tee") as fallback
+        product_type_match = self.product_matcher.search(clean_text)
+        if not product_type_match:
             return None
+        product_type_found = product_type_match.group(0)
 
         # Determine if product type is at the beginning or end of the string
         product_type_start = product_type_match.start()
@@ -278,30 +411,17 @@ class LabelGenerator:
                         size = self.normalize_size(potential_size)
         else:
             # Original pattern: Product Type - Color - Size - Title
-            # Extract size - look for specific size patterns after color
-            # Support dash, comma, and forward slash separators
-            # IMPORTANT: Order matters! Match longest patterns first
-            size_pattern = r'-\s*(Black|White|Vintage Black|Stone Wash|Pepper)[-,/]\s*([0-9]+X-Large|[0-9]+XL|XL(?![A-Z])|X{1,6}-?Large|Small|Medium|Large|[SML](?![A-Z]))\s*[-,/]'
-            size_match = re.search(size_pattern, clean_text, re.IGNORECASE)
-
-            if size_match:
-                size = self.normalize_size(size_match.group(2))
-            else:
-                # Fallback: look for size patterns after any dash, comma, or forward slash
-                # IMPORTANT: Order matters! Match longest patterns first
-                fallback_size = r'[-,/]\s*([0-9]+X-Large|[0-9]+XL|XL(?![A-Z])|X{1,6}-?Large|Small|Medium|Large|[SML](?![A-Z]))\s*([-,/]|$)'
-                size_match = re.search(fallback_size, clean_text, re.IGNORECASE)
-                if size_match:
-                    size = self.normalize_size(size_match.group(1))
+            # Size and title follow fixed patterns, so a column-wide pass may have extracted them already
+            if start_layout_fields is None:
+                start_layout_fields = self.extract_start_layout_fields(clean_text)
+            raw_size, raw_title = start_layout_fields
 
-            # Extract the title (everything after size)
-            # Support dash, comma, and forward slash separators
-            # IMPORTANT: Order matters! Match longest patterns first
-            title_pattern = r'[-,/]\s*([0-9]+X-Large|[0-9]+XL|XL(?![A-Z])|X{1,6}-?Large|Small|Medium|Large|[SML](?![A-Z]))\s*[-,/]\s*(.*?)$'
-            title_match = re.search(title_pattern, clean_text, re.IGNORECASE)
+            if raw_size:
+                size = self.normalize_size(raw_size)
 
-            if title_match:
-                title = title_match.group(2).strip()
+            # Title is everything after the size
+            if raw_title is not None:
+                title = raw_title.strip()
             else:
                 # Fallback: take everything after the last dash or comma
                 last_separator_pos = max(clean_text.rfind(' - '), clean_text.rfind(', '))
@@ -349,32 +469,19 @@ class LabelGenerator:
         # Use full text for condition matching if available, otherwise use product type
         search_text = full_text.upper() if full_text else product_type_upper
 
-        # Apply shortening rules from configuration
-        for rule_index, rule in enumerate(self.shortening_rules):
-            pattern = rule.get('pattern', '').upper()
+        # Apply shortening rules from configuration (patterns and contains texts are upper-cased once per version)
+        for rule_index, pattern, conditions in self.config.compiled_rules:
             if pattern and pattern in product_type_upper:
-                conditions = rule.get('conditions', [])
-
                 # Check conditions in order
-                for condition_index, condition in enumerate(conditions):
-                    if condition.get('default', False):
-                        # Default fallback rule
+                for condition_index, is_default, contains_text, condition in conditions:
+                    # Default fallback rule, or the full text contains the condition text
+                    if is_default or (contains_text is not None and contains_text in search_text):
                         match_metadata = {
                             'rule_index': rule_index,
                             'condition_index': condition_index,
                             'original_product_type': product_type
                         }
                         return condition.get('result', product_type), match_metadata
-                    elif 'contains' in condition:
-                        contains_text = condition['contains'].upper()
-                        # Check against the full text for better matching
-                        if contains_text in search_text:
-                            match_metadata = {
-                                'rule_index': rule_index,
-                                'condition_index': condition_index,
-                                'original_product_type': product_type
-                            }
-                            return condition.get('result', product_type), match_metadata
 
                 # If no conditions match but pattern does, return original
                 break
@@ -451,117 +558,117 @@ class LabelGenerator:
         except:
             return str(date_str)[:10]  # Fallback to first 10 characters
 
-    def fetch_datamatrix_image(self, url):
-        """Download and cache DataMatrix image from URL"""
-        if url in self.image_cache:
-            return self.image_cache[url]
-
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-
-            # Open image and convert to high contrast B&W
-            img = Image.open(io.BytesIO(response.content))
-
-            # Convert to grayscale first, then to black and white for crisp edges
-            img = img.convert('L')  # Grayscale
-            img = img.point(lambda x: 0 if x < 128 else 255, '1')  # Binary B&W
+    def format_dates(self, dates):
+        """Vectorized format_date over a column of ship dates"""
+        text = dates.astype(object).where(dates.notna(), '').astype(str).str.strip()
+
+        # Handle formats like "9/26/2025 10:46:54 PM" -> "9/26/25"
+        has_time = text.str.contains(':', regex=False) | text.str.contains('AM', regex=False) | text.str.contains('PM', regex=False)
+        parts = text.str.split(' ').str[0].str.split('/')
+        is_date_time = text.str.contains('/', regex=False) & has_time & (parts.str.len() == 3)
+
+        year = parts.str[2]
+        short_year = year.where(year.str.len() != 4, year.str[-2:])
+        short_dates = parts.str[0] + '/' + parts.str[1] + '/' + short_year
+
+        # Other formats: take the first 10 characters
+        return short_dates.where(is_date_time, text.str[:10])
+
+    def process_datamatrix_image(self, content):
+        """Convert downloaded DataMatrix image bytes into a high contrast, label-sized bitmap"""
+        # Open image and convert to high contrast B&W
+        img = Image.open(io.BytesIO(content))
+
+        # Convert to grayscale first, then to black and white for crisp edges
+        img = img.convert('L')  # Grayscale
+        img = img.point(lambda x: 0 if x < 128 else 255, '1')  # Binary B&W
+
+        # Resize to target size while maintaining aspect ratio
+        target_size = (int(self.datamatrix_size * self.dpi / 72),
+                      int(self.datamatrix_size * self.dpi / 72))
+        return img.resize(target_size, Image.NEAREST)
+
+    def datamatrix_cache_key(self, url):
+        """Disk cache key for a DataMatrix URL at this label's bitmap size"""
+        target_px = int(self.datamatrix_size * self.dpi / 72)
+        return f"{url}|{target_px}x{target_px}"
+
+    def prefetch_datamatrix_images(self, urls):
+        """Warm the image cache from disk, then download the remaining URLs concurrently"""
+        with self.timings.span('fetch'):
+            pending = [url for url in dict.fromkeys(urls) if isinstance(url, str) and url not in self.image_cache]
+
+            # Known products are served from the shared disk cache without any network I/O
+            to_download = []
+            for url in pending:
+                img = self.disk_cache.get(self.datamatrix_cache_key(url))
+                if img is not None:
+                    self.image_cache[url] = img
+                else:
+                    to_download.append(url)
+            self.timings.count('datamatrix_disk_hits', len(pending) - len(to_download))
+            self.timings.count('datamatrix_disk_misses', len(to_download))
 
-            # Resize to target size while maintaining aspect ratio
-            target_size = (int(self.datamatrix_size * self.dpi / 72),
-                          int(self.datamatrix_size * self.dpi / 72))
-            img = img.resize(target_size, Image.NEAREST)
+            downloaded = self.fetcher.fetch_many(to_download, self.process_datamatrix_image, timings=self.timings)
+            for url, img in downloaded.items():
+                if img is not None:
+                    self.disk_cache.put(self.datamatrix_cache_key(url), img)
+            self.timings.count('datamatrix_download_failures', sum(1 for img in downloaded.values() if img is None))
 
-            # Cache the processed PIL image
-            self.image_cache[url] = img
-            return img
+            # Failed downloads are cached as None so the render loop never retries them
+            self.image_cache.update(downloaded)
 
-        except Exception as e:
-            print(f"Error fetching DataMatrix from {url}: {e}")
+    def fetch_datamatrix_image(self, url):
+        """Get a DataMatrix image from the cache, downloading it if it was not prefetched"""
+        if not isinstance(url, str) or not url.strip():
             return None
 
-    def wrap_text(self, text, max_width, font_name, font_size, canvas_obj):
-        """Wrap text to fit within specified width"""
-        words = text.split()
-        lines = []
-        current_line = []
-
-        for word in words:
-            test_line = ' '.join(current_line + [word])
-            text_width = canvas_obj.stringWidth(test_line, font_name, font_size)
-
-            if text_width <= max_width:
-                current_line.append(word)
-            else:
-                if current_line:
-                    lines.append(' '.join(current_line))
-                    current_line = [word]
-                else:
-                    # Word is too long, break it
-                    lines.append(word[:20] + '...' if len(word) > 20 else word)
-
-        if current_line:
-            lines.append(' '.join(current_line))
+        if url in self.image_cache:
+            return self.image_cache[url]
 
-        return lines[:2]  # Maximum 2 lines to fit vertically
+        img = self.disk_cache.get(self.datamatrix_cache_key(url))
+        if img is None:
+            with self.timings.span('fetch'):
+                start = time.perf_counter()
+                error = None
+                try:
+                    img = self.process_datamatrix_image(self.fetcher.fetch(url))
+                    self.disk_cache.put(self.datamatrix_cache_key(url), img)
+                except Exception as e:
+                    print(f"Error fetching DataMatrix from {url}: {e}")
+                    error = str(e)
+                    img = None
+                self.timings.record_url(url, time.perf_counter() - start, error)
+
+        # Cache the processed PIL image
+        self.image_cache[url] = img
+        return img
+
+    def form_name(self, prefix, *values):
+        """Stable Form XObject name for a piece of label content"""
+        digest = hashlib.sha1(repr(values).encode('utf-8')).hexdigest()[:16]
+        return f"{prefix}_{digest}"
+
+    def label_form(self, c, draw_function, *label_fields):
+        """Draw a label once as a Form XObject and return its name so every copy can reference it"""
+        form_name = self.form_name(draw_function.__name__, *label_fields)
+        if not c.hasForm(form_name):
+            c.beginForm(form_name)
+            draw_function(c, *label_fields)
+            c.endForm()
+        return form_name
 
     def create_label_page(self, c, product, size, datamatrix_url):
         """Create a single label page in the PDF"""
-        # Set page size to exactly 2" x 1"
-        c.setPageSize((self.label_width, self.label_height))
-
-        # Draw size at top center (bold, large)
-        c.setFont("Helvetica-Bold", self.size_font_size)
-        size_width = c.stringWidth(size, "Helvetica-Bold", self.size_font_size)
-        size_x = (self.label_width - size_width) / 2
-        size_y = self.label_height - self.margin - self.size_font_size
-        c.drawString(size_x, size_y, size)
-
-        # Wrap and draw product title (left side)
-        c.setFont("Helvetica", self.title_font_size)
-        title_lines = self.wrap_text(
-            product,
-            self.title_width - 2 * self.margin,
-            "Helvetica",
-            self.title_font_size,
-            c
-        )
-
-        # Draw title lines
-        title_start_y = size_y - self.margin - self.title_font_size
-        for i, line in enumerate(title_lines):
-            line_y = title_start_y - (i * (self.title_font_size + 2))
-            c.drawString(self.margin, line_y, line)
-
-        # Draw DataMatrix image (top right corner)
-        datamatrix_pil_img = self.fetch_datamatrix_image(datamatrix_url)
-        if datamatrix_pil_img:
-            # Position DataMatrix in top right corner
-            datamatrix_x = self.label_width - self.datamatrix_size - self.margin
-            datamatrix_y = self.label_height - self.datamatrix_size - self.margin
-
-            # Draw PIL image using ImageReader
-            c.drawImage(
-                ImageReader(datamatrix_pil_img),
-                datamatrix_x,
-                datamatrix_y,
-                width=self.datamatrix_size,
-                height=self.datamatrix_size,
-                preserveAspectRatio=True
-            )
-
-            # Draw "FRONT" text below DataMatrix in 6pt font
-            c.setFont("Helvetica-Bold", 6)
-            front_text = "FRONT"
-            front_text_width = c.stringWidth(front_text, "Helvetica-Bold", 6)
-            # Center the text below the DataMatrix
-            front_text_x = datamatrix_x + (self.datamatrix_size - front_text_width) / 2
-            front_text_y = datamatrix_y - 6  # 6 points below the DataMatrix
-            c.drawString(front_text_x, front_text_y, front_text)
+        self.draw_label(c, product, size, datamatrix_url)
 
         # Finish the page
         c.showPage()
 
+    def draw_label(self, c, product, size, datamatrix_url):
+        """Draw the contents of a single label"""
+        self.layout.draw_label(c, self, product, size, datamatrix_url)
+
     def sort_hierarchically(self, df):
         """Sort dataframe hierarchically by rule order, condition order, then size"""
         # Define size order for optimal picking workflow
@@ -651,39 +758,35 @@ class LabelGenerator:
             return None
 
     def generate_order_datamatrix(self, order_number):
-        """Generate a DataMatrix code from order number"""
-        if not order_number:
+        """Encode an order number as a DataMatrix module matrix"""
+        if not order_number or pd.isna(order_number):
             return None
 
         # Check cache first
         if order_number in self.datamatrix_cache:
+            self.timings.count('order_datamatrix_hits')
             return self.datamatrix_cache[order_number]
+        self.timings.count('order_datamatrix_misses')
 
         try:
-            # Generate DataMatrix using treepoem
-            img = treepoem.generate_barcode(
-                barcode_type='datamatrix',
-                data=order_number
-            )
-
-            # Convert to grayscale, then to black and white for crisp edges (same as product DataMatrix)
-            img = img.convert('L')  # Grayscale
-            img = img.point(lambda x: 0 if x < 128 else 255, '1')  # Binary B&W
-
-            # Resize to target size (match the product DataMatrix size)
-            target_size = (int(self.datamatrix_size * self.dpi / 72),
-                          int(self.datamatrix_size * self.dpi / 72))
-            img = img.resize(target_size, Image.NEAREST)
+            # Encode in-process (ECC200) - no ghostscript subprocess per order
+            with self.timings.span('codes'), ORDER_CODE_SECONDS.labels('datamatrix').time():
+                matrix = encode_datamatrix(str(order_number))
 
-            # Cache the DataMatrix image
-            self.datamatrix_cache[order_number] = img
+            # Cache the module matrix
+            self.datamatrix_cache[order_number] = matrix
 
-            return img
+            return matrix
 
         except Exception as e:
             print(f"Error generating DataMatrix for {order_number}: {e}")
             return None
 
+    def report_progress(self, label_count):
+        """Pass the number of labels rendered so far to the progress callback, if one is set"""
+        if self.progress_callback:
+            self.progress_callback(label_count)
+
     def sort_by_size(self, df):
         """Sort dataframe by size in garment picking order"""
         # Define size order for optimal picking workflow
@@ -706,203 +809,118 @@ class LabelGenerator:
 
         return df_sorted
 
-    def generate_pdf(self, df):
+    def generate_pdf(self, df, output=None):
         """Generate PDF with one label per page for thermal printer"""
         # Sort labels by size for optimal picking workflow
-        df_sorted = self.sort_by_size(df)
+        with self.timings.span('sort'):
+            df_sorted = self.sort_by_size(df)
+
+        # Download every DataMatrix up front so rendering only reads from the cache
+        self.prefetch_datamatrix_images(df_sorted['Datamatrix URL'])
 
-        # Create PDF buffer
-        buffer = io.BytesIO()
+        with self.timings.span('prepare'):
+            labels = [
+                ((row['Product'], row['Size'], row['Datamatrix URL']), int(row['Quantity']))
+                for _, row in df_sorted.iterrows()
+            ]
+
+        if self.bundle_output is not None:
+            self.write_bundle('basic', labels)
+
+        with self.timings.span('render'):
+            return self.render_basic_labels(labels, output)
+
+    def render_basic_labels(self, labels, output=None):
+        """Render prepared original format (label_fields, quantity) entries in the selected output format"""
+        # ZPL and bitmap output: each row is drawn once and its copies are produced by the printer or writer
+        if self.label_format != 'pdf':
+            return self.render_labels_in_format(self.draw_label, labels, output)
+
+        # Sheet stock: several labels per page
+        if self.sheet is not None:
+            return self.sheet.render(self, self.draw_label, labels, output)
+
+        # Render into the caller's file when given, otherwise into an in-memory buffer
+        buffer = output if output is not None else io.BytesIO()
         c = canvas.Canvas(buffer, pagesize=(self.label_width, self.label_height))
 
         label_count = 0
 
-        # Process each row in the sorted dataframe
-        for _, row in df_sorted.iterrows():
-            product = row['Product']
-            size = row['Size']
-            quantity = int(row['Quantity'])
-            datamatrix_url = row['Datamatrix URL']
+        for (product, size, datamatrix_url), quantity in labels:
+            # Single copies are drawn straight onto their page
+            if quantity == 1:
+                self.create_label_page(c, product, size, datamatrix_url)
+                label_count += 1
+                self.report_progress(label_count)
+                continue
 
-            # Generate the specified quantity of identical labels
+            # Multiple copies: draw the label once, then place it by reference on each copy's page
+            form_name = self.label_form(c, self.draw_label, product, size, datamatrix_url)
             for _ in range(quantity):
-                self.create_label_page(c, product, size, datamatrix_url)
+                c.doForm(form_name)
+                c.showPage()
                 label_count += 1
+                self.report_progress(label_count)
 
         # Save PDF
-        c.save()
+        with self.timings.span('save'):
+            c.save()
+        buffer.flush()
         buffer.seek(0)
 
         return buffer, label_count
 
     def create_enhanced_label_page(self, c, product, product_type, size, datamatrix_url, order_number, sku, store_name, ship_date, bin_number, item_index, total_items):
         """Create a single enhanced label page with additional information"""
-        # Set page size to exactly 2" x 1"
-        c.setPageSize((self.label_width, self.label_height))
-
-        # Draw product type and size on the same line at top
-        top_y = self.label_height - self.margin - max(self.product_type_font_size, self.size_font_size)
-
-        # Calculate available space for product type (leave room for size + separation + DataMatrix)
-        c.setFont("Helvetica-Bold", self.size_font_size)  # Set font for size width calculation
-        size_width = c.stringWidth(size, "Helvetica-Bold", self.size_font_size)
-
-        # Available space = full width - margins - size width - separation (DataMatrix positioned below)
-        available_width_single_line = self.label_width - (2 * self.margin) - size_width - 8
-
-        # Use bold font for product type
-        c.setFont("Helvetica-Bold", self.product_type_font_size)
-        product_type_width = c.stringWidth(product_type, "Helvetica-Bold", self.product_type_font_size)
-
-        # Force single line layout - truncate product type if necessary
-        # Truncate product type if it doesn't fit with size on one line
-        while product_type_width > available_width_single_line and len(product_type) > 3:
-            product_type = product_type[:-1]
-            product_type_width = c.stringWidth(product_type, "Helvetica-Bold", self.product_type_font_size)
-
-        # Draw product type and size on same line
-        c.drawString(self.margin, top_y, product_type)
-        size_x = self.margin + product_type_width + 8  # 8 points separation
-        c.setFont("Helvetica-Bold", self.size_font_size)
-        c.drawString(size_x, top_y, size)
-
-        # Title starts below this line
-        title_start_y = top_y - self.margin - self.title_font_size
-
-        # Wrap and draw product title (left side, below product type)
-        c.setFont("Helvetica-Bold", self.title_font_size)
-        # Reduce title width to account for barcode if order number exists
-        title_wrap_width = (self.title_width - 2 * self.margin) if not order_number else (self.title_width - 2 * self.margin - 20)
-        title_lines = self.wrap_text(
-            product,
-            title_wrap_width,
-            "Helvetica-Bold",
-            self.title_font_size,
-            c
-        )
-
-        # Draw title lines using the calculated title_start_y
-        for i, line in enumerate(title_lines):
-            line_y = title_start_y - (i * (self.title_font_size + 2))
-            c.drawString(self.margin, line_y, line)
-
-        # Generate and draw DataMatrix for order number (bottom left corner)
-        if order_number:
-            order_datamatrix_img = self.generate_order_datamatrix(order_number)
-            if order_datamatrix_img:
-                # Position DataMatrix at bottom left corner
-                datamatrix_x = self.margin
-                datamatrix_y = self.margin
-
-                # Draw DataMatrix image
-                c.drawImage(
-                    ImageReader(order_datamatrix_img),
-                    datamatrix_x,
-                    datamatrix_y,
-                    width=self.datamatrix_size,
-                    height=self.datamatrix_size,
-                    preserveAspectRatio=True
-                )
-
-        # Draw DataMatrix image (top right corner)
-        datamatrix_pil_img = self.fetch_datamatrix_image(datamatrix_url)
-        if datamatrix_pil_img:
-            # Position DataMatrix in top right corner
-            datamatrix_x = self.label_width - self.datamatrix_size - self.margin
-            datamatrix_y = self.label_height - self.datamatrix_size - self.margin
-
-            # Draw PIL image using ImageReader
-            c.drawImage(
-                ImageReader(datamatrix_pil_img),
-                datamatrix_x,
-                datamatrix_y,
-                width=self.datamatrix_size,
-                height=self.datamatrix_size,
-                preserveAspectRatio=True
-            )
-
-            # Draw "FRONT" text below DataMatrix in 6pt font
-            c.setFont("Helvetica-Bold", 6)
-            front_text = "FRONT"
-            front_text_width = c.stringWidth(front_text, "Helvetica-Bold", 6)
-            # Center the text below the DataMatrix
-            front_text_x = datamatrix_x + (self.datamatrix_size - front_text_width) / 2
-            front_text_y = datamatrix_y - 6  # 6 points below the DataMatrix
-            c.drawString(front_text_x, front_text_y, front_text)
-
-        # Draw bottom text in 2 rows with order details (positioned above DataMatrix)
-        c.setFont("Helvetica-Bold", self.bottom_text_font_size)
-        max_bottom_width = self.label_width - 2 * self.margin
-
-        # First row: Order Number and SKU on same line
-        bottom_row_1_parts = []
-        if order_number:
-            bottom_row_1_parts.append(f"Order: {order_number}")
-        if sku:
-            bottom_row_1_parts.append(f"SKU: {sku}")
-
-        bottom_row_1_text = " | ".join(bottom_row_1_parts)
-
-        # Truncate first row if too long
-        while c.stringWidth(bottom_row_1_text, "Helvetica-Bold", self.bottom_text_font_size) > max_bottom_width and bottom_row_1_text:
-            bottom_row_1_text = bottom_row_1_text[:-1]
-
-        # Second row: Store Name and Ship Date
-        bottom_row_2_parts = []
-        if store_name:
-            bottom_row_2_parts.append(f"Store: {store_name}")
-        if ship_date:
-            bottom_row_2_parts.append(f"Ship: {ship_date}")
-
-        bottom_row_2_text = " | ".join(bottom_row_2_parts)
-
-        # Truncate second row if too long
-        while c.stringWidth(bottom_row_2_text, "Helvetica-Bold", self.bottom_text_font_size) > max_bottom_width and bottom_row_2_text:
-            bottom_row_2_text = bottom_row_2_text[:-1]
-
-        # Position both rows above the DataMatrix (instead of at very bottom)
-        # DataMatrix occupies: y = margin to y = margin + datamatrix_size
-        # Text starts just above the DataMatrix
-        bottom_row_2_y = self.margin + self.datamatrix_size + 2  # 2pt gap above DataMatrix
-        bottom_row_1_y = bottom_row_2_y + self.bottom_text_font_size + 2  # Second row above first row
-
-        # Draw both rows
-        if bottom_row_1_text:
-            c.drawString(self.margin, bottom_row_1_y, bottom_row_1_text)
-        if bottom_row_2_text:
-            c.drawString(self.margin, bottom_row_2_y, bottom_row_2_text)
-
-        # Draw bottom-right corner text for multi-item order grouping
-        # "A of X" text (8pt bold, always shown)
-        c.setFont("Helvetica-Bold", 8)
-        item_text = f"{item_index} of {total_items}"
-        item_text_width = c.stringWidth(item_text, "Helvetica-Bold", 8)
-        item_text_x = self.label_width - item_text_width - self.margin
-        item_text_y = self.margin + 2  # Bottom line
-        c.drawString(item_text_x, item_text_y, item_text)
-
-        # "BIN Y" text (10pt bold, only if multi-item order)
-        if total_items > 1:
-            c.setFont("Helvetica-Bold", 10)
-            if isinstance(bin_number, str):
-                # Overflow bin - display as-is
-                bin_text = bin_number
-            else:
-                # Numbered bin
-                bin_text = f"BIN {bin_number}"
-            bin_text_width = c.stringWidth(bin_text, "Helvetica-Bold", 10)
-            bin_text_x = self.label_width - bin_text_width - self.margin
-            bin_text_y = self.margin + 14  # Line above (10pt font + spacing)
-            c.drawString(bin_text_x, bin_text_y, bin_text)
+        self.draw_enhanced_label(c, product, product_type, size, datamatrix_url, order_number, sku, store_name, ship_date, bin_number, item_index, total_items)
 
         # Finish the page
         c.showPage()
 
-    def generate_enhanced_pdf(self, df):
+    def draw_enhanced_label(self, c, product, product_type, size, datamatrix_url, order_number, sku, store_name, ship_date, bin_number, item_index, total_items):
+        """Draw the contents of a single enhanced label"""
+        self.layout.draw_enhanced_label(
+            c, self, product, product_type, size, datamatrix_url, order_number, sku, store_name, ship_date, bin_number, item_index, total_items
+        )
+
+    def generate_enhanced_pdf(self, df, output=None):
         """Generate PDF with enhanced labels for new format"""
         # Sort labels hierarchically by rule order, condition order, then size
-        df_sorted = self.sort_hierarchically(df)
+        with self.timings.span('sort'):
+            df_sorted = self.sort_hierarchically(df)
 
+        # Download every DataMatrix up front so rendering only reads from the cache
+        self.prefetch_datamatrix_images(df_sorted['Datamatrix URL'])
+
+        # Bins and "A of X" positions are assigned across the whole batch before rendering
+        with self.timings.span('prepare'):
+            labels = self.prepare_enhanced_labels(df_sorted)
+
+        if self.bundle_output is not None:
+            self.write_bundle('enhanced', labels)
+
+        with self.timings.span('render'):
+            return self.render_prepared_enhanced_labels(labels, output)
+
+    def render_prepared_enhanced_labels(self, labels, output=None):
+        """Render prepared enhanced (label_fields, quantity) entries in the selected output format"""
+        if self.label_format != 'pdf':
+            return self.render_labels_in_format(self.draw_enhanced_label, labels, output)
+
+        # Large batches are split into contiguous shards rendered by a process pool
+        if self.renderer.should_render_in_parallel(sum(quantity for _, quantity in labels)):
+            return self.renderer.render(self, labels, output)
+
+        return self.render_enhanced_labels(labels, output)
+
+    def prepare_enhanced_labels(self, df_sorted):
+        """
+        Build the print-ordered label list for a sorted dataframe.
+
+        Returns:
+            List of (label_fields, quantity) tuples, where label_fields are the
+            arguments to draw_enhanced_label after the canvas
+        """
         # Assign bin numbers and item positions for multi-item orders
         # Group by OrderNumber and count items per order
         order_counts = df_sorted.groupby('OrderNumber').size().to_dict()
@@ -926,24 +944,13 @@ class LabelGenerator:
         # Track item position within each order
         order_item_counters = {order: 0 for order in df_sorted['OrderNumber'].unique()}
 
-        # Create PDF buffer
-        buffer = io.BytesIO()
-        c = canvas.Canvas(buffer, pagesize=(self.label_width, self.label_height))
-
-        label_count = 0
+        labels = []
 
         # Process each row in the sorted dataframe
-        for _, row in df_sorted.iterrows():
-            product = row['Product']
-            product_type = row['ProductType']
-            size = row['Size']
-            quantity = int(row['Quantity'])
-            datamatrix_url = row['Datamatrix URL']
-            order_number = row.get('OrderNumber', '')
-            sku = row.get('SKU', '')
-            store_name = row.get('StoreName', '')
-            ship_date = row.get('ShipDate', '')
-
+        columns = ['Product', 'ProductType', 'Size', 'Datamatrix URL', 'OrderNumber', 'SKU', 'StoreName', 'ShipDate', 'Quantity']
+        for product, product_type, size, datamatrix_url, order_number, sku, store_name, ship_date, quantity in zip(
+            *(df_sorted[name] for name in columns)
+        ):
             # Get bin assignment and item counting info
             bin_number = bin_assignments.get(order_number, None)
             total_items = order_counts.get(order_number, 1)
@@ -952,33 +959,137 @@ class LabelGenerator:
             order_item_counters[order_number] += 1
             item_index = order_item_counters[order_number]
 
-            # Generate the specified quantity of identical labels
+            label_fields = (
+                product, product_type, size, datamatrix_url,
+                order_number, sku, store_name, ship_date,
+                bin_number, item_index, total_items
+            )
+            labels.append((label_fields, int(quantity)))
+
+        return labels
+
+    def render_enhanced_labels(self, labels, output=None):
+        """Render prepared (label_fields, quantity) entries to a PDF, one label per page or in a grid on sheets"""
+        if self.sheet is not None:
+            return self.sheet.render(self, self.draw_enhanced_label, labels, output)
+
+        # Render into the caller's file when given, otherwise into an in-memory buffer
+        buffer = output if output is not None else io.BytesIO()
+        c = canvas.Canvas(buffer, pagesize=(self.label_width, self.label_height))
+
+        label_count = 0
+
+        for label_fields, quantity in labels:
+            # Single copies are drawn straight onto their page
+            if quantity == 1:
+                self.create_enhanced_label_page(c, *label_fields)
+                label_count += 1
+                self.report_progress(label_count)
+                continue
+
+            # Multiple copies: draw the label once, then place it by reference on each copy's page
+            form_name = self.label_form(c, self.draw_enhanced_label, *label_fields)
             for _ in range(quantity):
-                self.create_enhanced_label_page(
-                    c, product, product_type, size, datamatrix_url,
-                    order_number, sku, store_name, ship_date,
-                    bin_number, item_index, total_items
-                )
+                c.doForm(form_name)
+                c.showPage()
                 label_count += 1
+                self.report_progress(label_count)
 
         # Save PDF
-        c.save()
+        with self.timings.span('save'):
+            c.save()
+        buffer.flush()
+        buffer.seek(0)
+
+        return buffer, label_count
+
+    def render_labels_zpl(self, draw_function, labels, output=None):
+        """
+        Render (label_fields, quantity) entries as ZPL II for Zebra printers.
+
+        Each row becomes one label format drawn by draw_function; the printer
+        prints its copies from ^PQ instead of receiving duplicated labels.
+        """
+        buffer = output if output is not None else io.BytesIO()
+        z = ZPLCanvas(buffer, (self.label_width, self.label_height), self.dpi)
+
+        label_count = 0
+
+        for label_fields, quantity in labels:
+            if quantity < 1:
+                continue
+            draw_function(z, *label_fields)
+            z.showPage(quantity=quantity)
+            label_count += quantity
+            self.report_progress(label_count)
+
+        with self.timings.span('save'):
+            z.save()
+        buffer.flush()
         buffer.seek(0)
 
         return buffer, label_count
 
+    def render_labels_raster(self, draw_function, labels, output=None):
+        """
+        Render (label_fields, quantity) entries as 1-bit bitmaps at the printer's resolution.
+
+        Labels are drawn by draw_function onto a raster canvas, without going
+        through a PDF, and written as a PBM stream ('pbm') or a ZIP of PNGs ('zip').
+        """
+        buffer = output if output is not None else io.BytesIO()
+        r = RasterCanvas((self.label_width, self.label_height), self.dpi)
+        writer = RasterLabelWriter(buffer, self.label_format)
+
+        label_count = 0
+
+        for label_fields, quantity in labels:
+            if quantity < 1:
+                continue
+            draw_function(r, *label_fields)
+            writer.write(r.showPage(), quantity)
+            label_count += quantity
+            self.report_progress(label_count)
+
+        with self.timings.span('save'):
+            writer.close()
+        buffer.flush()
+        buffer.seek(0)
+
+        return buffer, label_count
+
+    def render_labels_in_format(self, draw_function, labels, output=None):
+        """Render prepared labels in the selected non-PDF output format"""
+        if self.label_format == 'zpl':
+            return self.render_labels_zpl(draw_function, labels, output)
+        return self.render_labels_raster(draw_function, labels, output)
+
+    def write_bundle(self, layout, labels):
+        """Record prepared labels and their DataMatrix bitmaps in the bundle output file"""
+        with self.timings.span('bundle'):
+            label_bundle.write_bundle(self.bundle_output, layout, labels, self.image_cache, label_bundle.label_size_name(self))
+
+    def render_bundle(self, bundle, output=None):
+        """Render the labels recorded in a bundle, without reading a spreadsheet or downloading anything"""
+        with self.timings.span('bundle'):
+            for url, png in bundle.images.items():
+                # Bitmaps recorded for this label size pass through unchanged; others are resized like a download
+                self.image_cache[url] = self.process_datamatrix_image(png) if png is not None else None
+
+        with self.timings.span('render'):
+            if bundle.layout == 'enhanced':
+                buffer, label_count = self.render_prepared_enhanced_labels(bundle.labels, output)
+            else:
+                buffer, label_count = self.render_basic_labels(bundle.labels, output)
+        self.timings.count('labels', label_count)
+        return buffer, label_count
+
     def validate_file_and_generate_report(self, file):
         """Validate file and generate detailed report of matched/unmatched rows"""
-        # Read file based on extension
-        filename = file.filename.lower()
-
-        if filename.endswith('.xlsx'):
-            df = pd.read_excel(file)
-        elif filename.endswith('.csv'):
-            df = pd.read_csv(file)
-        else:
-            raise ValueError("File must be .xlsx or .csv")
+        return self.validate_dataframe(self.read_upload(file))
 
+    def validate_dataframe(self, df):
+        """Detailed report of matched/unmatched rows for an uploaded sheet"""
         # Detect format
         file_format = self.detect_file_format(df)
 
@@ -1046,16 +1157,19 @@ class LabelGenerator:
         unmatched_rows = []
         unmatched_item_names = []  # For generating suggestions
 
-        # Process each row
-        for idx, row in df_filtered.iterrows():
-            item_name = row['Item - Name']
-            parsed_item = self.parse_item_name(item_name)
+        # Parse every item name in one vectorized pass
+        parsed_items = self.parse_item_names(df_filtered['Item - Name'])
+        order_numbers = df_filtered['Order - Number'] if 'Order - Number' in df_filtered.columns else [''] * total_rows
 
+        # Process each row
+        for idx, item_name, order_number, sku, parsed_item in zip(
+            df_filtered.index, df_filtered['Item - Name'], order_numbers, df_filtered['Item - SKU'], parsed_items
+        ):
             row_data = {
                 'row_number': idx + 2,  # +2 because Excel is 1-indexed and has header row
                 'item_name': str(item_name),
-                'order_number': str(row.get('Order - Number', '')),
-                'sku': str(row.get('Item - SKU', ''))
+                'order_number': str(order_number),
+                'sku': str(sku)
             }
 
             if parsed_item:
@@ -1068,7 +1182,7 @@ class LabelGenerator:
                 # Failed to match
                 unmatched_rows.append(row_data)
                 # Clean HTML and store for suggestions
-                clean_text = re.sub(r'<[^>]+>', '', str(item_name))
+                clean_text = re.sub(self.HTML_TAG_PATTERN, '', str(item_name))
                 unmatched_item_names.append(clean_text)
 
         # Generate suggestions from unmatched items
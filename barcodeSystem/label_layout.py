@@ -0,0 +1,327 @@
+from reportlab.lib.pagesizes import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from zpl_writer import ZPLCanvas
+from datamatrix_encoder import draw_matrix
+from code128 import draw_code128
+
+BOLD = 'Helvetica-Bold'
+REGULAR = 'Helvetica'
+
+# Label record fields for each layout: 'enhanced' labels (new format) and 'basic' labels (original format)
+LAYOUT_FIELDS = {
+    'enhanced': ['product', 'product_type', 'size', 'datamatrix_url', 'order_number', 'sku',
+                 'store_name', 'ship_date', 'bin_number', 'item_index', 'total_items'],
+    'basic': ['product', 'size', 'datamatrix_url'],
+}
+
+# Layout of each label size. Lengths are in points, fonts are (name, size) and
+# (x, y) is the bottom-left corner of a box or the start of a text baseline.
+#
+#   header: product type and size on the top line, 'gap' apart
+#   title: product title below the header in the left 'width' share of the label ('basic_font' on
+#          original format labels); 'order_code_clearance' comes off its wrap width when there is an order number
+#   product_datamatrix: product DataMatrix (top right corner unless 'x' / 'y' are given) with a caption below it
+#   order_code: order number symbol, a 'datamatrix' (width x width) or a 'code128' barcode
+#   details: "Order | SKU" and "Store | Ship" rows; 'y' is the lower row's baseline
+#   item_count, bin: "A of X" and "BIN n", right aligned (the bin only on multi-item orders)
+LAYOUT_SPECS = {
+    '2x1': {
+        'page_size': (2 * inch, 1 * inch),
+        'dpi': 203,
+        'margin': 5,
+        'header': {'product_type_font': (BOLD, 10), 'size_font': (BOLD, 10), 'gap': 8},
+        'title': {'width': 0.7, 'font': (BOLD, 4), 'basic_font': (REGULAR, 4), 'leading': 6, 'max_lines': 2,
+                  'order_code_clearance': 20},
+        'product_datamatrix': {'size': 0.3825 * inch, 'caption': 'FRONT', 'caption_font': (BOLD, 6), 'caption_gap': 6},
+        'order_code': {'symbology': 'datamatrix', 'x': 5, 'y': 5, 'width': 0.3825 * inch, 'height': 0.3825 * inch},
+        'details': {'font': (BOLD, 4), 'y': 5 + 0.3825 * inch + 2, 'leading': 6},
+        'item_count': {'font': (BOLD, 8), 'y': 7},
+        'bin': {'font': (BOLD, 10), 'y': 19},
+    },
+    '3x1': {
+        'page_size': (3 * inch, 1 * inch),
+        'dpi': 203,
+        'margin': 5,
+        'header': {'product_type_font': (BOLD, 10), 'size_font': (BOLD, 10), 'gap': 8},
+        'title': {'width': 0.65, 'font': (BOLD, 4), 'basic_font': (REGULAR, 4), 'leading': 6, 'max_lines': 2,
+                  'order_code_clearance': 10},
+        'product_datamatrix': {'size': 0.45 * inch, 'caption': 'FRONT', 'caption_font': (BOLD, 6), 'caption_gap': 6},
+        'order_code': {'symbology': 'code128', 'x': 5, 'y': 20, 'width': 2.2 * inch, 'height': 0.4 * inch - 4},
+        'details': {'font': (BOLD, 4), 'y': 7, 'leading': 6},
+        'item_count': {'font': (BOLD, 8), 'y': 7},
+        'bin': {'font': (BOLD, 10), 'y': 19},
+    },
+    '4x2': {
+        'page_size': (4 * inch, 2 * inch),
+        'dpi': 203,
+        'margin': 8,
+        'header': {'product_type_font': (BOLD, 18), 'size_font': (BOLD, 18), 'gap': 12},
+        'title': {'width': 0.7, 'font': (BOLD, 8), 'basic_font': (REGULAR, 8), 'leading': 10, 'max_lines': 3,
+                  'order_code_clearance': 0},
+        'product_datamatrix': {'size': 0.75 * inch, 'caption': 'FRONT', 'caption_font': (BOLD, 8), 'caption_gap': 8},
+        'order_code': {'symbology': 'datamatrix', 'x': 8, 'y': 8, 'width': 0.6 * inch, 'height': 0.6 * inch},
+        'details': {'font': (BOLD, 7), 'y': 8 + 0.6 * inch + 4, 'leading': 10},
+        'item_count': {'font': (BOLD, 14), 'y': 10},
+        'bin': {'font': (BOLD, 18), 'y': 30},
+    },
+    '4x6': {
+        'page_size': (4 * inch, 6 * inch),
+        'dpi': 203,
+        'margin': 12,
+        'header': {'product_type_font': (BOLD, 24), 'size_font': (BOLD, 24), 'gap': 16},
+        'title': {'width': 0.6, 'font': (BOLD, 14), 'basic_font': (REGULAR, 14), 'leading': 18, 'max_lines': 6,
+                  'order_code_clearance': 0},
+        # Below the header line instead of in the corner
+        'product_datamatrix': {'size': 1.25 * inch, 'x': 4 * inch - 1.25 * inch - 12, 'y': 6 * inch - 40 - 12 - 1.25 * inch,
+                               'caption': 'FRONT', 'caption_font': (BOLD, 10), 'caption_gap': 12},
+        'order_code': {'symbology': 'datamatrix', 'x': 12, 'y': 12, 'width': 1 * inch, 'height': 1 * inch},
+        'details': {'font': (BOLD, 10), 'y': 12 + 1 * inch + 8, 'leading': 14},
+        'item_count': {'font': (BOLD, 20), 'y': 14},
+        'bin': {'font': (BOLD, 28), 'y': 44},
+    },
+}
+
+# Label sizes that can be selected, smallest first
+LABEL_SIZES = list(LAYOUT_SPECS)
+
+# Compiled layouts shared by every generator in the process
+_compiled_layouts = {}
+
+
+def has_order_number(label):
+    return bool(label['order_number'])
+
+
+def is_multi_item_order(label):
+    return label['total_items'] > 1
+
+
+class LabelLayout:
+    """
+    A label size's layout spec compiled into fixed lists of draw operations.
+
+    Every position that does not depend on the label's text is computed
+    once here. Each operation carries the font it draws in, and the font
+    is only set where it differs from the one the previous operations
+    left on the canvas, so drawing a label only measures and places its
+    own text.
+    """
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.page_size = spec['page_size']
+        self.label_width, self.label_height = self.page_size
+        self.dpi = spec['dpi']
+        self.margin = margin = spec['margin']
+
+        header = spec['header']
+        self.product_type_font = header['product_type_font']
+        self.size_font = header['size_font']
+        self.header_gap = header['gap']
+        # Product type and size share the top line between the margins
+        self.header_width = self.label_width - (2 * margin)
+        self.top_y = self.label_height - margin - max(self.product_type_font[1], self.size_font[1])
+        # Original format labels have the size alone, centered
+        self.basic_size_y = self.label_height - margin - self.size_font[1]
+
+        title = spec['title']
+        self.title_font = title['font']
+        self.basic_title_font = title['basic_font']
+        self.title_max_lines = title['max_lines']
+        title_width = self.label_width * title['width']
+        self.title_wrap_width = title_width - 2 * margin
+        self.title_wrap_width_with_order_code = title_width - 2 * margin - title['order_code_clearance']
+        title_y = self.top_y - margin - self.title_font[1]
+        self.title_ys = [title_y - (i * title['leading']) for i in range(self.title_max_lines)]
+        basic_title_y = self.basic_size_y - margin - self.basic_title_font[1]
+        self.basic_title_ys = [basic_title_y - (i * title['leading']) for i in range(self.title_max_lines)]
+
+        product_datamatrix = spec['product_datamatrix']
+        self.product_datamatrix_size = size = product_datamatrix['size']
+        self.product_datamatrix_x = product_datamatrix.get('x', self.label_width - size - margin)
+        self.product_datamatrix_y = product_datamatrix.get('y', self.label_height - size - margin)
+        self.caption = product_datamatrix['caption']
+        self.caption_font = product_datamatrix['caption_font']
+        caption_width = pdfmetrics.stringWidth(self.caption, *self.caption_font)
+        self.caption_x = self.product_datamatrix_x + (size - caption_width) / 2
+        self.caption_y = self.product_datamatrix_y - product_datamatrix['caption_gap']
+
+        order_code = spec['order_code']
+        self.order_code_symbology = order_code['symbology']
+        self.order_code_box = (order_code['x'], order_code['y'], order_code['width'], order_code['height'])
+        draw_order_code = self._draw_order_datamatrix if self.order_code_symbology == 'datamatrix' else self._draw_order_code128
+
+        details = spec['details']
+        self.details_font = details['font']
+        self.details_width = self.label_width - 2 * margin
+        self.details_ys = (details['y'] + details['leading'], details['y'])
+
+        self.item_count_font = spec['item_count']['font']
+        self.item_count_y = spec['item_count']['y']
+        self.bin_font = spec['bin']['font']
+        self.bin_y = spec['bin']['y']
+
+        # (font, condition, draw, args) in drawing order; a condition skips the element for labels it is false for
+        self.basic_ops = self._compile([
+            (self.size_font, None, self._draw_basic_size, ()),
+            (self.basic_title_font, None, self._draw_title, (self.basic_title_font, self.basic_title_ys)),
+            (None, None, self._draw_product_datamatrix, ()),
+        ])
+        self.enhanced_ops = self._compile([
+            (self.product_type_font, None, self._draw_product_type, ()),
+            (self.size_font, None, self._draw_size, ()),
+            (self.title_font, None, self._draw_title, (self.title_font, self.title_ys)),
+            (None, has_order_number, draw_order_code, ()),
+            (None, None, self._draw_product_datamatrix, ()),
+            (self.details_font, None, self._draw_details, ()),
+            (self.item_count_font, None, self._draw_item_count, ()),
+            (self.bin_font, is_multi_item_order, self._draw_bin, ()),
+        ])
+
+    @staticmethod
+    def _compile(elements):
+        """Turn layout elements into draw operations that only set a font where the canvas may not have it"""
+        ops = []
+        current_font = None  # Every page and form starts without a known font
+        for font, condition, draw, args in elements:
+            ops.append((font if font != current_font else None, condition, draw, args))
+            if font is None or (condition is not None and font != current_font):
+                # Elements without a font may change it (the product DataMatrix form draws its caption),
+                # and a skipped conditional element leaves whichever font was set before it
+                current_font = None
+            else:
+                current_font = font
+        return ops
+
+    def _run(self, ops, c, generator, label):
+        for font, condition, draw, args in ops:
+            if condition is not None and not condition(label):
+                continue
+            if font is not None:
+                c.setFont(*font)
+            draw(c, generator, label, *args)
+
+    def draw_label(self, c, generator, *label_fields):
+        """Draw an original format label (product, size, datamatrix_url)"""
+        self._run(self.basic_ops, c, generator, dict(zip(LAYOUT_FIELDS['basic'], label_fields)))
+
+    def draw_enhanced_label(self, c, generator, *label_fields):
+        """Draw an enhanced label from the fields prepare_enhanced_labels produces"""
+        self._run(self.enhanced_ops, c, generator, dict(zip(LAYOUT_FIELDS['enhanced'], label_fields)))
+
+    def _draw_basic_size(self, c, generator, label):
+        size = label['size']
+        size_width = generator.text_metrics.string_width(size, *self.size_font)
+        c.drawString((self.label_width - size_width) / 2, self.basic_size_y, size)
+
+    def _draw_product_type(self, c, generator, label):
+        # Truncate the product type to fit with the size on one line (never below 3 characters)
+        size_width = generator.text_metrics.string_width(label['size'], *self.size_font)
+        available_width = self.header_width - size_width - self.header_gap
+        product_type, product_type_width = generator.text_metrics.truncate(
+            label['product_type'], available_width, *self.product_type_font, min_length=3
+        )
+        c.drawString(self.margin, self.top_y, product_type)
+        label['size_x'] = self.margin + product_type_width + self.header_gap
+
+    def _draw_size(self, c, generator, label):
+        c.drawString(label['size_x'], self.top_y, label['size'])
+
+    def _draw_title(self, c, generator, label, font, line_ys):
+        # Make room for the order code when there is one
+        wrap_width = self.title_wrap_width_with_order_code if label.get('order_number') else self.title_wrap_width
+        lines = generator.text_metrics.wrap_text(label['product'], wrap_width, *font, max_lines=self.title_max_lines)
+        for line, line_y in zip(lines, line_ys):
+            c.drawString(self.margin, line_y, line)
+
+    def _draw_order_datamatrix(self, c, generator, label):
+        order_number = label['order_number']
+        matrix = generator.generate_order_datamatrix(order_number)
+        if not matrix:
+            return
+        x, y, size, _ = self.order_code_box
+        if isinstance(c, ZPLCanvas):
+            # ZPL printers encode the symbol natively (^BX) at the same symbol size
+            c.drawDataMatrix(str(order_number), len(matrix), x, y, size)
+        else:
+            # Modules as vector rectangles snapped to the printer's dot grid
+            draw_matrix(c, matrix, x, y, size, self.dpi)
+
+    def _draw_order_code128(self, c, generator, label):
+        order_number = label['order_number']
+        modules = generator.generate_order_barcode(order_number)
+        if not modules:
+            return
+        x, y, width, height = self.order_code_box
+        if isinstance(c, ZPLCanvas):
+            # ZPL printers encode the barcode natively (^BC) with the same module width
+            c.drawCode128(str(order_number), len(modules), x, y, width, height)
+        else:
+            # Bars as vector rectangles snapped to the printer's dot grid
+            draw_code128(c, modules, x, y, width, height, self.dpi)
+
+    def _draw_product_datamatrix(self, c, generator, label):
+        """Draw the product DataMatrix and its caption, defining them once per PDF as a Form XObject"""
+        datamatrix_url = label['datamatrix_url']
+        datamatrix_pil_img = generator.fetch_datamatrix_image(datamatrix_url)
+        if not datamatrix_pil_img:
+            return
+
+        form_name = generator.form_name('datamatrix', datamatrix_url)
+        if not c.hasForm(form_name):
+            c.beginForm(form_name)
+            c.drawImage(
+                ImageReader(datamatrix_pil_img),
+                self.product_datamatrix_x,
+                self.product_datamatrix_y,
+                width=self.product_datamatrix_size,
+                height=self.product_datamatrix_size,
+                preserveAspectRatio=True
+            )
+            c.setFont(*self.caption_font)
+            c.drawString(self.caption_x, self.caption_y, self.caption)
+            c.endForm()
+
+        # Place the shared form by reference
+        c.doForm(form_name)
+
+    def _draw_details(self, c, generator, label):
+        row_1_parts = []
+        if label['order_number']:
+            row_1_parts.append(f"Order: {label['order_number']}")
+        if label['sku']:
+            row_1_parts.append(f"SKU: {label['sku']}")
+
+        row_2_parts = []
+        if label['store_name']:
+            row_2_parts.append(f"Store: {label['store_name']}")
+        if label['ship_date']:
+            row_2_parts.append(f"Ship: {label['ship_date']}")
+
+        for parts, row_y in zip((row_1_parts, row_2_parts), self.details_ys):
+            # Truncate rows that are too long
+            text, _ = generator.text_metrics.truncate(" | ".join(parts), self.details_width, *self.details_font)
+            if text:
+                c.drawString(self.margin, row_y, text)
+
+    def _draw_right_aligned(self, c, generator, text, font, y):
+        text_width = generator.text_metrics.string_width(text, *font)
+        c.drawString(self.label_width - text_width - self.margin, y, text)
+
+    def _draw_item_count(self, c, generator, label):
+        self._draw_right_aligned(c, generator, f"{label['item_index']} of {label['total_items']}", self.item_count_font, self.item_count_y)
+
+    def _draw_bin(self, c, generator, label):
+        # Overflow bins are named, numbered bins are shown as "BIN n"
+        bin_number = label['bin_number']
+        bin_text = bin_number if isinstance(bin_number, str) else f"BIN {bin_number}"
+        self._draw_right_aligned(c, generator, bin_text, self.bin_font, self.bin_y)
+
+
+def compile_layout(label_size):
+    """Compiled layout of a label size ('2x1', '3x1', '4x2' or '4x6'), compiled on first use"""
+    layout = _compiled_layouts.get(label_size)
+    if layout is None:
+        layout = _compiled_layouts[label_size] = LabelLayout(label_size, LAYOUT_SPECS[label_size])
+    return layout
@@ -0,0 +1,142 @@
+import os
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from label_layout import LABEL_SIZES
+
+# Metrics are kept per process. Under gunicorn, PROMETHEUS_MULTIPROC_DIR (set in gunicorn.conf.py) makes
+# every worker write its values to files in that directory, and /metrics adds up the files of all workers.
+MULTIPROCESS_DIR_VARIABLE = 'PROMETHEUS_MULTIPROC_DIR'
+
+# Output sizes from a single small label to a very large batch
+OUTPUT_BYTES_BUCKETS = (10e3, 50e3, 100e3, 250e3, 500e3, 1e6, 2.5e6, 5e6, 10e6, 25e6, 50e6, 100e6, 250e6)
+
+# Order codes are encoded in well under a millisecond
+ENCODE_SECONDS_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+
+# Requests range from a health check to a large synchronous batch
+REQUEST_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+UPLOADS = Counter(
+    'label_uploads', 'Files uploaded for label generation', ['mode']
+)
+GENERATIONS = Counter(
+    'label_generations', 'Finished label generations (uploads, jobs and bundle renders)', ['source', 'outcome']
+)
+LABELS_RENDERED = Counter(
+    'labels_rendered', 'Labels rendered', ['label_size', 'label_format']
+)
+PARSE_FAILURES = Counter(
+    'label_parse_failures', "Rejected files ('file') and item names that could not be parsed ('item_name')", ['kind']
+)
+FETCH_ERRORS = Counter(
+    'datamatrix_fetch_errors', 'DataMatrix image downloads that failed after retries', ['reason']
+)
+CACHE_LOOKUPS = Counter(
+    'label_cache_lookups', 'Cache lookups by cache and result (hit or miss)', ['cache', 'result']
+)
+
+REQUEST_SECONDS = Histogram(
+    'label_request_duration_seconds', 'HTTP request duration', ['endpoint', 'method', 'status'],
+    buckets=REQUEST_SECONDS_BUCKETS
+)
+FETCH_SECONDS = Histogram(
+    'datamatrix_fetch_duration_seconds', 'Time to download one DataMatrix image, including retries'
+)
+ORDER_CODE_SECONDS = Histogram(
+    'label_order_code_encode_seconds', 'Time to encode one order number', ['symbology'],
+    buckets=ENCODE_SECONDS_BUCKETS
+)
+OUTPUT_BYTES = Histogram(
+    'label_output_bytes', 'Size of generated label files', ['label_format'],
+    buckets=OUTPUT_BYTES_BUCKETS
+)
+
+# Gauges are combined across workers: 'livesum' adds up the live workers, 'mostrecent' takes the latest value
+CACHE_ENTRIES = Gauge(
+    'label_cache_entries', 'Entries in each cache (order code caches: of the latest generation)', ['cache'],
+    multiprocess_mode='mostrecent'
+)
+CACHE_BYTES = Gauge(
+    'label_cache_bytes', 'Approximate size of the shared DataMatrix disk cache', ['cache'],
+    multiprocess_mode='mostrecent'
+)
+PARSE_CACHE_ENTRIES = Gauge(
+    'label_parse_cache_entries', 'Memoized item names, summed over workers', multiprocess_mode='livesum'
+)
+JOBS = Gauge(
+    'label_jobs', 'Background jobs waiting or running', ['state'], multiprocess_mode='livesum'
+)
+SYNC_IN_PROGRESS = Gauge(
+    'label_sync_uploads_in_progress', 'Synchronous uploads being rendered', multiprocess_mode='livesum'
+)
+
+
+def record_generation(generator, source, outcome, label_size, label_format, output_path=None):
+    """
+    Record a finished upload, job or bundle render from its generator's stage timings and caches.
+
+    Args:
+        generator: The label generator that did the work
+        source: 'upload', 'job' or 'bundle'
+        outcome: 'done', 'invalid' (rejected with a ValueError) or 'error'
+        label_size: Label size that was rendered (one of LABEL_SIZES, never the raw form value)
+        label_format: Output format ('pdf', 'zpl', 'pbm' or 'zip')
+        output_path: Output file, whose size is recorded when the generation is done
+    """
+    counts = generator.timings.counts
+    GENERATIONS.labels(source, outcome).inc()
+    if outcome == 'invalid':
+        PARSE_FAILURES.labels('file').inc()
+    if counts.get('unparsed_items'):
+        PARSE_FAILURES.labels('item_name').inc(counts['unparsed_items'])
+    if outcome == 'done':
+        # Label values must stay a fixed set: every new value is a series kept in the multiprocess files
+        if label_size not in LABEL_SIZES:
+            label_size = 'other'
+        LABELS_RENDERED.labels(label_size, label_format).inc(counts.get('labels', 0))
+        if output_path and os.path.exists(output_path):
+            OUTPUT_BYTES.labels(label_format).observe(os.path.getsize(output_path))
+
+    # Every '<cache>_hits' / '<cache>_misses' counter of the timings is a cache lookup
+    for name, value in counts.items():
+        for suffix, result in (('_hits', 'hit'), ('_misses', 'miss')):
+            if name.endswith(suffix) and value:
+                CACHE_LOOKUPS.labels(name[:-len(suffix)], result).inc(value)
+
+    # Order code caches live for one generation; only the one the label layout used is reported
+    for cache, attribute in (('order_barcode', 'barcode_cache'), ('order_datamatrix', 'datamatrix_cache')):
+        if f'{cache}_hits' in counts or f'{cache}_misses' in counts:
+            CACHE_ENTRIES.labels(cache).set(len(getattr(generator, attribute)))
+    disk_bytes = generator.disk_cache.approximate_bytes()
+    if disk_bytes is not None:
+        CACHE_BYTES.labels('datamatrix_disk').set(disk_bytes)
+    PARSE_CACHE_ENTRIES.set(generator.parse_cache.stats()['entries'])
+
+
+def fetch_error_reason(error):
+    """Short metric label for a failed download: the HTTP status code, 'timeout', 'connection' or 'other'"""
+    response = getattr(error, 'response', None)
+    if response is not None:
+        return str(response.status_code)
+    name = type(error).__name__
+    if 'Timeout' in name:
+        return 'timeout'
+    if 'Connection' in name:
+        return 'connection'
+    return 'other'
+
+
+def exposition():
+    """
+    Current metrics in the Prometheus text format.
+
+    Returns:
+        Tuple of (body bytes, content type)
+    """
+    if os.environ.get(MULTIPROCESS_DIR_VARIABLE):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,164 @@
+import io
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pdf_merge import concatenate_pdfs
+
+
+def _render_shard(generator_class, label_size, sheet, images, labels):
+    """Render one shard of labels in a pool process and return the PDF bytes"""
+    # A fresh generator per shard (construction is cheap; layouts are compiled once per process),
+    # so images and timings of earlier batches are not kept for the life of the pool process
+    generator = generator_class(label_size)
+    generator.sheet = sheet
+
+    # DataMatrix images were prefetched by the parent; failed downloads arrive as None
+    generator.image_cache.update(images)
+
+    buffer, label_count = generator.render_enhanced_labels(labels)
+    return buffer.getvalue(), label_count
+
+
+class ParallelRenderer:
+    """
+    Renders large label batches across a pool of processes.
+
+    The label list is prepared (sorted, bins and "A of X" positions
+    assigned) in the calling process, then split into contiguous shards.
+    Each shard is rendered to its own PDF by a pool process and the shards
+    are concatenated in their original order.
+    """
+
+    def __init__(self, processes=None, threshold=None):
+        self.processes = processes or int(os.environ.get('LABEL_RENDER_PROCESSES', self.default_processes()))
+        self.threshold = threshold if threshold is not None else int(os.environ.get('LABEL_PARALLEL_THRESHOLD', 2000))
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @staticmethod
+    def default_processes():
+        """
+        Render processes per server worker when LABEL_RENDER_PROCESSES is not set.
+
+        Every gunicorn worker has its own pool, so the CPUs are divided
+        between the workers (LABEL_SERVER_WORKERS, set by gunicorn.conf.py)
+        instead of each worker starting one process per CPU.
+        """
+        server_workers = max(1, int(os.environ.get('LABEL_SERVER_WORKERS', 1)))
+        return max(1, (os.cpu_count() or 1) // server_workers)
+
+    def _get_pool(self):
+        """Start the process pool lazily; spawn avoids forking a threaded server worker"""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def shutdown(self):
+        """Stop the pool processes (gunicorn calls this when a worker exits); a later render starts a new pool"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def should_render_in_parallel(self, label_count):
+        """Parallel rendering only pays off for batches above the threshold"""
+        return self.processes > 1 and label_count >= self.threshold
+
+    def split_into_shards(self, labels, labels_per_page=1):
+        """
+        Split (label_fields, quantity) entries into contiguous shards of similar label counts.
+
+        Rows are never split, so every copy of a label stays in one shard
+        and keeps sharing one Form XObject. With several labels per page
+        (sheet output), every shard but the last holds whole pages instead,
+        splitting a row's copies where a shard ends, so no sheet in the
+        middle of the joined PDF is left partly empty.
+        """
+        total = sum(quantity for _, quantity in labels)
+        target = -(-total // self.processes)  # Ceiling division
+
+        if labels_per_page > 1:
+            target = -(-target // labels_per_page) * labels_per_page
+            return self._split_into_pages(labels, target)
+
+        shards = []
+        current = []
+        current_count = 0
+        for label in labels:
+            current.append(label)
+            current_count += label[1]
+            if current_count >= target:
+                shards.append(current)
+                current = []
+                current_count = 0
+        if current:
+            shards.append(current)
+        return shards
+
+    @staticmethod
+    def _split_into_pages(labels, target):
+        """Shards of exactly target labels (the last one may have fewer), splitting rows between shards"""
+        shards = []
+        current = []
+        current_count = 0
+        for label_fields, quantity in labels:
+            while quantity > 0:
+                copies = min(quantity, target - current_count)
+                current.append((label_fields, copies))
+                current_count += copies
+                quantity -= copies
+                if current_count == target:
+                    shards.append(current)
+                    current = []
+                    current_count = 0
+        if current:
+            shards.append(current)
+        return shards
+
+    def render(self, generator, labels, output=None):
+        """
+        Render prepared labels in parallel and write one combined PDF.
+
+        Args:
+            generator: Label generator whose image cache holds the prefetched DataMatrix images
+            labels: List of (label_fields, quantity) entries in print order
+            output: Optional writable file object (default: a new BytesIO)
+
+        Returns:
+            Tuple of (buffer, label_count)
+        """
+        pool = self._get_pool()
+
+        futures = []
+        sheet = generator.sheet
+        for shard in self.split_into_shards(labels, sheet.labels_per_page if sheet is not None else 1):
+            # Ship only the DataMatrix images this shard uses
+            urls = {label_fields[3] for label_fields, _ in shard}
+            images = {url: generator.image_cache.get(url) for url in urls if isinstance(url, str)}
+            futures.append(pool.submit(_render_shard, type(generator), generator.layout.name, sheet, images, shard))
+
+        # Collect shards in order so progress and page order follow the label list
+        parts = []
+        label_count = 0
+        for future in futures:
+            pdf_bytes, shard_count = future.result()
+            parts.append(pdf_bytes)
+            label_count += shard_count
+            generator.report_progress(label_count)
+
+        buffer = output if output is not None else io.BytesIO()
+        with generator.timings.span('save'):
+            concatenate_pdfs(parts, buffer)
+        buffer.flush()
+        buffer.seek(0)
+
+        return buffer, label_count
+
+
+# Process-wide renderer shared by every generator instance
+shared_renderer = ParallelRenderer()
@@ -0,0 +1,90 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class ParseCache:
+    """
+    Bounded LRU memo of item name parse results.
+
+    Entries are keyed by parser (label generator class), configuration
+    version and cleaned item name text, so a result is only reused by the
+    same parser under the same configuration. When a
+    lookup arrives with a new configuration version, entries made under
+    older versions are dropped instead of waiting to age out.
+
+    Results (dicts, or None for names that did not parse) are shared
+    between callers and must not be modified.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or int(os.environ.get('ITEM_PARSE_CACHE_SIZE', 20000))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.config_version = None
+
+        # Hit/miss counters for this process
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self, config_version):
+        """Drop entries from older configurations once a new one is seen (lock held)"""
+        if config_version != self.config_version:
+            self._entries = OrderedDict((key, value) for key, value in self._entries.items() if key[1] == config_version)
+            self.config_version = config_version
+
+    def get_many(self, parser, config_version, texts):
+        """
+        Look up several item names at once.
+
+        Returns:
+            Dict of text -> cached result for the texts that were found
+        """
+        found = {}
+        with self._lock:
+            self._check_version(config_version)
+            for text in texts:
+                key = (parser, config_version, text)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[text] = self._entries[key]
+            self.hits += len(found)
+            self.misses += len(texts) - len(found)
+        return found
+
+    def put_many(self, parser, config_version, results):
+        """Store parse results given as a dict of text -> result"""
+        with self._lock:
+            self._check_version(config_version)
+            for text, result in results.items():
+                self._entries[(parser, config_version, text)] = result
+                self._entries.move_to_end((parser, config_version, text))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, parser, config_version, text):
+        """(True, result) on a hit, (False, None) on a miss"""
+        found = self.get_many(parser, config_version, [text])
+        return (True, found[text]) if text in found else (False, None)
+
+    def put(self, parser, config_version, text, result):
+        self.put_many(parser, config_version, {text: result})
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+# Process-wide memo shared by every generator instance (uploads, validation and background jobs)
+shared_parse_cache = ParseCache()
@@ -0,0 +1,158 @@
+import re
+import hashlib
+
+
+XREF_ENTRY = re.compile(rb'(\d{10}) (\d{5}) ([nf])')
+OBJECT_REF = re.compile(rb'(\d+) 0 R')
+STREAM_START = re.compile(rb'>>\s*stream\r?\n')
+PDF_VERSION = re.compile(rb'%PDF-(\d\.\d)')
+
+
+class ReportLabPDF:
+    """
+    Minimal reader for PDFs written by ReportLab's canvas.
+
+    ReportLab always writes a classic xref table with a single subsection,
+    uncompressed object dictionaries and one flat page tree, which is all
+    this reader supports. It is not a general PDF parser.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+        startxref = int(data[data.rindex(b'startxref') + 9:].split()[0])
+        trailer_at = data.index(b'trailer', startxref)
+        self.xref_at = startxref
+
+        # Object number -> byte offset for in-use objects
+        entries = XREF_ENTRY.findall(data, startxref, trailer_at)
+        self.offsets = {num: int(offset) for num, (offset, _, kind) in enumerate(entries) if kind == b'n'}
+
+        # Each object ends where the next one (or the xref table) begins
+        ordered = sorted(self.offsets.items(), key=lambda item: item[1])
+        self.ends = {num: (ordered[i + 1][1] if i + 1 < len(ordered) else startxref)
+                     for i, (num, _) in enumerate(ordered)}
+
+        trailer = data[trailer_at:]
+        self.root = int(re.search(rb'/Root (\d+) 0 R', trailer).group(1))
+        info = re.search(rb'/Info (\d+) 0 R', trailer)
+        self.info = int(info.group(1)) if info else None
+
+        self.pages_root = int(re.search(rb'/Pages (\d+) 0 R', self.object_dict(self.root)).group(1))
+        kids = re.search(rb'/Kids \[([^\]]*)\]', self.object_dict(self.pages_root)).group(1)
+        self.page_refs = [int(num) for num in OBJECT_REF.findall(kids)]
+
+        version = PDF_VERSION.match(data)
+        self.version = version.group(1) if version else b'1.4'
+        self.header = data[:min(self.offsets.values())] if self.offsets else data[:data.index(b'\n') + 1]
+
+    def object_body(self, num):
+        """Raw bytes between 'N 0 obj' and 'endobj'"""
+        start = self.offsets[num]
+        body_start = self.data.index(b'obj', start) + 3
+        body_end = self.data.rindex(b'endobj', start, self.ends[num])
+        return self.data[body_start:body_end]
+
+    def object_dict(self, num):
+        """Dictionary part of an object, without any stream data"""
+        body = self.object_body(num)
+        match = STREAM_START.search(body)
+        return body[:match.start() + 2] if match else body
+
+    def page_contents(self):
+        """Raw content stream bytes of every page, in page order (used for comparisons)"""
+        contents = []
+        for page in self.page_refs:
+            ref = re.search(rb'/Contents (\d+) 0 R', self.object_dict(page))
+            contents.append(self.object_body(int(ref.group(1))) if ref else b'')
+        return contents
+
+
+def concatenate_pdfs(parts, output):
+    """
+    Concatenate ReportLab PDFs page by page into one document.
+
+    Every object of every part is copied byte for byte with its references
+    renumbered; each part's catalog and page tree root are replaced by a
+    single new page tree holding all pages in order. Only object
+    dictionaries are rewritten - stream data is never touched.
+
+    Args:
+        parts: List of PDF documents (bytes) produced by ReportLab
+        output: Writable binary file object
+
+    Returns:
+        Total number of pages written
+    """
+    documents = [ReportLabPDF(data) for data in parts]
+
+    # Object 1 is the new catalog, object 2 the new page tree root
+    catalog_num = 1
+    pages_root_num = 2
+    next_num = 3
+
+    # Renumber every object, mapping each part's page tree root onto the shared one
+    mappings = []
+    for doc in documents:
+        mapping = {doc.pages_root: pages_root_num}
+        for num in sorted(doc.offsets):
+            if num in (doc.root, doc.pages_root):
+                continue
+            if doc.info is not None and num == doc.info and mappings:
+                continue  # Keep document info from the first part only
+            mapping[num] = next_num
+            next_num += 1
+        mappings.append(mapping)
+
+    version = max(doc.version for doc in documents)
+    header = PDF_VERSION.sub(b'%PDF-' + version, documents[0].header, count=1)
+
+    offsets = {}
+    position = 0
+
+    def write(chunk):
+        nonlocal position
+        output.write(chunk)
+        position += len(chunk)
+
+    write(header)
+
+    page_refs = []
+    for doc, mapping in zip(documents, mappings):
+        def renumber(match):
+            return b'%d 0 R' % mapping[int(match.group(1))]
+
+        for num in sorted(doc.offsets):
+            if num not in mapping or num == doc.pages_root:
+                continue
+            body = doc.object_body(num)
+            match = STREAM_START.search(body)
+            split_at = match.start() + 2 if match else len(body)
+
+            offsets[mapping[num]] = position
+            write(b'%d 0 obj' % mapping[num])
+            write(OBJECT_REF.sub(renumber, body[:split_at]))
+            write(body[split_at:])
+            write(b'endobj\n')
+
+        page_refs.extend(mapping[num] for num in doc.page_refs)
+
+    offsets[catalog_num] = position
+    write(b'%d 0 obj\n<<\n/PageMode /UseNone /Pages %d 0 R /Type /Catalog\n>>\nendobj\n' % (catalog_num, pages_root_num))
+
+    offsets[pages_root_num] = position
+    kids = b' '.join(b'%d 0 R' % num for num in page_refs)
+    write(b'%d 0 obj\n<<\n/Count %d /Kids [ %s ] /Type /Pages\n>>\nendobj\n' % (pages_root_num, len(page_refs), kids))
+
+    # Cross-reference table covering objects 0..next_num-1
+    xref_at = position
+    xref = [b'xref\n0 %d\n' % next_num, b'0000000000 65535 f \n']
+    xref.extend(b'%010d 00000 n \n' % offsets[num] for num in range(1, next_num))
+    write(b''.join(xref))
+
+    file_id = hashlib.md5(b''.join(doc.data[doc.xref_at:] for doc in documents)).hexdigest().encode('ascii')
+    info = b'/Info %d 0 R\n' % mappings[0][documents[0].info] if documents[0].info is not None else b''
+    write(b'trailer\n<<\n/ID \n[<%s><%s>]\n%s/Root %d 0 R\n/Size %d\n>>\nstartxref\n%d\n%%%%EOF\n'
+          % (file_id, file_id, info, catalog_num, next_num, xref_at))
+
+    return len(page_refs)
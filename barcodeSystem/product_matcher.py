@@ -0,0 +1,154 @@
+"""
+Product type matcher compiled once per configuration.
+
+All configured product types, and their base types (the part before the
+first " - "), are loaded into one Aho-Corasick automaton over normalized
+text: lowercase, whitespace runs collapsed to one space, and whitespace
+around dashes removed. A single pass over an item name reports every
+product type occurrence with its position, whatever the number of
+configured types. Each candidate is then confirmed with the product
+type's own pattern on the original text, so matched text and positions
+are exactly those the per-type regex search would return.
+"""
+import re
+
+DASH_SEPARATOR = re.compile(r'\s*-\s*')
+WHITESPACE = re.compile(r'\s+')
+
+
+def canonicalize(text):
+    """
+    Normalize text for the automaton.
+
+    Normalizing never makes text longer, so a position in the normalized
+    text is never past the matching position in the original.
+    """
+    text = WHITESPACE.sub(' ', DASH_SEPARATOR.sub('-', text))
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # A few characters change length when lowercased; keep those as they are
+        lowered = ''.join(c.lower() if len(c.lower()) == 1 else c for c in text)
+    return lowered
+
+
+def product_type_pattern(product_type):
+    """Regex for a product type: " - " matches a dash with optional spaces, a space one or more spaces"""
+    return r'\s*-\s*'.join(
+        r'\s+'.join(re.escape(word) for word in part.split(' '))
+        for part in product_type.split(' - ')
+    )
+
+
+class ProductTypeMatcher:
+    """
+    Finds the best configured product type in an item name.
+
+    Matching rules:
+    - Each product type matches case insensitively at its first occurrence
+    - The longest matched text wins; ties go to the type listed first
+    - Only if no full product type matches are the base types tried, by the same rules
+    """
+
+    def __init__(self, product_types):
+        self.patterns = []        # Compiled pattern per pattern id
+        keys = []                 # Normalized text per pattern id
+        pattern_ids = {}
+        self.full_ids = []        # Pattern id of each product type, in configuration order
+        self.base_ids = []        # Pattern id of each product type's base type
+
+        for product_type in product_types:
+            product_type = product_type.strip()
+            if not product_type:
+                continue
+            base_type = product_type.split(' - ')[0].strip()
+            for text, ids in ((product_type, self.full_ids), (base_type, self.base_ids)):
+                if text not in pattern_ids:
+                    pattern_ids[text] = len(self.patterns)
+                    self.patterns.append(re.compile(product_type_pattern(text), re.IGNORECASE))
+                    keys.append(canonicalize(text))
+                ids.append(pattern_ids[text])
+
+        self._build_automaton(keys)
+
+    def _build_automaton(self, keys):
+        """
+        Build the automaton as a deterministic transition table.
+
+        Failure links are resolved ahead of time, so scanning takes exactly
+        one table lookup per character. Transitions back to the start state
+        are left out of the table.
+        """
+        goto = [{}]
+        outputs = [[]]
+        for pattern_id, key in enumerate(keys):
+            state = 0
+            for char in key:
+                if char not in goto[state]:
+                    goto.append({})
+                    outputs.append([])
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            outputs[state].append((pattern_id, len(key)))
+
+        # Breadth-first: each state inherits the transitions and outputs of its failure state,
+        # the longest proper suffix of its text that is also a pattern prefix
+        fail = [0] * len(goto)
+        self.transitions = [dict(goto[0])] + [None] * (len(goto) - 1)
+        queue = list(goto[0].values())
+        for state in queue:
+            self.transitions[state] = {**self.transitions[fail[state]], **goto[state]}
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            for char, next_state in goto[state].items():
+                fail[next_state] = self.transitions[fail[state]].get(char, 0)
+                queue.append(next_state)
+
+        # Only states where a pattern ends are kept
+        self.outputs = {state: found for state, found in enumerate(outputs) if found}
+
+    def scan(self, text):
+        """
+        Find all product type and base type occurrences in one pass.
+
+        Returns:
+            Dict of pattern id -> position of its first occurrence in the normalized text
+        """
+        transitions, outputs = self.transitions, self.outputs
+
+        candidates = {}
+        state = 0
+        for index, char in enumerate(canonicalize(text)):
+            state = transitions[state].get(char, 0)
+            if state in outputs:
+                for pattern_id, length in outputs[state]:
+                    if pattern_id not in candidates:
+                        candidates[pattern_id] = index - length + 1
+        return candidates
+
+    def search(self, text):
+        """
+        Best product type match in text.
+
+        Returns:
+            re.Match for the winning product type (or base type), or None
+        """
+        candidates = self.scan(text)
+        if not candidates:
+            return None
+
+        matches = {}
+        for ids in (self.full_ids, self.base_ids):
+            best_match = None
+            for pattern_id in ids:
+                if pattern_id not in candidates:
+                    continue
+                if pattern_id not in matches:
+                    # The first occurrence in normalized text is a lower bound for the original
+                    # position; confirming there also rules out look-alikes (e.g. "T - Shirt" for "T-Shirt")
+                    matches[pattern_id] = self.patterns[pattern_id].search(text, candidates[pattern_id])
+                match = matches[pattern_id]
+                # Prefer longer matches (more specific)
+                if match and (best_match is None or len(match.group(0)) > len(best_match.group(0))):
+                    best_match = match
+            if best_match:
+                return best_match
+        return None
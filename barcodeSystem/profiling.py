@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import tempfile
+import threading
+from collections import Counter
+
+
+def profiling_enabled():
+    """Profiling must be switched on for the deployment before any request can ask for it"""
+    return os.environ.get('LABEL_PROFILING', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def requested_mode(*flags):
+    """
+    Profiler a request asked for through its X-Profile header or ?profile= flag.
+
+    Returns:
+        'cprofile' (deterministic, the default for '1' / 'true'), 'sampling', or None when
+        the request did not ask or profiling is not enabled
+    """
+    if not profiling_enabled():
+        return None
+    for flag in flags:
+        flag = (flag or '').lower()
+        if flag in ('1', 'true', 'yes', 'on', 'cprofile'):
+            return 'cprofile'
+        if flag == 'sampling':
+            return 'sampling'
+    return None
+
+
+def frame_name(code):
+    """Flame graph frame label: file and qualified function name"""
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack at a fixed interval from a background thread.
+
+    Sampling costs the profiled thread almost nothing, so it can be used
+    on large production files; the counts of identical stacks give the
+    collapsed-stack text flame graph tools read.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()  # Tuple of code objects, outermost first -> samples
+        self.elapsed = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='label-profiler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+
+    def collapsed(self):
+        """Collapsed stacks: 'outer;...;inner count' per line"""
+        lines = [f"{';'.join(frame_name(code) for code in stack)} {count}" for stack, count in self.stacks.items()]
+        return '\n'.join(sorted(lines)) + '\n'
+
+    def create_stats(self):
+        """
+        Build pstats data from the samples, with times estimated from each function's share of them.
+
+        Each function gets its samples as the innermost frame (own time) and
+        anywhere on the stack (cumulative time), plus its callers, so the
+        result loads in pstats, snakeviz and similar tools like a cProfile dump.
+        """
+        # Samples are taken less often than the interval while the profiled thread holds the GIL,
+        # so each sample stands for the measured time divided by the number of samples
+        total = sum(self.stacks.values())
+        seconds = self.elapsed / total if total and self.elapsed else self.interval
+
+        own = Counter()
+        cumulative = Counter()
+        callers = {}
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            # Recursive functions count once per sample
+            for code in set(stack):
+                cumulative[code] += count
+            for caller, callee in set(zip(stack, stack[1:])):
+                callee_callers = callers.setdefault(callee, Counter())
+                callee_callers[caller] += count
+
+        def key(code):
+            return (code.co_filename, code.co_firstlineno, getattr(code, 'co_qualname', code.co_name))
+
+        self.stats = {}
+        for code, samples in cumulative.items():
+            self.stats[key(code)] = (
+                samples, samples, own[code] * seconds, samples * seconds,
+                {key(caller): (n, n, 0.0, n * seconds) for caller, n in callers.get(code, {}).items()}
+            )
+
+
+class RequestProfiler:
+    """
+    Profiles the calling thread while active.
+
+    'cprofile' records every call with cProfile (exact counts, higher
+    overhead); 'sampling' only samples the stack. Both collect sampled
+    stacks for the collapsed-stack output.
+    """
+
+    def __init__(self, mode='cprofile', interval=None):
+        self.mode = mode
+        self.interval = interval or float(os.environ.get('LABEL_PROFILE_INTERVAL_MS', 5)) / 1000
+        self.sampler = StackSampler(threading.get_ident(), self.interval)
+        self.profile = cProfile.Profile() if mode == 'cprofile' else None
+        self.duration = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self.sampler.start()
+        if self.profile is not None:
+            self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profile is not None:
+            self.profile.disable()
+        self.sampler.stop()
+        self.duration = time.perf_counter() - self._started
+
+    def stats(self):
+        """pstats.Stats of the profiled block"""
+        # pstats reads the sampler's data through create_stats, like a cProfile.Profile
+        return pstats.Stats(self.profile if self.profile is not None else self.sampler)
+
+
+class ProfileStore:
+    """
+    Saved request profiles, keyed by profile ID.
+
+    Each profile is a .pstats file, a .collapsed.txt flame graph input and
+    a .json file describing the request. Only the newest profiles are kept.
+    """
+
+    # File suffix of each downloadable profile format
+    KINDS = {'pstats': '.pstats', 'collapsed': '.collapsed.txt'}
+
+    def __init__(self, profiles_dir=None, keep=None):
+        self.profiles_dir = profiles_dir or os.environ.get(
+            'LABEL_PROFILES_DIR',
+            os.path.join(tempfile.gettempdir(), 'label_profiles')
+        )
+        self.keep = keep or int(os.environ.get('LABEL_PROFILES_KEEP', 50))
+
+    def _path(self, profile_id, suffix):
+        return os.path.join(self.profiles_dir, f'{profile_id}{suffix}')
+
+    def save(self, profiler, **details):
+        """Write a finished profiler's output and return the new profile ID"""
+        os.makedirs(self.profiles_dir, exist_ok=True)
+        profile_id = uuid.uuid4().hex
+
+        profiler.stats().dump_stats(self._path(profile_id, self.KINDS['pstats']))
+        with open(self._path(profile_id, self.KINDS['collapsed']), 'w', encoding='utf-8') as f:
+            f.write(profiler.sampler.collapsed())
+
+        details.update({
+            'profile_id': profile_id,
+            'mode': profiler.mode,
+            'created_at': time.time(),
+            'duration_seconds': round(profiler.duration, 3),
+            'samples': sum(profiler.sampler.stacks.values()),
+            'sample_interval_ms': profiler.interval * 1000,
+        })
+        # The description is written last, so listed profiles are always complete
+        with open(self._path(profile_id, '.json'), 'w', encoding='utf-8') as f:
+            json.dump(details, f)
+
+        self.cleanup()
+        return profile_id
+
+    def list(self):
+        """Descriptions of the saved profiles, newest first"""
+        profiles = []
+        if not os.path.isdir(self.profiles_dir):
+            return profiles
+        for name in os.listdir(self.profiles_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.profiles_dir, name), 'r', encoding='utf-8') as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # Removed by cleanup in another worker
+        return sorted(profiles, key=lambda profile: profile['created_at'], reverse=True)
+
+    def path(self, profile_id, kind):
+        """Path of a saved profile in one of KINDS, or None if it does not exist"""
+        if kind not in self.KINDS or len(profile_id) != 32 or not all(c in '0123456789abcdef' for c in profile_id):
+            return None
+        path = self._path(profile_id, self.KINDS[kind])
+        return path if os.path.exists(path) else None
+
+    def cleanup(self):
+        """Delete all but the newest profiles"""
+        for profile in self.list()[self.keep:]:
+            for suffix in list(self.KINDS.values()) + ['.json']:
+                try:
+                    os.unlink(self._path(profile['profile_id'], suffix))
+                except FileNotFoundError:
+                    pass
+
+
+# Profiles directory shared by every worker
+shared_profile_store = ProfileStore()
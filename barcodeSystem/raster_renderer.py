@@ -0,0 +1,269 @@
+import io
+import zipfile
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase._fontdata import findT1File
+from reportlab.lib.utils import ImageReader
+
+
+class GlyphAtlas:
+    """
+    Pre-rasterized 1-bit glyphs of one standard font at one pixel size.
+
+    Glyph shapes come from the Type 1 font files ReportLab ships for its
+    standard fonts and advance widths from the same AFM metrics the PDF
+    output uses, so text lands where it does in the PDF.
+    """
+
+    # Composed strings kept per atlas before the cache is reset
+    MAX_CACHED_STRINGS = 4096
+
+    def __init__(self, font_name, size_px):
+        self.font_name = font_name
+        self.font = ImageFont.truetype(findT1File(font_name), size_px)
+        self.face = pdfmetrics.getFont(font_name)
+        self.glyphs = {}
+        self.advances = {}
+        self.strings = {}
+
+        # Printable ASCII up front; anything else is rasterized on first use
+        for code in range(32, 127):
+            self.glyph(chr(code))
+
+    def glyph(self, char):
+        """(bitmap, left, top) for a character relative to its baseline origin, or None if it is blank"""
+        if char not in self.glyphs:
+            left, top, right, bottom = self.font.getbbox(char, anchor='ls')
+            if right <= left or bottom <= top:
+                self.glyphs[char] = None
+            else:
+                img = Image.new('L', (right - left, bottom - top), 0)
+                ImageDraw.Draw(img).text((-left, -top), char, font=self.font, fill=255, anchor='ls')
+                self.glyphs[char] = (np.asarray(img) >= 128, left, top)
+        return self.glyphs[char]
+
+    def advance(self, char, font_size):
+        """Advance width of a character in points"""
+        if char not in self.advances:
+            self.advances[char] = self.face.stringWidth(char, 1)
+        return self.advances[char] * font_size
+
+    def text_bitmap(self, text, font_size, scale):
+        """
+        Compose a whole string into one bitmap, cached per string.
+
+        Returns (bitmap, left, top) relative to the baseline origin, or None
+        for blank text. Glyph origins are the rounded AFM pen positions, so
+        the string is laid out exactly as stringWidth measures it.
+        """
+        if text in self.strings:
+            return self.strings[text]
+
+        placed = []
+        pen = 0.0
+        for char in text:
+            glyph = self.glyph(char)
+            if glyph is not None:
+                bitmap, left, top = glyph
+                placed.append((bitmap, int(round(pen * scale)) + left, top))
+            pen += self.advance(char, font_size)
+
+        if not placed:
+            result = None
+        else:
+            left = min(x for _, x, _ in placed)
+            top = min(y for _, _, y in placed)
+            right = max(x + bitmap.shape[1] for bitmap, x, _ in placed)
+            bottom = max(y + bitmap.shape[0] for bitmap, _, y in placed)
+            strip = np.zeros((bottom - top, right - left), dtype=bool)
+            for bitmap, x, y in placed:
+                strip[y - top:y - top + bitmap.shape[0], x - left:x - left + bitmap.shape[1]] |= bitmap
+            result = (strip, left, top)
+
+        # Order numbers and SKUs are mostly unique, so keep the cache bounded
+        if len(self.strings) >= self.MAX_CACHED_STRINGS:
+            self.strings.clear()
+        self.strings[text] = result
+        return result
+
+
+# Atlases shared by every raster canvas, keyed by (font name, pixel size)
+_atlases = {}
+
+
+def glyph_atlas(font_name, size_px):
+    key = (font_name, round(size_px, 3))
+    if key not in _atlases:
+        _atlases[key] = GlyphAtlas(font_name, key[1])
+    return _atlases[key]
+
+
+class RasterPath:
+    """Collects rectangles like a ReportLab path object (the only shape the barcode drawers use)"""
+
+    def __init__(self):
+        self.rects = []
+
+    def rect(self, x, y, width, height):
+        self.rects.append((x, y, width, height))
+
+
+class RasterCanvas:
+    """
+    Renders labels straight to 1-bit NumPy arrays through the subset of the
+    ReportLab canvas API that the label generators draw with.
+
+    Coordinates are in points with the origin at the bottom left, as on a
+    ReportLab canvas; each label is a (height, width) boolean array in
+    printer dots where True is a black dot. Forms are rasterized once and
+    OR-ed onto every page that uses them.
+    """
+
+    def __init__(self, pagesize, dpi=203):
+        self.dpi = dpi
+        self.scale = dpi / 72.0
+
+        self.font_name = 'Helvetica'
+        self.font_size = 12
+
+        self._forms = {}
+        self._form = None
+        self._form_name = None
+
+        self.page = None
+        self.setPageSize(pagesize)
+
+    def dots(self, points):
+        """Convert points to whole printer dots"""
+        return int(round(points * self.scale))
+
+    def setPageSize(self, size):
+        self.page_width, self.page_height = size
+        shape = (self.dots(self.page_height), self.dots(self.page_width))
+        if self.page is None or self.page.shape != shape:
+            self.page = np.zeros(shape, dtype=bool)
+
+    def _target(self):
+        return self._form if self._form is not None else self.page
+
+    def _blit(self, bitmap, x, y):
+        """OR a bitmap onto the target with its top-left corner at dot (x, y), clipped to the page"""
+        target = self._target()
+        height, width = bitmap.shape
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, target.shape[1]), min(y + height, target.shape[0])
+        if x0 < x1 and y0 < y1:
+            target[y0:y1, x0:x1] |= bitmap[y0 - y:y1 - y, x0 - x:x1 - x]
+
+    def setFont(self, font_name, font_size):
+        self.font_name = font_name
+        self.font_size = font_size
+
+    def stringWidth(self, text, font_name=None, font_size=None):
+        return pdfmetrics.stringWidth(text, font_name or self.font_name, font_size or self.font_size)
+
+    def drawString(self, x, y, text):
+        """Blit text composed from the glyph atlas with its baseline at (x, y)"""
+        atlas = glyph_atlas(self.font_name, self.font_size * self.scale)
+        composed = atlas.text_bitmap(text, self.font_size, self.scale)
+        if composed is not None:
+            bitmap, left, top = composed
+            self._blit(bitmap, self.dots(x) + left, self.dots(self.page_height - y) + top)
+
+    def drawImage(self, image, x, y, width, height, preserveAspectRatio=False):
+        """Blit an image (PIL image or ImageReader), thresholded to black and white"""
+        if isinstance(image, ImageReader):
+            image = Image.frombytes('RGB', image.getSize(), image.getRGBData())
+
+        size = (self.dots(width), self.dots(height))
+        if image.size != size:
+            image = image.resize(size, Image.NEAREST)
+        bitmap = np.asarray(image.convert('L')) < 128
+        self._blit(bitmap, self.dots(x), self.dots(self.page_height - y - height))
+
+    def beginPath(self):
+        return RasterPath()
+
+    def drawPath(self, path, stroke=0, fill=1):
+        """Fill a path's rectangles; the barcode drawers snap them to whole dots"""
+        if not path.rects:
+            return
+        target = self._target()
+        height, width = target.shape
+
+        # Convert every rectangle to clipped dot bounds at once
+        x, y, rect_width, rect_height = np.array(path.rects).T * self.scale
+        page_height = self.page_height * self.scale
+        x0 = np.clip(np.rint(x), 0, width).astype(int)
+        x1 = np.clip(np.rint(x + rect_width), 0, width).astype(int)
+        y0 = np.clip(np.rint(page_height - y - rect_height), 0, height).astype(int)
+        y1 = np.clip(np.rint(page_height - y), 0, height).astype(int)
+
+        # Fill each horizontal band (a barcode is one band, a DataMatrix one per module row)
+        # in one operation, marking span starts with +1 and ends with -1
+        for top, bottom in set(zip(y0.tolist(), y1.tolist())):
+            if top >= bottom:
+                continue
+            in_band = (y0 == top) & (y1 == bottom)
+            edges = np.zeros(width + 1, dtype=np.int16)
+            np.add.at(edges, x0[in_band], 1)
+            np.add.at(edges, x1[in_band], -1)
+            target[top:bottom] |= np.cumsum(edges[:-1]) > 0
+
+    def beginForm(self, name):
+        """Rasterize following drawing into a form bitmap instead of the page"""
+        self._form_name = name
+        self._form = np.zeros_like(self.page)
+
+    def endForm(self):
+        self._forms[self._form_name] = self._form
+        self._form = None
+
+    def hasForm(self, name):
+        return name in self._forms
+
+    def doForm(self, name):
+        self.page |= self._forms[name]
+
+    def showPage(self):
+        """Return the finished label bitmap and start a blank one"""
+        bitmap = self.page
+        self.page = np.zeros_like(bitmap)
+        return bitmap
+
+
+class RasterLabelWriter:
+    """
+    Writes label bitmaps as a multi-image PBM stream ('pbm') or as a ZIP
+    of 1-bit PNGs, one file per printed label ('zip').
+    """
+
+    def __init__(self, output, label_format):
+        self.output = output
+        self.label_format = label_format
+        self.label_count = 0
+        self.archive = zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) if label_format == 'zip' else None
+
+    def write(self, bitmap, quantity=1):
+        """Write one label bitmap quantity times (encoded once)"""
+        height, width = bitmap.shape
+
+        if self.archive is None:
+            # Raw PBM: 1 is black, rows padded to whole bytes - the same layout as packbits
+            data = b'P4\n%d %d\n' % (width, height) + np.packbits(bitmap, axis=1).tobytes()
+            for _ in range(quantity):
+                self.output.write(data)
+        else:
+            # PIL 1-bit images use 1 for white
+            img = Image.frombytes('1', (width, height), np.packbits(~bitmap, axis=1).tobytes())
+            png = io.BytesIO()
+            img.save(png, format='PNG')
+            for index in range(quantity):
+                self.archive.writestr(f'label_{self.label_count + index + 1:05d}.png', png.getvalue())
+
+        self.label_count += quantity
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
@@ -0,0 +1,176 @@
+import io
+import re
+import math
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4, legal, letter, inch
+
+# Named sheet sizes; other sizes are given in inches as 'WxH', e.g. '8.5x11'
+SHEET_SIZES = {'letter': letter, 'legal': legal, 'a4': A4}
+
+CUSTOM_SHEET_SIZE = re.compile(r'^(\d+(?:\.\d+)?)x(\d+(?:\.\d+)?)$')
+
+# PDF viewers and printers do not handle pages larger than 200 inches
+MAX_SHEET_INCHES = 200
+
+# Unprintable border kept clear when the grid is fitted to the sheet (points)
+DEFAULT_SHEET_MARGIN = 0.25 * inch
+
+
+def sheet_size_points(sheet_size):
+    """Page size in points of a named sheet size or a 'WxH' size in inches"""
+    name = str(sheet_size).strip().lower()
+    if name in SHEET_SIZES:
+        return SHEET_SIZES[name]
+    match = CUSTOM_SHEET_SIZE.match(name)
+    if not match:
+        raise ValueError(f'Unknown sheet size "{sheet_size}": use letter, legal, a4 or WxH in inches')
+    width, height = float(match.group(1)), float(match.group(2))
+    if not 0 < width <= MAX_SHEET_INCHES or not 0 < height <= MAX_SHEET_INCHES:
+        raise ValueError(f'Sheet size "{sheet_size}" must be between 0 and {MAX_SHEET_INCHES} inches per side')
+    return width * inch, height * inch
+
+
+class SheetLayout:
+    """
+    Grid of label positions on a sheet, for printing several labels per PDF page.
+
+    Labels keep their print order: each sheet is filled row by row from
+    the top left corner, and a new sheet is started when it is full. The
+    grid is centered on the sheet. Rows and columns that are not given
+    are as many as fit inside the sheet margin.
+    """
+
+    def __init__(self, label_size, sheet_size='letter', rows=None, columns=None,
+                 row_gutter=0, column_gutter=0, margin=DEFAULT_SHEET_MARGIN):
+        """
+        Args:
+            label_size: (width, height) of one label in points
+            sheet_size: 'letter', 'legal', 'a4', 'WxH' in inches or (width, height) in points
+            rows, columns: Grid size (default: as many as fit)
+            row_gutter, column_gutter: Space between rows and between columns in points
+            margin: Border around the grid that is kept clear, in points
+
+        Raises:
+            ValueError: If the grid does not fit on the sheet
+        """
+        self.label_width, self.label_height = label_size
+        self.sheet_size = sheet_size if isinstance(sheet_size, tuple) else sheet_size_points(sheet_size)
+        sheet_width, sheet_height = self.sheet_size
+        if row_gutter < 0 or column_gutter < 0 or margin < 0:
+            raise ValueError('Sheet gutters and margin cannot be negative')
+
+        # Labels that fit: n labels and n - 1 gutters inside the margins
+        self.columns = columns or int((sheet_width - 2 * margin + column_gutter) // (self.label_width + column_gutter))
+        self.rows = rows or int((sheet_height - 2 * margin + row_gutter) // (self.label_height + row_gutter))
+
+        grid_width = self.columns * self.label_width + (self.columns - 1) * column_gutter
+        grid_height = self.rows * self.label_height + (self.rows - 1) * row_gutter
+        if self.columns < 1 or self.rows < 1 or grid_width > sheet_width - 2 * margin or grid_height > sheet_height - 2 * margin:
+            raise ValueError(
+                f'{self.rows} x {self.columns} labels of {self.label_width / inch:g}" x {self.label_height / inch:g}" '
+                f'do not fit on a {sheet_width / inch:g}" x {sheet_height / inch:g}" sheet'
+            )
+
+        # Bottom-left corner of every label position, in print order (rows top to bottom, left to right)
+        left = (sheet_width - grid_width) / 2
+        top = (sheet_height + grid_height) / 2
+        self.slots = [
+            (left + column * (self.label_width + column_gutter), top - (row + 1) * self.label_height - row * row_gutter)
+            for row in range(self.rows)
+            for column in range(self.columns)
+        ]
+
+    @property
+    def labels_per_page(self):
+        return len(self.slots)
+
+    def render(self, generator, draw_function, labels, output=None):
+        """
+        Render (label_fields, quantity) entries onto sheets.
+
+        Each label is drawn by draw_function (the generator's single label
+        drawing) at its position's origin. Rows with several copies are
+        drawn once as a Form XObject and placed by reference on every copy.
+
+        Returns:
+            Tuple of (buffer, label_count)
+        """
+        buffer = output if output is not None else io.BytesIO()
+        c = canvas.Canvas(buffer, pagesize=self.sheet_size)
+
+        label_count = 0
+        slot = 0
+
+        for label_fields, quantity in labels:
+            if quantity < 1:
+                continue
+            form_name = generator.label_form(c, draw_function, *label_fields) if quantity > 1 else None
+
+            for _ in range(quantity):
+                if slot == len(self.slots):
+                    c.showPage()
+                    slot = 0
+
+                x, y = self.slots[slot]
+                c.saveState()
+                c.translate(x, y)
+                if form_name is None:
+                    draw_function(c, *label_fields)
+                else:
+                    c.doForm(form_name)
+                c.restoreState()
+
+                slot += 1
+                label_count += 1
+                generator.report_progress(label_count)
+
+        # Finish the last, possibly partly filled sheet
+        if slot:
+            c.showPage()
+
+        with generator.timings.span('save'):
+            c.save()
+        buffer.flush()
+        buffer.seek(0)
+
+        return buffer, label_count
+
+
+def sheet_from_form(form, label_size):
+    """
+    Sheet layout selected by upload form fields, or None for one label per page.
+
+    Fields: sheet (sheet size; enables sheet output), sheet_rows, sheet_columns,
+    sheet_row_gutter and sheet_column_gutter (inches, default 0).
+
+    Raises:
+        ValueError: If a field is invalid or the grid does not fit on the sheet
+    """
+    sheet_size = form.get('sheet', '').strip()
+    if not sheet_size:
+        return None
+
+    def number(name, convert):
+        value = form.get(name, '').strip()
+        if not value:
+            return None
+        try:
+            value = convert(value)
+        except ValueError:
+            raise ValueError(f'{name} must be a number')
+        if not math.isfinite(value):
+            raise ValueError(f'{name} must be a number')
+        return value
+
+    rows = number('sheet_rows', int)
+    columns = number('sheet_columns', int)
+    if (rows is not None and rows < 1) or (columns is not None and columns < 1):
+        raise ValueError('sheet_rows and sheet_columns must be at least 1')
+    return SheetLayout(
+        label_size,
+        sheet_size,
+        rows=rows,
+        columns=columns,
+        row_gutter=(number('sheet_row_gutter', float) or 0) * inch,
+        column_gutter=(number('sheet_column_gutter', float) or 0) * inch,
+    )
@@ -0,0 +1,187 @@
+"""
+Header-first ingest of uploaded .xlsx and .csv files.
+
+The header row is read on its own so the file format can be detected
+before any data is loaded; only the columns that format needs are then
+read. For workbooks, rows are streamed with openpyxl in read-only mode
+and every other cell (such as the long "Item - Options" tariff code
+lists in ShipStation exports) is skipped without being converted or
+kept. Kept cells are converted as pandas.read_excel converts them and
+go through the same pandas text parser, so the resulting columns and
+dtypes match a full read.
+
+CSV files are parsed with pyarrow's multithreaded reader, using
+explicit column types instead of inference; pandas' reader is the
+fallback when a column does not fit its declared type.
+"""
+import os
+import io
+import numbers
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+# CSV reader: 'auto' uses pyarrow, 'pandas' always uses pandas
+CSV_ENGINE = os.environ.get('LABEL_CSV_ENGINE', 'auto')
+
+# pandas' default missing value markers, so both CSV readers treat the same cells as missing
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+             '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+
+def open_sheet(file):
+    """Open an uploaded file (anything with .filename that pandas can read) by its extension"""
+    filename = file.filename.lower()
+
+    if filename.endswith('.xlsx'):
+        return XlsxSheet(file)
+    elif filename.endswith('.csv'):
+        return CsvSheet(file)
+    else:
+        raise ValueError("File must be .xlsx or .csv")
+
+
+def convert_cell(value):
+    """Convert a cell value the way pandas' openpyxl reader does"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, numbers.Number):
+        # Whole numbers are ints, like in pandas (Excel stores every number as a float)
+        if value == int(value):
+            return int(value)
+        return float(value)
+    if isinstance(value, str) and value in ERROR_CODES:
+        return np.nan
+    return value
+
+
+class XlsxSheet:
+    """First worksheet of a workbook, read in one streaming pass"""
+
+    def __init__(self, file):
+        self.workbook = load_workbook(file, read_only=True, data_only=True, keep_links=False)
+        worksheet = self.workbook.worksheets[0]
+        worksheet.reset_dimensions()
+        self.rows = worksheet.iter_rows(values_only=True)
+
+        self.header = [convert_cell(value) for value in next(self.rows, ())]
+        while self.header and self.header[-1] == '':
+            self.header.pop()
+
+        # Header names as pandas reports them (unnamed columns excluded, duplicates keep the first position)
+        self.columns = []
+        self.positions = {}
+        for position, name in enumerate(self.header):
+            if name != '' and name not in self.positions:
+                self.positions[name] = position
+                self.columns.append(name)
+
+    def read(self, columns, column_types=None):
+        """
+        DataFrame of the given columns (those present, in sheet order)
+
+        column_types is accepted for symmetry with CsvSheet; workbook cells are already typed.
+        """
+        self.engine = 'openpyxl'
+        positions = sorted(self.positions[name] for name in columns if name in self.positions)
+        if not positions:
+            self.close()
+            return pd.DataFrame()
+
+        data = [[self.header[position] for position in positions]]
+        last_row_with_data = 0
+        for row in self.rows:
+            width = len(row)
+            values = [convert_cell(row[position]) if position < width else '' for position in positions]
+            data.append(values)
+
+            # Blank rows at the end of the sheet are dropped, as pandas does; a row counts as
+            # blank only if every cell is, including the skipped ones
+            if any(value != '' for value in values) or any(value is not None and value != '' for value in row):
+                last_row_with_data = len(data) - 1
+        self.close()
+
+        return TextParser(data[:last_row_with_data + 1], header=0).read()
+
+    def close(self):
+        self.workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvSheet:
+    """CSV file: the header line first, then only the wanted columns"""
+
+    def __init__(self, file):
+        self.file = file
+        self.columns = list(pd.read_csv(file, nrows=0).columns)
+        self.engine = None
+
+    def read(self, columns, column_types=None):
+        """
+        DataFrame of the given columns (those present, in file order)
+
+        Args:
+            columns: Column names to load
+            column_types: Optional dict of column name -> 'string' or 'integer'; with it, pyarrow
+                reads the file and integer columns with missing values become
+                floats, as they do in pandas
+        """
+        wanted = set(columns)
+        present = [name for name in self.columns if name in wanted]
+
+        if column_types and CSV_ENGINE != 'pandas':
+            try:
+                df = self._read_arrow(present, column_types)
+                self.engine = 'pyarrow'
+                return df
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, UnicodeDecodeError):
+                pass  # A value that does not fit its column type - let pandas infer
+
+        self.file.seek(0)
+        self.engine = 'pandas'
+        return pd.read_csv(self.file, usecols=lambda name: name in wanted)
+
+    def _read_arrow(self, present, column_types):
+        """Read the columns with pyarrow's multithreaded CSV reader and explicit types"""
+        arrow_types = {'string': pa.string(), 'integer': pa.int64()}
+
+        self.file.seek(0)
+        table = pa_csv.read_csv(
+            io.BytesIO(self.file.read()),
+            read_options=pa_csv.ReadOptions(use_threads=True),
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=present,
+                column_types={name: arrow_types[column_types.get(name, 'string')] for name in present},
+                null_values=NA_VALUES,
+                strings_can_be_null=True
+            )
+        )
+        df = table.to_pandas()
+
+        # Missing text is NaN, as pandas reads it (Arrow gives None)
+        for name in present:
+            if df[name].dtype == object:
+                df[name] = df[name].where(df[name].notna(), np.nan)
+        return df
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
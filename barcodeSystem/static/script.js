@@ -18,6 +18,9 @@ document.addEventListener('DOMContentLoaded', function() {
 
     let selectedFile = null;
 
+    // Files larger than this are processed as background jobs so the request doesn't time out
+    const ASYNC_UPLOAD_THRESHOLD = 1024 * 1024;
+
     // Label size toggle functionality
     const toggleButtons = document.querySelectorAll('.toggle-btn');
     const labelSizeInput = document.getElementById('labelSizeInput');
@@ -36,11 +39,7 @@ document.addEventListener('DOMContentLoaded', function() {
             labelSizeInput.value = selectedSize;
 
             // Update header subtitle
-            if (selectedSize === '3x1') {
-                headerSubtitle.textContent = 'Generate 3"×1" labels for thermal printers (203 DPI)';
-            } else {
-                headerSubtitle.textContent = 'Generate 2"×1" labels for thermal printers (203 DPI)';
-            }
+            headerSubtitle.textContent = labelSizeSubtitle(selectedSize);
         });
     });
 
@@ -136,13 +135,22 @@ document.addEventListener('DOMContentLoaded', function() {
         const formData = new FormData();
         formData.append('file', selectedFile);
         formData.append('label_size', labelSizeInput.value);
+        if (selectedFile.size > ASYNC_UPLOAD_THRESHOLD) {
+            formData.append('mode', 'async');
+        }
 
         try {
-            const response = await fetch('/upload', {
+            let response = await fetch('/upload', {
                 method: 'POST',
                 body: formData
             });
 
+            // Large files come back as a queued job - wait for it, then download the PDF
+            if (response.status === 202) {
+                const job = await response.json();
+                response = await waitForJob(job);
+            }
+
             if (response.ok) {
                 // Get filename from Content-Disposition header or use default
                 const contentDisposition = response.headers.get('Content-Disposition');
@@ -176,6 +184,27 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    async function waitForJob(job) {
+        // Poll the job status until it finishes, showing progress as labels are rendered
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+
+            const statusResponse = await fetch(job.status_url);
+            if (!statusResponse.ok) {
+                return statusResponse;
+            }
+
+            const status = await statusResponse.json();
+            if (status.state === 'done' || status.state === 'failed') {
+                return fetch(job.pdf_url);
+            }
+
+            progressText.textContent = status.state === 'queued'
+                ? 'Waiting for a free worker...'
+                : `Generating labels... ${status.labels_rendered} rendered`;
+        }
+    }
+
     function showProgress() {
         hideResults();
         progressContainer.style.display = 'block';
@@ -247,6 +276,12 @@ document.addEventListener('DOMContentLoaded', function() {
         return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
     }
 
+    function labelSizeSubtitle(size) {
+        // '4x2' -> 'Generate 4"×2" labels ...'
+        const [width, height] = size.split('x');
+        return `Generate ${width}"×${height}" labels for thermal printers (203 DPI)`;
+    }
+
     // Settings Modal Functionality
     const settingsBtn = document.getElementById('settingsBtn');
     const settingsModal = document.getElementById('settingsModal');
@@ -426,11 +461,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
         // Update header subtitle
         if (headerSubtitle) {
-            if (defaultSize === '3x1') {
-                headerSubtitle.textContent = 'Generate 3"×1" labels for thermal printers (203 DPI)';
-            } else {
-                headerSubtitle.textContent = 'Generate 2"×1" labels for thermal printers (203 DPI)';
-            }
+            headerSubtitle.textContent = labelSizeSubtitle(defaultSize);
         }
     }
 
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for parsed batches kept between validation and upload
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from batch_cache import BatchCache, file_digest
+from label_generator import LabelGenerator
+
+
+def test_batches_are_checked_against_file_settings_and_size(tmp_path):
+    cache = BatchCache(cache_dir=str(tmp_path), ttl_seconds=60)
+    batch = ('new', pd.DataFrame({'Product': ['Threat Level Midnight'], 'Quantity': [2]}))
+    file_hash = file_digest(b'Order - Number,Item - SKU\n')
+    token = cache.put(batch, file_hash, 'v1', '2x1')
+
+    loaded, reason = cache.get(token, file_hash, 'v1', '2x1')
+    assert reason is None and loaded[0] == 'new' and loaded[1].equals(batch[1])
+
+    assert cache.get(token, file_digest(b'other'), 'v1', '2x1') == (None, 'file changed')
+    assert cache.get(token, file_hash, 'v2', '2x1') == (None, 'settings changed')
+    assert cache.get(token, file_hash, 'v1', '3x1') == (None, 'label size changed')
+    assert cache.get('../../etc/passwd', file_hash, 'v1', '2x1') == (None, 'invalid token')
+
+
+def test_expired_batches_are_rejected_and_removed(tmp_path):
+    cache = BatchCache(cache_dir=str(tmp_path), ttl_seconds=60)
+    token = cache.put(('old', pd.DataFrame()), 'hash', 'v1', '2x1')
+    path = os.path.join(str(tmp_path), f'{token}.parquet')
+    os.utime(path, (0, 0))
+
+    assert cache.get(token, 'hash', 'v1', '2x1') == (None, 'expired')
+    cache.cleanup_expired()
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_unreadable_batches_are_a_cache_miss(tmp_path):
+    cache = BatchCache(cache_dir=str(tmp_path / 'batches'), ttl_seconds=60)
+    token = cache.put(('new', pd.DataFrame({'Quantity': [1]})), 'hash', 'v1', '2x1')
+    assert os.stat(cache.cache_dir).st_mode & 0o777 == 0o700
+
+    # A truncated entry is parsed again rather than failing the upload
+    path = os.path.join(cache.cache_dir, f'{token}.parquet')
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) // 2)
+    assert cache.get(token, 'hash', 'v1', '2x1') == (None, 'unreadable')
+
+    # Pickles planted in the directory are never loaded
+    planted = 'A' * 32
+    with open(os.path.join(cache.cache_dir, f'{planted}.pickle'), 'wb') as f:
+        f.write(b'cos\nsystem\n(S"exit 1"\ntR.')
+    assert cache.get(planted, 'hash', 'v1', '2x1') == (None, 'unknown or expired')
+
+
+def test_shared_directory_is_made_private(tmp_path):
+    cache_dir = tmp_path / 'batches'
+    cache_dir.mkdir(mode=0o777)
+    os.chmod(str(cache_dir), 0o777)
+    cache = BatchCache(cache_dir=str(cache_dir), ttl_seconds=60)
+
+    assert cache.put(('new', pd.DataFrame({'Quantity': [1]})), 'hash', 'v1', '2x1') is not None
+    assert os.stat(str(cache_dir)).st_mode & 0o777 == 0o700
+
+
+def test_parsed_batch_renders_like_the_file():
+    generator = LabelGenerator()
+    generator.prefetch_datamatrix_images = lambda urls: None
+    generator.fetch_datamatrix_image = lambda url: None
+    df = pd.read_csv('new-orders-format.csv')
+
+    file_format, parsed = generator.parse_batch(df)
+    assert file_format == 'new'
+    assert parsed.columns[:4].tolist() == ['Product', 'ProductType', 'Size', 'Quantity']
+
+    _, batch_count = generator.render_batch((file_format, parsed))
+    _, file_count = generator.process_new_format(df)
+    assert batch_count == file_count == parsed['Quantity'].sum()
+
+
+def test_stored_batch_renders_like_parsing_the_file(tmp_path):
+    df = pd.read_csv('new-orders-format.csv')
+    for name in ('Order - Number', 'Market - Store Name', 'Date - Ship By Date'):
+        df.loc[2, name] = np.nan
+
+    def render(render_function, *args):
+        generator = LabelGenerator()
+        generator.label_format = 'zpl'
+        generator.prefetch_datamatrix_images = lambda urls: None
+        generator.fetch_datamatrix_image = lambda url: None
+        return render_function(generator)(*args)[0].getvalue()
+
+    parsed = LabelGenerator().parse_batch(df.copy())
+    cache = BatchCache(cache_dir=str(tmp_path), ttl_seconds=60)
+    token = cache.put(parsed, 'hash', 'v1', '2x1')
+    stored, reason = cache.get(token, 'hash', 'v1', '2x1')
+
+    assert reason is None
+    assert render(lambda generator: generator.render_batch, stored) == \
+        render(lambda generator: generator.process_new_format, df.copy())
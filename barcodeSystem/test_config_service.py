@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared configuration service
+"""
+
+import json
+import os
+from config_service import ConfigService
+
+
+def test_snapshot_is_reused_until_the_file_changes(tmp_path):
+    path = tmp_path / 'product_mappings.json'
+    service = ConfigService(str(path))
+    service.save({'product_types': ['Trucker Hat'], 'shortening_rules': [], 'max_bins': 4})
+
+    first = service.snapshot()
+    assert service.snapshot() is first
+    assert first.product_types == ('Trucker Hat',) and first.max_bins == 4
+    assert first.product_matcher.search('Retro Trucker Hat - Black').group(0) == 'Trucker Hat'
+
+    # Saving writes a new file, so the change is seen even with an unchanged modification time
+    stat = os.stat(path)
+    service.save({'product_types': ['Trucker Hat', 'Luxury Hoodie'], 'shortening_rules': [], 'max_bins': 4})
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    second = service.snapshot()
+    assert second.product_types == ('Trucker Hat', 'Luxury Hoodie')
+    assert second.version != first.version
+
+    # Rewriting the same content keeps the compiled snapshot
+    service.save(json.loads(path.read_text()))
+    assert service.snapshot() is second
+
+
+def test_snapshots_are_read_only_and_compile_rules(tmp_path):
+    service = ConfigService(str(tmp_path / 'missing.json'))
+    snapshot = service.snapshot()
+    assert len(snapshot.product_types) == 10
+
+    try:
+        snapshot.max_bins = 3
+        assert False, 'snapshot attributes should not be assignable'
+    except AttributeError:
+        pass
+
+    service.save({'product_types': [], 'shortening_rules': [
+        {'pattern': 'soft premium tee', 'conditions': [{'contains': 'black', 'result': 'SOFT TEE - BK'}, {'default': True, 'result': 'SOFT TEE'}]}
+    ]})
+    rule_index, pattern, conditions = service.snapshot().compiled_rules[0]
+    assert (rule_index, pattern) == (0, 'SOFT PREMIUM TEE')
+    assert [condition[:3] for condition in conditions] == [(0, False, 'BLACK'), (1, True, None)]
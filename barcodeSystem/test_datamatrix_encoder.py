@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-process DataMatrix encoder
+"""
+
+import datamatrix_encoder
+from datamatrix_encoder import encode_datamatrix, matrix_to_image
+
+
+def test_iso_reference_codewords():
+    """'123456' must produce the codewords from the ISO/IEC 16022 worked example"""
+    data = datamatrix_encoder.encode_ascii('123456')
+    assert data == [142, 164, 186]
+
+    codewords = datamatrix_encoder._add_error_correction(datamatrix_encoder._pad(data, 3), 5, 1)
+    assert codewords == [142, 164, 186, 114, 25, 5, 88, 102]
+
+
+def test_finder_and_timing_patterns():
+    """Every symbol has a solid L finder and alternating timing edges"""
+    for order_number in ['BR-47678', '111-0833978-7283400', 'X' * 60]:
+        matrix = encode_datamatrix(order_number)
+        size = len(matrix)
+        assert all(len(row) == size for row in matrix)
+        assert all(row[0] for row in matrix)                           # Left edge solid
+        assert all(matrix[-1])                                         # Bottom edge solid
+        assert matrix[0] == [col % 2 == 0 for col in range(size)]      # Top edge alternates
+        assert [row[-1] for row in matrix] == [r % 2 == 1 for r in range(size)]  # Right edge alternates
+
+
+def test_symbol_size_selection():
+    """The smallest square symbol that fits is chosen"""
+    assert len(encode_datamatrix('123456')) == 10
+    assert len(encode_datamatrix('BR-47678')) == 14
+    assert len(encode_datamatrix('A' * 100)) == 40   # Two data regions per side
+
+
+def test_bitmap_is_exact_size():
+    """Bitmaps use whole-pixel modules padded to the requested size"""
+    img = matrix_to_image(encode_datamatrix('BR-47678'), 77)
+    assert img.mode == '1'
+    assert img.size == (77, 77)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests for DataMatrix image downloads: retries, Retry-After and per-host limits
+"""
+
+import time
+import threading
+from email.utils import formatdate
+import pytest
+import requests
+import datamatrix_fetcher
+from datamatrix_fetcher import DataMatrixFetcher
+
+URL = 'https://cdn.example.com/QR_ThreatLevelMidnight.png'
+
+
+def make_response(status_code, content=b'', headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response.headers.update(headers or {})
+    response.url = URL
+    return response
+
+
+def stub_session(fetcher, responses):
+    """Answer session.get with the given responses in order, recording the URLs requested"""
+    calls = []
+    responses = iter(responses)
+
+    def get(url, timeout=None):
+        calls.append(url)
+        return next(responses)
+
+    fetcher.session.get = get
+    return calls
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record retry delays instead of sleeping"""
+    delays = []
+    monkeypatch.setattr(datamatrix_fetcher.time, 'sleep', delays.append)
+    return delays
+
+
+def test_rate_limited_download_waits_for_retry_after(sleeps):
+    fetcher = DataMatrixFetcher()
+    calls = stub_session(fetcher, [make_response(429, headers={'Retry-After': '2'}), make_response(200, b'png')])
+
+    assert fetcher.fetch(URL) == b'png'
+    assert calls == [URL, URL] and sleeps == [2.0]
+
+
+def test_retry_after_dates_are_capped():
+    fetcher = DataMatrixFetcher(max_retry_after=5)
+    in_a_minute = make_response(429, headers={'Retry-After': formatdate(time.time() + 60, usegmt=True)})
+    in_the_past = make_response(429, headers={'Retry-After': formatdate(time.time() - 60, usegmt=True)})
+
+    assert fetcher._retry_delay(in_a_minute, 0) == 5
+    assert fetcher._retry_delay(in_the_past, 0) == 0
+    assert fetcher._retry_delay(make_response(429, headers={'Retry-After': 'soon'}), 2) == 2.0
+
+
+def test_transient_failure_is_retried_with_backoff(sleeps):
+    fetcher = DataMatrixFetcher()
+    calls = stub_session(fetcher, [make_response(503), make_response(200, b'png')])
+
+    assert fetcher.fetch(URL) == b'png'
+    assert len(calls) == 2 and sleeps == [0.5]
+
+
+def test_gives_up_after_the_last_attempt(sleeps):
+    fetcher = DataMatrixFetcher(max_retries=2)
+    calls = stub_session(fetcher, [make_response(503)] * 5)
+
+    with pytest.raises(requests.HTTPError) as error:
+        fetcher.fetch(URL)
+    assert error.value.response.status_code == 503
+    assert len(calls) == 3 and sleeps == [0.5, 1.0]
+
+    # Errors that retrying cannot fix are not retried
+    calls = stub_session(fetcher, [make_response(404)])
+    with pytest.raises(requests.HTTPError):
+        fetcher.fetch(URL)
+    assert len(calls) == 1
+
+
+def test_fetch_many_returns_none_for_failed_urls(sleeps):
+    fetcher = DataMatrixFetcher(max_retries=0)
+    bodies = {'https://cdn.example.com/a.png': make_response(200, b'a'),
+              'https://cdn.example.com/b.png': make_response(404)}
+    fetcher.session.get = lambda url, timeout=None: bodies[url]
+
+    results = fetcher.fetch_many(list(bodies) + ['https://cdn.example.com/a.png', '', None], process=bytes.upper)
+    assert results == {'https://cdn.example.com/a.png': b'A', 'https://cdn.example.com/b.png': None}
+
+
+def test_requests_per_host_are_limited():
+    fetcher = DataMatrixFetcher(max_workers=8, per_host_limit=2)
+    lock = threading.Lock()
+    active = {}
+    most_active = {}
+
+    def get(url, timeout=None):
+        host = url.split('/')[2]
+        with lock:
+            active[host] = active.get(host, 0) + 1
+            most_active[host] = max(most_active.get(host, 0), active[host])
+        threading.Event().wait(0.02)
+        with lock:
+            active[host] -= 1
+        return make_response(200, b'png')
+
+    fetcher.session.get = get
+    urls = [f'https://{host}/{number}.png' for host in ('a.example.com', 'b.example.com') for number in range(6)]
+    assert all(fetcher.fetch_many(urls).values())
+    assert most_active == {'a.example.com': 2, 'b.example.com': 2}
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for the on-disk DataMatrix bitmap cache
+"""
+
+import os
+import time
+from PIL import Image
+from image_cache import DiskImageCache
+
+
+def bitmap(seed):
+    """A 1-bit bitmap that does not compress to nothing"""
+    img = Image.new('1', (64, 64), 1)
+    for i in range(64):
+        img.putpixel(((i * seed) % 64, (i * 7 + seed) % 64), 0)
+    return img
+
+
+def age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_round_trip_and_counters(tmp_path):
+    cache = DiskImageCache(cache_dir=str(tmp_path))
+    assert cache.get('https://example.com/a.png') is None
+
+    cache.put('https://example.com/a.png', bitmap(3))
+    loaded = cache.get('https://example.com/a.png')
+    assert loaded.mode == '1' and loaded.tobytes() == bitmap(3).tobytes()
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'hit_ratio': 0.5}
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DiskImageCache(cache_dir=str(tmp_path), max_bytes=10 ** 6)
+    for seed in range(4):
+        cache.put(f'key-{seed}', bitmap(seed + 1))
+        age(cache._path(f'key-{seed}'), 100 - seed)
+    total = sum(os.path.getsize(cache._path(f'key-{seed}')) for seed in range(4))
+
+    # Reading key-0 makes it the most recently used; key-1 is now the oldest.
+    # The cap leaves room (at 90%) for all entries but one.
+    assert cache.get('key-0') is not None
+    cache.max_bytes = int((total - os.path.getsize(cache._path('key-1'))) / 0.9) + 1
+    cache.evict()
+
+    assert not os.path.exists(cache._path('key-1'))
+    assert all(os.path.exists(cache._path(key)) for key in ('key-0', 'key-2', 'key-3'))
+    assert cache.approximate_bytes() <= cache.max_bytes * 0.9
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = DiskImageCache(cache_dir=str(tmp_path))
+    cache.put('key', bitmap(5))
+    with open(cache._path('key'), 'r+b') as f:
+        f.truncate(20)
+
+    assert cache.get('key') is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_stale_temp_files_are_evicted(tmp_path):
+    cache = DiskImageCache(cache_dir=str(tmp_path), max_bytes=10 ** 6)
+    cache.put('key', bitmap(5))
+    stale = tmp_path / 'crashed.tmp'
+    stale.write_bytes(b'x' * 1000)
+    age(str(stale), cache.STALE_TEMP_SECONDS + 60)
+    in_progress = tmp_path / 'writing.tmp'
+    in_progress.write_bytes(b'x' * 1000)
+
+    # Left-over temp files count towards the cap; a write in progress does not
+    assert cache._directory_size() == os.path.getsize(cache._path('key')) + 1000
+
+    cache.evict()
+    assert not stale.exists() and in_progress.exists()
+    assert cache.get('key') is not None
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests that the vectorized ingest path matches the per-row parsers
+"""
+
+import pandas as pd
+import pytest
+from label_generator import LabelGenerator
+from label_generator_3x1 import LabelGenerator3x1
+from parse_cache import ParseCache
+
+
+def sample_item_names():
+    names = list(pd.read_csv('new-orders-format.csv')['Item - Name'].dropna().unique())
+    variants = []
+    for name in names:
+        variants += [name.replace(' - ', ', '), name.replace(' - ', '/'), f'<b>{name}</b>', name.upper(), name + ' - 3X-Large']
+    return names + variants + ['', '   ', None, 'Nothing to see here', 'Title - Soft Premium Tee - Black - 2XL']
+
+
+@pytest.mark.parametrize('generator_class', [LabelGenerator, LabelGenerator3x1])
+def test_parse_item_names_matches_parse_item_name(generator_class):
+    names = sample_item_names()
+
+    # Separate caches, so the column-wise parse is checked against the per-row parse, not its memo
+    per_row = generator_class()
+    per_row.parse_cache = ParseCache()
+    expected = [per_row.parse_item_name(name) for name in names]
+
+    generator = generator_class()
+    generator.parse_cache = ParseCache()
+    assert generator.parse_item_names(pd.Series(names, dtype=object)) == expected
+    assert generator.parse_cache.stats()['hits'] == 0
+
+
+def test_format_dates_matches_format_date():
+    generator = LabelGenerator()
+    dates = ['9/26/2025 10:46:54 PM', '10/1/25 1:00 AM', '2025-09-26', '', None,
+             pd.Timestamp('2025-09-26 13:00'), '9/26/2025', '1/2/3/4 PM', ' 9/26/2025 10:46 ']
+    expected = [generator.format_date(date) for date in dates]
+    assert list(generator.format_dates(pd.Series(dates, dtype=object))) == expected
+
+
+@pytest.mark.parametrize('generator_class', [LabelGenerator, LabelGenerator3x1])
+def test_quantities_are_read_as_int_reads_them(generator_class):
+    generator = generator_class()
+    df = pd.read_csv('new-orders-format.csv', dtype={'Item - Qty': object})
+    # Row 1 has no SKU and is skipped
+    df['Item - Qty'] = ['2', 'skipped', 3, None, 4.0, ' 5 ']
+    assert generator.parse_new_format(df)['Quantity'].tolist() == [2, 3, 1, 4, 5]
+
+    # A quantity that is present but not a number is an error, not one label
+    df.loc[2, 'Item - Qty'] = '2x'
+    with pytest.raises(ValueError):
+        generator.parse_new_format(df)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for background label jobs
+"""
+
+import os
+import json
+import time
+import threading
+from job_queue import LabelJobQueue
+from label_generator import LabelGenerator
+
+
+class FailingFetcher:
+    def fetch_many(self, urls, process=None, timings=None):
+        return {url: None for url in urls}
+
+
+def offline_generator():
+    generator = LabelGenerator()
+    generator.fetcher = FailingFetcher()
+    return generator
+
+
+def wait_until_finished(queue, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = queue.status(job_id)
+        if status['state'] in ('done', 'failed'):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f'Job {job_id} did not finish')
+
+
+def test_job_renders_to_its_output_file(tmp_path):
+    queue = LabelJobQueue(jobs_dir=str(tmp_path), max_workers=1)
+    with open('new-orders-format.csv', 'rb') as f:
+        job_id = queue.submit(offline_generator, 'orders.csv', f.read(), '2x1')
+
+    status = wait_until_finished(queue, job_id)
+    assert status['state'] == 'done' and status['error'] is None
+    assert status['pid'] == os.getpid()
+    assert status['labels_rendered'] == status['label_count'] > 0
+
+    output_path = queue.output_path(job_id)
+    assert output_path == os.path.join(str(tmp_path), job_id, 'labels.pdf')
+    with open(output_path, 'rb') as f:
+        assert f.read(5) == b'%PDF-'
+
+
+def test_invalid_file_fails_and_removes_the_output(tmp_path):
+    queue = LabelJobQueue(jobs_dir=str(tmp_path), max_workers=1)
+    job_id = queue.submit(offline_generator, 'orders.csv', b'Name,Count\nTee,1\n', '2x1')
+
+    status = wait_until_finished(queue, job_id)
+    assert status['state'] == 'failed' and 'required columns' in status['error']
+    assert queue.output_path(job_id) is None
+    assert not os.path.exists(os.path.join(str(tmp_path), job_id, 'labels.pdf'))
+
+
+def test_invalid_job_ids(tmp_path):
+    queue = LabelJobQueue(jobs_dir=str(tmp_path))
+    for job_id in ('../../etc', '', None, 'F' * 32, '0' * 31):
+        assert queue.status(job_id) is None
+        assert queue.output_path(job_id) is None
+    assert queue.status('0' * 32) is None  # Well-formed but unknown
+
+
+def test_jobs_of_an_exited_worker_are_failed(tmp_path):
+    queue = LabelJobQueue(jobs_dir=str(tmp_path))
+    job_id = '0' * 32
+    os.makedirs(os.path.join(str(tmp_path), job_id))
+    status_path = os.path.join(str(tmp_path), job_id, 'status.json')
+    with open(status_path, 'w', encoding='utf-8') as f:
+        json.dump({'job_id': job_id, 'pid': 1, 'state': 'running', 'error': None,
+                   'started_at': time.time() - 600, 'finished_at': None}, f)
+
+    assert queue.status(job_id)['state'] == 'running'
+
+    os.utime(status_path, (time.time() - 120, time.time() - 120))
+    status = queue.status(job_id)
+    assert status['state'] == 'failed' and status['error'] == 'worker exited'
+
+
+def test_heartbeat_keeps_slow_jobs_alive(tmp_path):
+    queue = LabelJobQueue(jobs_dir=str(tmp_path), max_workers=1)
+    queue.HEARTBEAT_INTERVAL = 0.05
+    queue.STALE_AFTER = 0.3
+    release = threading.Event()
+
+    def slow_generator():
+        release.wait(5)
+        return offline_generator()
+
+    with open('new-orders-format.csv', 'rb') as f:
+        job_id = queue.submit(slow_generator, 'orders.csv', f.read(), '2x1')
+    time.sleep(0.6)
+    assert queue.status(job_id)['state'] == 'running'
+
+    release.set()
+    assert wait_until_finished(queue, job_id)['state'] == 'done'
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for recording label batches in bundles and re-rendering them offline
+"""
+
+import io
+import pytest
+from PIL import Image
+from reportlab import rl_config
+from werkzeug.datastructures import FileStorage
+from label_generator import LabelGenerator
+from label_generator_3x1 import LabelGenerator3x1
+from image_cache import DiskImageCache
+import label_bundle
+
+
+def datamatrix_png():
+    img = Image.new('L', (24, 24), 255)
+    img.putdata([0 if (i * 7) % 3 == 0 else 255 for i in range(24 * 24)])
+    output = io.BytesIO()
+    img.resize((300, 300), Image.NEAREST).save(output, 'PNG')
+    return output.getvalue()
+
+
+class StubFetcher:
+    """Serves one image for every URL except those containing 'missing', and counts requests"""
+
+    def __init__(self):
+        self.requests = 0
+
+    def fetch(self, url):
+        self.requests += 1
+        if 'missing' in url:
+            raise IOError('not found')
+        return datamatrix_png()
+
+    def fetch_many(self, urls, process=None, timings=None):
+        results = {}
+        for url in urls:
+            try:
+                results[url] = process(self.fetch(url))
+            except IOError:
+                results[url] = None
+        return results
+
+
+def offline_generator(generator_class, tmp_path):
+    generator = generator_class()
+    generator.fetcher = StubFetcher()
+    generator.disk_cache = DiskImageCache(cache_dir=str(tmp_path / generator_class.__name__))
+    return generator
+
+
+def new_format_upload():
+    with open('new-orders-format.csv', 'rb') as f:
+        data = f.read()
+    # One row whose DataMatrix cannot be downloaded
+    data = data.replace(b'https://', b'https://missing.', 1)
+    return FileStorage(stream=io.BytesIO(data), filename='new-orders-format.csv')
+
+
+@pytest.fixture
+def invariant_pdfs():
+    rl_config.invariant = 1
+    yield
+    rl_config.invariant = 0
+
+
+def test_bundle_rerenders_the_same_labels_offline(tmp_path, invariant_pdfs):
+    generator = offline_generator(LabelGenerator, tmp_path)
+    generator.bundle_output = io.BytesIO()
+    original = io.BytesIO()
+    _, label_count = generator.process_file_and_generate_pdf(new_format_upload(), output=original)
+
+    bundle = label_bundle.read_bundle(io.BytesIO(generator.bundle_output.getvalue()))
+    assert bundle.layout == 'enhanced'
+    assert bundle.label_size == '2x1'
+    assert bundle.label_count == label_count
+    assert None in bundle.images.values()
+
+    # Same label size: identical output, with no downloads
+    rerender = offline_generator(LabelGenerator, tmp_path / 'rerender')
+    output = io.BytesIO()
+    _, rendered = rerender.render_bundle(bundle, output=output)
+    assert rendered == label_count
+    assert output.getvalue() == original.getvalue()
+    assert rerender.fetcher.requests == 0
+
+    # The other label size
+    other = offline_generator(LabelGenerator3x1, tmp_path / 'other')
+    output = io.BytesIO()
+    assert other.render_bundle(bundle, output=output)[1] == label_count
+    assert output.getvalue().startswith(b'%PDF')
+    assert other.fetcher.requests == 0
+
+
+def test_basic_labels_are_bundled():
+    labels = [(('Threat Level Midnight', 'XL', 'https://example.com/a.png'), 2),
+              (('Scranton Strangler', float('nan'), float('nan')), 1)]
+    output = io.BytesIO()
+    label_bundle.write_bundle(output, 'basic', labels, {'https://example.com/a.png': Image.new('1', (77, 77), 1)}, '3x1')
+
+    bundle = label_bundle.read_bundle(io.BytesIO(output.getvalue()))
+    assert bundle.label_count == 3
+    assert bundle.labels[0] == labels[0]
+    (product, size, url), quantity = bundle.labels[1]
+    assert (product, quantity) == ('Scranton Strangler', 1)
+    # Missing values stay NaN, so they are drawn as they were
+    assert size != size and url != url
+    assert list(bundle.images) == ['https://example.com/a.png']
+
+
+def test_invalid_bundles_are_rejected():
+    with pytest.raises(ValueError):
+        label_bundle.read_bundle(io.BytesIO(b'labels.pdf'))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Tests for the compiled label layouts
+"""
+
+import pytest
+from PIL import Image
+from raster_renderer import RasterCanvas
+from label_generator import LabelGenerator
+from label_generator_3x1 import LabelGenerator3x1
+from label_layout import LABEL_SIZES, compile_layout
+from pdf_merge import ReportLabPDF
+
+URL = 'http://example.com/datamatrix.png'
+
+
+class RecordingCanvas(RasterCanvas):
+    """Raster canvas that also records font changes and text positions"""
+
+    def __init__(self, pagesize):
+        super().__init__(pagesize)
+        self.calls = []
+
+    def setFont(self, font_name, font_size):
+        self.calls.append(('setFont', font_name, font_size))
+        super().setFont(font_name, font_size)
+
+    def drawString(self, x, y, text):
+        self.calls.append(('drawString', x, y, text))
+        super().drawString(x, y, text)
+
+
+def create_generator(label_size):
+    generator = LabelGenerator3x1() if label_size == '3x1' else LabelGenerator(label_size)
+    generator.image_cache[URL] = Image.new('1', (80, 80), 1)
+    return generator
+
+
+def enhanced_fields(total_items=2):
+    return ('Threat Level Midnight Retro Vintage Unisex Classic T-Shirt', 'Soft Premium Tee', 'XL', URL,
+            'BR-47678', 'BRSHIRT-THREATLEVEL-BK-XL', 'Black Rabbit Shopify', '9/26/25', 3, 1, total_items)
+
+
+def test_layouts_are_compiled_once():
+    assert compile_layout('2x1') is compile_layout('2x1')
+    assert LabelGenerator().layout is LabelGenerator('2x1').layout
+
+
+def test_generators_only_take_sizes_with_their_order_code():
+    with pytest.raises(ValueError):
+        LabelGenerator('3x1')
+    with pytest.raises(ValueError):
+        LabelGenerator3x1('2x1')
+    assert LabelGenerator('4x6').layout.order_code_symbology == 'datamatrix'
+
+
+def test_fonts_are_only_set_when_they_change():
+    generator = create_generator('2x1')
+    c = RecordingCanvas((generator.label_width, generator.label_height))
+    generator.draw_enhanced_label(c, *enhanced_fields())
+
+    fonts = [call[1:] for call in c.calls if call[0] == 'setFont']
+    # Product type and size share one font; the product DataMatrix form's caption sets its own
+    assert fonts == [('Helvetica-Bold', 10), ('Helvetica-Bold', 4), ('Helvetica-Bold', 6),
+                     ('Helvetica-Bold', 4), ('Helvetica-Bold', 8), ('Helvetica-Bold', 10)]
+
+    # Single-item orders have no bin, and no font is set for it
+    c = RecordingCanvas((generator.label_width, generator.label_height))
+    generator.draw_enhanced_label(c, *enhanced_fields(total_items=1))
+    assert [call[1:] for call in c.calls if call[0] == 'setFont'][-1] == ('Helvetica-Bold', 8)
+
+
+def test_2x1_positions():
+    """Compiled positions are the ones the 2" x 1" label has always used"""
+    layout = compile_layout('2x1')
+    assert layout.top_y == 57
+    assert layout.title_ys == [48, 42]
+    assert layout.details_ys == pytest.approx((40.54, 34.54))
+    assert (layout.product_datamatrix_x, layout.product_datamatrix_y) == pytest.approx((111.46, 39.46))
+
+    generator = create_generator('2x1')
+    c = RecordingCanvas((generator.label_width, generator.label_height))
+    generator.draw_enhanced_label(c, *enhanced_fields())
+    texts = {call[3]: call[1:3] for call in c.calls if call[0] == 'drawString'}
+    assert texts['BIN 3'][1] == 19 and texts['1 of 2'][1] == 7
+    assert texts['FRONT'][1] == pytest.approx(33.46)
+
+
+@pytest.mark.parametrize('label_size', LABEL_SIZES)
+def test_text_stays_on_the_label(label_size):
+    generator = create_generator(label_size)
+    width, height = generator.label_width, generator.label_height
+    c = RecordingCanvas((width, height))
+    generator.draw_enhanced_label(c, *enhanced_fields())
+    generator.draw_label(c, 'Threat Level Midnight Retro Vintage Unisex Classic T-Shirt', 'XL', URL)
+
+    for call in c.calls:
+        if call[0] == 'setFont':
+            font = call[1:]
+        elif call[0] == 'drawString':
+            _, x, y, text = call
+            assert 0 <= x and x + generator.text_metrics.string_width(text, *font) <= width, text
+            assert 0 <= y <= height - font[1], text
+
+
+def test_new_sizes_render_at_their_page_size():
+    generator = create_generator('4x6')
+    buffer, label_count = generator.render_enhanced_labels([(enhanced_fields(), 2)])
+    pdf = ReportLabPDF(buffer.getvalue())
+    assert label_count == 2 and len(pdf.page_refs) == 2
+    for page in pdf.page_refs:
+        assert b'/MediaBox [ 0 0 288 432 ]' in pdf.object_dict(page)
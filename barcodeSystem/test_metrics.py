@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for the Prometheus metrics
+"""
+
+import os
+import sys
+import subprocess
+import requests
+from prometheus_client import REGISTRY
+from werkzeug.datastructures import FileStorage
+from label_generator_3x1 import LabelGenerator3x1
+import metrics
+
+WORKER_SCRIPT = """
+from metrics import UPLOADS, LABELS_RENDERED, JOBS
+UPLOADS.labels('sync').inc()
+LABELS_RENDERED.labels('2x1', 'pdf').inc(25)
+JOBS.labels('running').inc()
+"""
+
+
+def test_values_are_added_up_across_worker_processes(tmp_path, monkeypatch):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    for _ in range(2):
+        subprocess.run([sys.executable, '-c', WORKER_SCRIPT], env=env, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+    body, content_type = metrics.exposition()
+    text = body.decode('utf-8')
+    assert content_type.startswith('text/plain')
+    assert 'label_uploads_total{mode="sync"} 2.0' in text
+    assert 'labels_rendered_total{label_format="pdf",label_size="2x1"} 50.0' in text
+    assert 'label_jobs{state="running"} 2.0' in text
+
+
+class FailingFetcher:
+    def fetch_many(self, urls, process=None, timings=None):
+        return {url: None for url in urls}
+
+
+def test_generation_is_recorded_from_its_timings(tmp_path):
+    def sample(name, labels=None):
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    before = {
+        'labels': sample('labels_rendered_total', {'label_size': '3x1', 'label_format': 'zpl'}),
+        'misses': sample('label_cache_lookups_total', {'cache': 'order_barcode', 'result': 'miss'}),
+        'outputs': sample('label_output_bytes_count', {'label_format': 'zpl'}),
+    }
+
+    generator = LabelGenerator3x1()
+    generator.fetcher = FailingFetcher()
+    generator.label_format = 'zpl'
+    output_path = tmp_path / 'labels.zpl'
+    with open('new-orders-format.csv', 'rb') as f, open(output_path, 'wb') as output:
+        _, label_count = generator.process_file_and_generate_pdf(FileStorage(stream=f, filename='orders.csv'), output=output)
+    metrics.record_generation(generator, 'job', 'done', '3x1', 'zpl', str(output_path))
+
+    assert sample('labels_rendered_total', {'label_size': '3x1', 'label_format': 'zpl'}) - before['labels'] == label_count
+    assert sample('label_cache_lookups_total', {'cache': 'order_barcode', 'result': 'miss'}) - before['misses'] == len(generator.barcode_cache)
+    assert sample('label_output_bytes_count', {'label_format': 'zpl'}) - before['outputs'] == 1
+    assert sample('label_cache_entries', {'cache': 'order_barcode'}) == len(generator.barcode_cache)
+
+
+def test_label_sizes_are_a_fixed_set():
+    generator = LabelGenerator3x1()
+    generator.timings.count('labels', 3)
+    before = REGISTRY.get_sample_value('labels_rendered_total', {'label_size': 'other', 'label_format': 'pdf'}) or 0.0
+
+    metrics.record_generation(generator, 'upload', 'done', 'zzz-1', 'pdf')
+
+    assert REGISTRY.get_sample_value('labels_rendered_total', {'label_size': 'zzz-1', 'label_format': 'pdf'}) is None
+    assert REGISTRY.get_sample_value('labels_rendered_total', {'label_size': 'other', 'label_format': 'pdf'}) - before == 3
+
+
+def test_fetch_error_reasons():
+    response = requests.Response()
+    response.status_code = 404
+    assert metrics.fetch_error_reason(requests.HTTPError(response=response)) == '404'
+    assert metrics.fetch_error_reason(requests.ConnectTimeout()) == 'timeout'
+    assert metrics.fetch_error_reason(requests.ConnectionError()) == 'connection'
+    assert metrics.fetch_error_reason(OSError()) == 'other'
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for parallel rendering: pool sizing, shutdown and shard generators
+"""
+
+import os
+from PIL import Image
+from label_generator import LabelGenerator
+from parallel_render import ParallelRenderer, _render_shard
+
+URL = 'http://example.com/datamatrix.png'
+
+
+def enhanced_labels(quantities):
+    return [(('Threat Level Midnight Retro Tee', 'Soft Premium Tee', 'XL', URL, f'BR-{number}',
+              'SKU', 'Store', '9/26/25', None, 1, 1), quantity)
+            for number, quantity in enumerate(quantities)]
+
+
+def test_cpus_are_divided_between_server_workers(monkeypatch):
+    monkeypatch.delenv('LABEL_RENDER_PROCESSES', raising=False)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 8)
+
+    monkeypatch.delenv('LABEL_SERVER_WORKERS', raising=False)
+    assert ParallelRenderer().processes == 8
+
+    monkeypatch.setenv('LABEL_SERVER_WORKERS', '2')
+    assert ParallelRenderer().processes == 4
+
+    monkeypatch.setenv('LABEL_SERVER_WORKERS', '16')
+    assert ParallelRenderer().processes == 1
+    assert not ParallelRenderer().should_render_in_parallel(10 ** 6)
+
+    monkeypatch.setenv('LABEL_RENDER_PROCESSES', '3')
+    assert ParallelRenderer().processes == 3
+
+
+def test_pool_is_shut_down_and_restarted_on_demand():
+    renderer = ParallelRenderer(processes=2)
+    renderer.shutdown()  # No pool yet
+
+    pool = renderer._get_pool()
+    assert pool.submit(sum, [1, 2]).result(timeout=60) == 3
+    renderer.shutdown()
+    assert renderer._pool is None
+    assert renderer._get_pool() is not pool
+    renderer.shutdown()
+
+
+class RecordingGenerator(LabelGenerator):
+    """Label generator that remembers every instance rendering a shard"""
+    instances = []
+
+    def render_enhanced_labels(self, labels, output=None):
+        self.instances.append(self)
+        return super().render_enhanced_labels(labels, output)
+
+
+def test_shards_start_from_a_fresh_generator():
+    images = {URL: Image.new('1', (80, 80), 1)}
+    _, first_count = _render_shard(RecordingGenerator, '2x1', None, images, enhanced_labels([2, 1]))
+    # The second batch's download failed: it must not draw the first batch's image
+    _, second_count = _render_shard(RecordingGenerator, '2x1', None, {URL: None}, enhanced_labels([1]))
+
+    # Nothing from the first batch (images, timings) is kept for the next one
+    first, second = RecordingGenerator.instances
+    assert (first_count, second_count) == (3, 1) and first is not second
+    assert second.image_cache == {URL: None}
+    assert second.timings.counts.get('labels', 0) <= 1
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Tests for the item name parse memo
+"""
+
+import pandas as pd
+from parse_cache import ParseCache
+from config_service import configuration_version
+from label_generator import LabelGenerator
+
+
+def test_lru_eviction_and_stats():
+    cache = ParseCache(max_entries=2)
+    cache.put('P', 'v1', 'a', {'size': 'S'})
+    cache.put('P', 'v1', 'b', None)
+    assert cache.get('P', 'v1', 'a') == (True, {'size': 'S'})
+    cache.put('P', 'v1', 'c', {'size': 'L'})      # Evicts 'b', the least recently used
+
+    assert cache.get('P', 'v1', 'b') == (False, None)
+    assert cache.get('P', 'v1', 'c') == (True, {'size': 'L'})
+    assert cache.get('Other', 'v1', 'c') == (False, None)
+    assert cache.stats() == {'entries': 2, 'hits': 2, 'misses': 2, 'hit_ratio': 0.5}
+
+
+def test_new_configuration_version_drops_old_entries():
+    cache = ParseCache()
+    cache.put('P', 'v1', 'a', None)
+    assert cache.get_many('P', 'v2', ['a']) == {}
+    assert cache.stats()['entries'] == 0
+
+
+def test_generators_share_results_until_configuration_changes():
+    cache = ParseCache()
+    first, second = LabelGenerator(), LabelGenerator()
+    first.parse_cache = second.parse_cache = cache
+
+    names = pd.Series(['SOFT PREMIUM TEE - Black - L - Threat Level Midnight'] * 3 + ['Unknown item'])
+    parsed = first.parse_item_names(names)
+    assert cache.stats()['misses'] == 2
+
+    assert second.parse_item_names(names) == parsed
+    assert second.parse_item_name(names[0]) == parsed[0]
+    assert cache.stats()['hits'] == 3
+
+    second.product_types = second.product_types[1:]
+    second.config_version = configuration_version(second.product_types, second.shortening_rules)
+    second.parse_item_names(names)
+    assert cache.stats()['misses'] == 4
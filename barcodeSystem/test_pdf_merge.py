@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for ReportLab PDF concatenation and shard splitting
+"""
+
+import io
+from reportlab.pdfgen import canvas
+from pdf_merge import ReportLabPDF, concatenate_pdfs
+from parallel_render import ParallelRenderer
+
+
+def make_pdf(texts):
+    """One page per text, with a shared form on every page like the label generators use"""
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=(144, 72))
+    c.beginForm('caption')
+    c.drawString(5, 60, 'FRONT')
+    c.endForm()
+    for text in texts:
+        c.doForm('caption')
+        c.drawString(5, 5, text)
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def test_pages_are_concatenated_in_order():
+    parts = [make_pdf(['1', '2']), make_pdf(['3']), make_pdf(['4', '5', '6'])]
+    output = io.BytesIO()
+    assert concatenate_pdfs(parts, output) == 6
+
+    merged = ReportLabPDF(output.getvalue())
+    expected = [content for part in parts for content in ReportLabPDF(part).page_contents()]
+    assert merged.page_contents() == expected
+
+    # Every page points at the single page tree root
+    for page in merged.page_refs:
+        assert b'/Parent %d 0 R' % merged.pages_root in merged.object_dict(page)
+
+
+def test_shards_are_contiguous_and_keep_rows_whole():
+    renderer = ParallelRenderer(processes=3, threshold=0)
+    labels = [(('label', i), quantity) for i, quantity in enumerate([1, 4, 1, 1, 2, 1, 1])]
+    shards = renderer.split_into_shards(labels)
+    assert [label for shard in shards for label in shard] == labels
+    assert [sum(quantity for _, quantity in shard) for shard in shards] == [5, 4, 2]
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Tests for the compiled product type matcher
+"""
+
+from product_matcher import ProductTypeMatcher
+
+PRODUCT_TYPES = [
+    'Soft Premium Tee - Black',
+    'Luxury Heavy Tee - Black',
+    'Luxury Heavy Tee - Vintage Black',
+    'Trucker Hat',
+]
+
+
+def test_longest_full_match_wins_with_its_position():
+    matcher = ProductTypeMatcher(PRODUCT_TYPES)
+    text = 'Threat Level Midnight - LUXURY HEAVY TEE  -  Vintage Black - XL'
+    match = matcher.search(text)
+    assert match.group(0) == 'LUXURY HEAVY TEE  -  Vintage Black'
+    assert match.span() == (24, 58)
+
+
+def test_base_types_are_a_fallback():
+    matcher = ProductTypeMatcher(PRODUCT_TYPES)
+    assert matcher.search('Soft Premium Tee - Red - M - Title').group(0) == 'Soft Premium Tee'
+    assert matcher.search('Soft Premium Tee-Black, M').group(0) == 'Soft Premium Tee-Black'
+    assert matcher.search('Nothing to see here') is None
+
+
+def test_first_occurrence_and_config_order_break_ties():
+    matcher = ProductTypeMatcher(['Cap', 'Hat', 'Trucker Hat'])
+    assert matcher.search('Hat Cap Trucker Hat').span() == (8, 19)
+    assert matcher.search('Hat Cap').group(0) == 'Cap'
+
+
+def test_types_are_literal_text():
+    matcher = ProductTypeMatcher(['T-Shirt', 'Tee (Gildan)'])
+    assert matcher.search('Classic T - Shirt') is None
+    assert matcher.search('Classic t-shirt').group(0) == 't-shirt'
+    assert matcher.search('Tee Gildan') is None
+    assert matcher.search('Tee  (GILDAN) - L').group(0) == 'Tee  (GILDAN)'
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for request profiling
+"""
+
+import pstats
+from profiling import RequestProfiler, ProfileStore, requested_mode
+
+
+def busy_loop():
+    total = 0
+    for i in range(300000):
+        total += i * i
+    return total
+
+
+def profile_busy_loop(mode):
+    with RequestProfiler(mode, interval=0.001) as profiler:
+        for _ in range(5):
+            busy_loop()
+    return profiler
+
+
+def test_profiling_is_opt_in(monkeypatch):
+    monkeypatch.delenv('LABEL_PROFILING', raising=False)
+    assert requested_mode('1') is None
+
+    monkeypatch.setenv('LABEL_PROFILING', '1')
+    assert requested_mode(None, None) is None
+    assert requested_mode('true', None) == 'cprofile'
+    assert requested_mode(None, 'sampling') == 'sampling'
+
+
+def test_profiles_have_pstats_and_collapsed_stacks(tmp_path):
+    store = ProfileStore(profiles_dir=str(tmp_path), keep=10)
+    for mode in ('cprofile', 'sampling'):
+        profiler = profile_busy_loop(mode)
+        profile_id = store.save(profiler, endpoint='/upload')
+
+        stats = pstats.Stats(store.path(profile_id, 'pstats'))
+        busy = [value for key, value in stats.stats.items() if key[2].endswith('busy_loop')]
+        assert busy and busy[0][3] > 0  # Cumulative time
+
+        with open(store.path(profile_id, 'collapsed'), encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        assert any(line.rsplit(' ', 1)[0].endswith('test_profiling.py:profile_busy_loop;test_profiling.py:busy_loop')
+                   for line in lines)
+        assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+
+    profiles = store.list()
+    assert [profile['mode'] for profile in profiles] == ['sampling', 'cprofile']
+    assert profiles[0]['endpoint'] == '/upload' and profiles[0]['samples'] > 0
+
+
+def test_only_the_newest_profiles_are_kept(tmp_path):
+    store = ProfileStore(profiles_dir=str(tmp_path), keep=2)
+    profile_ids = [store.save(profile_busy_loop('sampling')) for _ in range(3)]
+
+    assert [profile['profile_id'] for profile in store.list()] == profile_ids[:0:-1]
+    assert store.path(profile_ids[0], 'pstats') is None
+    assert store.path('../' + profile_ids[1][3:], 'pstats') is None
+    assert store.path(profile_ids[1], 'html') is None
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for the 1-bit raster label renderer
+"""
+
+import io
+import zipfile
+import numpy as np
+from PIL import Image
+from code128 import code128_modules, draw_code128
+from raster_renderer import RasterCanvas, RasterLabelWriter
+
+
+def test_barcode_bars_are_dot_exact():
+    """Bars drawn by the vector barcode drawer land on whole dots"""
+    r = RasterCanvas((216, 72))
+    modules = code128_modules('BR-47678')
+    draw_code128(r, modules, 5, 20, 158.4, 24.8)
+    bitmap = r.showPage()
+
+    module_dots = 447 // len(modules)
+    row = bitmap[100]
+    assert np.array_equal(row[14:14 + len(modules) * module_dots],
+                          np.repeat([m == '1' for m in modules], module_dots))
+    assert not row[:14].any() and not row[14 + len(modules) * module_dots:].any()
+
+
+def test_text_follows_font_metrics():
+    """Text starts at the baseline origin and spans its measured width"""
+    r = RasterCanvas((144, 72))
+    r.setFont('Helvetica-Bold', 10)
+    r.drawString(10, 30, 'HH')
+    bitmap = r.showPage()
+
+    rows, cols = np.nonzero(bitmap)
+    width_dots = r.stringWidth('HH', 'Helvetica-Bold', 10) * 203 / 72
+    assert abs(cols.min() - 28) <= 3                          # Left side bearing of 'H'
+    assert abs((cols.max() - cols.min()) - width_dots) <= 6
+    assert rows.max() == r.dots(72 - 30) - 1                  # 'H' sits on the baseline
+
+
+def test_forms_are_reused_and_pages_reset():
+    r = RasterCanvas((144, 72))
+    r.beginForm('front')
+    r.setFont('Helvetica-Bold', 6)
+    r.drawString(100, 20, 'FRONT')
+    r.endForm()
+    assert not r.page.any()
+
+    r.doForm('front')
+    first = r.showPage()
+    r.doForm('front')
+    second = r.showPage()
+    assert first.any() and np.array_equal(first, second)
+    assert not r.page.any()
+
+
+def test_writers_repeat_quantities():
+    bitmap = np.zeros((3, 10), dtype=bool)
+    bitmap[1, 2] = True
+
+    pbm = io.BytesIO()
+    writer = RasterLabelWriter(pbm, 'pbm')
+    writer.write(bitmap, quantity=2)
+    writer.close()
+    assert pbm.getvalue() == (b'P4\n10 3\n' + bytes([0, 0, 0b00100000, 0, 0, 0])) * 2
+
+    archive = io.BytesIO()
+    writer = RasterLabelWriter(archive, 'zip')
+    writer.write(bitmap, quantity=3)
+    writer.close()
+    with zipfile.ZipFile(archive) as z:
+        assert z.namelist() == ['label_00001.png', 'label_00002.png', 'label_00003.png']
+        img = Image.open(io.BytesIO(z.read('label_00002.png')))
+        assert img.mode == '1' and img.size == (10, 3)
+        assert np.array_equal(~np.asarray(img), bitmap)
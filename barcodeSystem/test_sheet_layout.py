@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for multi-up sheet output
+"""
+
+import pytest
+from PIL import Image
+from reportlab.lib.pagesizes import letter, inch
+from label_generator import LabelGenerator
+from parallel_render import ParallelRenderer
+from pdf_merge import ReportLabPDF
+from sheet_layout import SheetLayout, sheet_from_form
+
+URL = 'http://example.com/datamatrix.png'
+
+
+def enhanced_labels(quantities):
+    return [(('Threat Level Midnight Retro Tee', 'Soft Premium Tee', 'XL', URL, f'BR-{number}',
+              'SKU', 'Store', '9/26/25', None, 1, 1), quantity)
+            for number, quantity in enumerate(quantities)]
+
+
+def test_grid_fits_the_sheet_in_print_order():
+    sheet = SheetLayout((2 * inch, 1 * inch), 'letter')
+    # 0.25" margins: 4 columns of 2" and 10 rows of 1" fit on 8.5" x 11"
+    assert (sheet.rows, sheet.columns, sheet.labels_per_page) == (10, 4, 40)
+
+    # Rows are filled left to right from the top left corner, and the grid is centered
+    assert sheet.slots[0] == (18, 792 - 36 - 72)
+    assert sheet.slots[1] == (18 + 144, 792 - 36 - 72)
+    assert sheet.slots[4] == (18, 792 - 36 - 144)
+
+    gutters = SheetLayout((2 * inch, 1 * inch), 'a4', rows=3, columns=2, row_gutter=9, column_gutter=18)
+    assert gutters.slots[1][0] - gutters.slots[0][0] == 144 + 18
+    assert gutters.slots[0][1] - gutters.slots[2][1] == 72 + 9
+
+
+def test_grid_that_does_not_fit_is_rejected():
+    with pytest.raises(ValueError):
+        SheetLayout((4 * inch, 6 * inch), 'letter', columns=3)
+    with pytest.raises(ValueError):
+        SheetLayout((2 * inch, 1 * inch), '9999x11')
+
+
+def test_sheet_from_form():
+    assert sheet_from_form({}, (144, 72)) is None
+
+    sheet = sheet_from_form({'sheet': '8.5x11', 'sheet_rows': '5', 'sheet_columns': '3',
+                             'sheet_column_gutter': '0.125'}, (144, 72))
+    assert sheet.sheet_size == letter and (sheet.rows, sheet.columns) == (5, 3)
+    assert sheet.slots[1][0] - sheet.slots[0][0] == 144 + 9
+
+    for fields in ({'sheet': 'tabloid'}, {'sheet': 'letter', 'sheet_rows': 'two'},
+                   {'sheet': 'letter', 'sheet_columns': '0'}, {'sheet': 'letter', 'sheet_row_gutter': 'nan'}):
+        with pytest.raises(ValueError):
+            sheet_from_form(fields, (144, 72))
+
+
+def test_labels_fill_sheets_in_order():
+    generator = LabelGenerator()
+    generator.image_cache[URL] = Image.new('1', (80, 80), 1)
+    generator.sheet = SheetLayout((generator.label_width, generator.label_height), 'letter', rows=3, columns=2)
+
+    buffer, label_count = generator.render_enhanced_labels(enhanced_labels([1, 4, 1, 1]))
+    pdf = ReportLabPDF(buffer.getvalue())
+
+    # 7 labels on 6-up sheets: one full sheet and one with a single label
+    assert label_count == 7 and len(pdf.page_refs) == 2
+    for page in pdf.page_refs:
+        assert b'/MediaBox [ 0 0 612 792 ]' in pdf.object_dict(page)
+
+
+def test_shards_hold_whole_sheets():
+    renderer = ParallelRenderer(processes=3)
+    labels = [(('a',), 5), (('b',), 9), (('c',), 1), (('d',), 7)]
+
+    shards = renderer.split_into_shards(labels, labels_per_page=4)
+
+    # 22 labels over 3 processes: 8 per shard, rounded up to whole 4-label sheets
+    assert [sum(quantity for _, quantity in shard) for shard in shards] == [8, 8, 6]
+    assert shards[0] == [(('a',), 5), (('b',), 3)]
+    assert shards[1] == [(('b',), 6), (('c',), 1), (('d',), 1)]
+
+    # Every copy keeps its place in the print order
+    expand = lambda entries: [fields for fields, quantity in entries for _ in range(quantity)]
+    assert expand(entry for shard in shards for entry in shard) == expand(labels)
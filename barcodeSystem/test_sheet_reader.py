@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for header-first, column-pruned sheet ingest
+"""
+
+import io
+import datetime
+import pandas as pd
+from openpyxl import Workbook
+from sheet_reader import open_sheet
+
+WANTED = ['Order - Number', 'Item - Qty', 'Date - Ship By Date']
+
+
+class Upload(io.BytesIO):
+    """In-memory upload with a filename, like a werkzeug FileStorage"""
+
+    def __init__(self, data, filename):
+        super().__init__(data)
+        self.filename = filename
+
+
+def sample_workbook():
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Order - Number', 'Item - Options', 'Item - Qty', None, 'Date - Ship By Date'])
+    ws.append(['BR-1', 'hc_6109100010:1;' * 50, 2, 'x', datetime.datetime(2025, 9, 26, 22, 46)])
+    ws.append([47679, 'hc_6109100010:1', 2.0, None, '9/26/2025 10:46:54 PM'])
+    ws.append([None, None, None, None, None])                  # Blank row inside the data is kept
+    ws.append([None, 'only a skipped column', None, None, None])
+    ws.append(['BR-3', None, 'x', None, '#N/A'])
+    ws.append([None, None, None, None, None])                  # Blank rows at the end are dropped
+    data = io.BytesIO()
+    wb.save(data)
+    return data.getvalue()
+
+
+def test_xlsx_matches_full_read_of_the_same_columns():
+    data = sample_workbook()
+    expected = pd.read_excel(io.BytesIO(data))[WANTED]
+
+    with open_sheet(Upload(data, 'orders.xlsx')) as sheet:
+        assert sheet.columns == ['Order - Number', 'Item - Options', 'Item - Qty', 'Date - Ship By Date']
+        df = sheet.read(WANTED + ['Market - Store Name'])
+
+    assert df.equals(expected)
+    assert list(df.dtypes) == list(expected.dtypes)
+    assert len(df) == 5
+
+
+def test_csv_reads_only_wanted_columns():
+    data = b'Order - Number,Item - Options,Item - Qty\nBR-1,"hc_1:1;hc_2:1",2\nBR-2,,3\n'
+    with open_sheet(Upload(data, 'orders.CSV')) as sheet:
+        assert sheet.columns == ['Order - Number', 'Item - Options', 'Item - Qty']
+        df = sheet.read(WANTED)
+    assert df.equals(pd.read_csv(io.BytesIO(data))[['Order - Number', 'Item - Qty']])
+
+
+def test_csv_explicit_types_keep_order_numbers_as_text():
+    data = b'Order - Number,Item - Options,Item - Qty\n0012,"a\nb",2\n,,3\nBR-2,x,\n'
+    with open_sheet(Upload(data, 'orders.csv')) as sheet:
+        df = sheet.read(WANTED, {'Order - Number': 'string', 'Item - Qty': 'integer'})
+        assert sheet.engine == 'pyarrow'
+    assert df['Order - Number'].tolist()[0] == '0012'
+    assert pd.isna(df['Order - Number'][1])
+    assert df['Item - Qty'].tolist()[:2] == [2.0, 3.0] and pd.isna(df['Item - Qty'][2])
+
+    # A quantity that is not an integer falls back to pandas' inference
+    data = b'Order - Number,Item - Qty\nBR-1,x\n'
+    with open_sheet(Upload(data, 'orders.csv')) as sheet:
+        df = sheet.read(WANTED, {'Order - Number': 'string', 'Item - Qty': 'integer'})
+        assert sheet.engine == 'pandas'
+    assert df['Item - Qty'].tolist() == ['x']
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Tests for memoized text measurement, truncation and wrapping
+"""
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from text_metrics import TextMetrics
+
+FONT = 'Helvetica-Bold'
+
+
+def truncate_one_character_at_a_time(text, max_width, font_size, min_length=0):
+    """The layout code's original truncation loop"""
+    while stringWidth(text, FONT, font_size) > max_width and len(text) > min_length:
+        text = text[:-1]
+    return text
+
+
+def test_truncate_matches_dropping_one_character_at_a_time():
+    metrics = TextMetrics()
+    text = 'Order: BR-47911 | SKU: BRSHIRT-VINTAGE-BLACK-XL-THREAT-LEVEL-MIDNIGHT'
+    for max_width in (0, 10, 55.5, stringWidth(text[:30], FONT, 4), 1000):
+        for min_length in (0, 3):
+            prefix, width = metrics.truncate(text, max_width, FONT, 4, min_length=min_length)
+            assert prefix == truncate_one_character_at_a_time(text, max_width, 4, min_length)
+            assert width == stringWidth(prefix, FONT, 4)
+
+    # Short text is never cut below the minimum
+    assert metrics.truncate('Tee', 1, FONT, 10, min_length=3)[0] == 'Tee'
+
+
+def test_wrap_text_lines_are_cached():
+    metrics = TextMetrics()
+    title = 'Threat Level Midnight  Retro Sunset Racing Club Supercalifragilisticexpialidocious'
+    lines = metrics.wrap_text(title, 60, FONT, 7)
+    assert lines == ('Threat Level', 'Midnight Retro')
+    assert metrics.wrap_text('Supercalifragilisticexpialidocious', 60, FONT, 7) == ('Supercalifragilistic...',)
+    assert metrics.wrap_text('', 60, FONT, 7) == ()
+
+    assert metrics.wrap_text(title, 60, FONT, 7) is lines
+    assert metrics.stats()['wrapped_lines']['hits'] == 1
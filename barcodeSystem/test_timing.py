@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Tests for per-stage timings
+"""
+
+import json
+import time
+from timing import StageTimings, job_log_line
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_nested_spans_are_not_counted_twice(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, 'perf_counter', clock)
+    timings = StageTimings()
+
+    with timings.span('render'):
+        clock.now += 2
+        with timings.span('save'):
+            clock.now += 3
+    with timings.span('save'):
+        clock.now += 1
+
+    assert timings.stages == {'save': 4, 'render': 2}
+    assert list(timings.stages) == ['save', 'render']
+    assert timings.elapsed() == 6
+
+
+def test_server_timing_header_lists_stages_and_total():
+    timings = StageTimings()
+    timings.add('read', 0.0123)
+    timings.add('fetch', 1.5)
+    header = timings.server_timing()
+    assert header.startswith('read;dur=12.3, fetch;dur=1500.0, total;dur=')
+
+
+def test_only_the_slowest_urls_over_the_threshold_are_kept():
+    timings = StageTimings(slow_url_seconds=0.5, max_slow_urls=2)
+    for number, seconds in enumerate([0.1, 0.7, 2.0, 0.6, 1.1]):
+        timings.record_url(f'https://cdn.example.com/{number}.png', seconds, 'timeout' if number == 2 else None)
+
+    assert timings.slow_urls == [
+        {'url': 'https://cdn.example.com/2.png', 'ms': 2000.0, 'error': 'timeout'},
+        {'url': 'https://cdn.example.com/4.png', 'ms': 1100.0, 'error': None},
+    ]
+
+
+def test_job_log_line_is_one_json_record():
+    timings = StageTimings()
+    timings.count('rows', 10)
+    timings.count('parse_cache_hits', 3)
+    timings.count('parse_cache_misses', 1)
+    timings.count('datamatrix_disk_hits', 0)
+
+    line = job_log_line(timings, event='label_job', job_id='abc')
+    assert '\n' not in line
+    record = json.loads(line)
+    assert record['event'] == 'label_job' and record['job_id'] == 'abc'
+    assert record['counts']['rows'] == 10
+    assert record['hit_ratios'] == {'parse_cache': 0.75}
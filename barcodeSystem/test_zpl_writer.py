@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests for the ZPL II canvas
+"""
+
+import io
+import re
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+from zpl_writer import ZPLCanvas
+
+
+def test_text_is_placed_at_baseline_in_dots():
+    output = io.BytesIO()
+    z = ZPLCanvas(output, (144, 72))
+    z.setFont('Helvetica-Bold', 10)
+    z.drawString(5, 57, 'Order: A^B~C')
+    z.showPage(quantity=3)
+
+    zpl = output.getvalue().decode('utf-8')
+    assert zpl.startswith('^XA^CI28^PW406^LL203^LH0,0')
+    assert '^FT14,42^A0N,28,28^FH\\^FDOrder: A\\5EB\\7EC^FS' in zpl
+    assert zpl.endswith('^PQ3^XZ\n')
+
+
+def test_graphics_are_downloaded_once_and_recalled():
+    # Checkerboard with a width that is not a multiple of 8, so row padding matters
+    img = Image.new('1', (11, 11), 1)
+    for x in range(11):
+        for y in range(11):
+            if (x + y) % 2 == 0:
+                img.putpixel((x, y), 0)
+
+    output = io.BytesIO()
+    z = ZPLCanvas(output, (144, 72), dpi=72)
+    for _ in range(2):
+        z.drawImage(ImageReader(img), 10, 20, 11, 11)
+        z.showPage()
+    z.save()
+
+    zpl = output.getvalue().decode('utf-8')
+    graphics = re.findall(r'~DGR:(\w+)\.GRF,(\d+),(\d+),([0-9A-F]+)', zpl)
+    assert len(graphics) == 1
+    assert zpl.count('^FO10,41^XGR:DM000001.GRF,1,1^FS') == 2
+    assert zpl.endswith('^XA^IDR:DM000001.GRF^XZ\n')
+
+    # Set bits are black pixels, and padding bits stay clear
+    _, total, per_row, data = graphics[0]
+    assert (int(total), int(per_row)) == (22, 2)
+    rows = bytes.fromhex(data)
+    for y in range(11):
+        bits = int.from_bytes(rows[y * 2:y * 2 + 2], 'big')
+        for x in range(11):
+            assert bool(bits & (1 << (15 - x))) == ((x + y) % 2 == 0)
+        assert bits & 0b11111 == 0
@@ -0,0 +1,134 @@
+import os
+import bisect
+from functools import lru_cache
+from itertools import accumulate
+from reportlab.pdfbase import pdfmetrics
+
+# Comparisons this close to the limit are re-checked with an exact measurement,
+# since summed character widths can differ from a whole-string width in the last bits
+WIDTH_TOLERANCE = 1e-6
+
+
+class TextMetrics:
+    """
+    Memoized text measurement for label layout.
+
+    Widths are computed the way every label canvas measures them
+    (pdfmetrics.stringWidth) and cached per (text, font, size). For
+    truncation, the widths of every prefix of a string are computed once
+    and the longest prefix that fits is found by binary search, instead
+    of dropping one character at a time and measuring again. Wrapped
+    title lines are cached per (title, width, font, size), since the same
+    titles repeat across a batch. Results are identical to measuring
+    each candidate string directly.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or int(os.environ.get('TEXT_METRICS_CACHE_SIZE', 20000))
+        self._string_width = lru_cache(maxsize=self.max_entries)(pdfmetrics.stringWidth)
+        self._prefix_widths = lru_cache(maxsize=self.max_entries)(self._measure_prefixes)
+        self._wrapped_lines = lru_cache(maxsize=self.max_entries)(self._wrap)
+
+    def string_width(self, text, font_name, font_size):
+        """Width of text in points"""
+        return self._string_width(text, font_name, font_size)
+
+    def prefix_widths(self, text, font_name, font_size):
+        """Tuple of the widths of text[:0], text[:1], ... text[:len(text)]"""
+        return self._prefix_widths(text, font_name, font_size)
+
+    def _measure_prefixes(self, text, font_name, font_size):
+        return (0.0,) + tuple(accumulate(self._string_width(char, font_name, font_size) for char in text))
+
+    def _fits(self, text, prefixes, start, end, max_width, font_name, font_size):
+        """Whether text[start:end] fits in max_width"""
+        width = prefixes[end] - prefixes[start]
+        if abs(width - max_width) <= WIDTH_TOLERANCE:
+            width = self._string_width(text[start:end], font_name, font_size)
+        return width <= max_width
+
+    def truncate(self, text, max_width, font_name, font_size, min_length=0):
+        """
+        Longest prefix of text that fits in max_width
+
+        Text is never cut below min_length characters, even if that does not fit.
+
+        Returns:
+            (prefix, width of prefix)
+        """
+        if len(text) > min_length:
+            prefixes = self._prefix_widths(text, font_name, font_size)
+            if not self._fits(text, prefixes, 0, len(text), max_width, font_name, font_size):
+                # Widths only grow with length, so the first prefix that does not fit bounds the answer
+                end = bisect.bisect_right(prefixes, max_width + WIDTH_TOLERANCE, lo=min_length)
+                end = max(min(end - 1, len(text)), min_length)
+                while end < len(text) and self._fits(text, prefixes, 0, end + 1, max_width, font_name, font_size):
+                    end += 1
+                while end > min_length and not self._fits(text, prefixes, 0, end, max_width, font_name, font_size):
+                    end -= 1
+                text = text[:end]
+        return text, self._string_width(text, font_name, font_size)
+
+    def wrap_text(self, text, max_width, font_name, font_size, max_lines=2):
+        """
+        Wrap text at spaces to lines of at most max_width (a tuple of at most max_lines lines)
+
+        A word too wide for a line of its own gets a line to itself, cut to 20 characters plus '...'.
+        """
+        return self._wrapped_lines(text, max_width, font_name, font_size, max_lines)
+
+    def _wrap(self, text, max_width, font_name, font_size, max_lines):
+        words = text.split()
+        line_text = ' '.join(words)
+        prefixes = self._prefix_widths(line_text, font_name, font_size)
+
+        # Start and end of each word in line_text
+        starts = []
+        ends = []
+        position = 0
+        for word in words:
+            starts.append(position)
+            position += len(word)
+            ends.append(position)
+            position += 1
+
+        lines = []
+        first = None  # Index of the first word on the current line
+        for index, word in enumerate(words):
+            if len(lines) >= max_lines:
+                break
+            start = starts[index if first is None else first]
+            if self._fits(line_text, prefixes, start, ends[index], max_width, font_name, font_size):
+                if first is None:
+                    first = index
+            elif first is not None:
+                lines.append(line_text[starts[first]:ends[index - 1]])
+                first = index
+            else:
+                # Word is too long, break it
+                lines.append(word[:20] + '...' if len(word) > 20 else word)
+
+        if first is not None:
+            lines.append(line_text[starts[first]:])
+
+        return tuple(lines[:max_lines])
+
+    def clear(self):
+        self._string_width.cache_clear()
+        self._prefix_widths.cache_clear()
+        self._wrapped_lines.cache_clear()
+
+    def stats(self):
+        """Cache sizes and hit counts for this process"""
+        return {
+            name: {'entries': info.currsize, 'hits': info.hits, 'misses': info.misses}
+            for name, info in (
+                ('widths', self._string_width.cache_info()),
+                ('prefixes', self._prefix_widths.cache_info()),
+                ('wrapped_lines', self._wrapped_lines.cache_info()),
+            )
+        }
+
+
+# Process-wide measurements shared by every generator instance
+shared_text_metrics = TextMetrics()
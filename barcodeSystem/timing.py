@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+
+class StageTimings:
+    """
+    Wall-clock time per pipeline stage for one upload or job.
+
+    Stages are timed with nested spans (read, parse, fetch, render, save,
+    ...). Each stage records its own time only: a span nested inside
+    another is subtracted from the outer one, so the stages add up to the
+    time spent in the pipeline. Counters record row and label counts and
+    cache hits, and downloads slower than a threshold are kept with their
+    URLs so slow CDN objects can be found in the logs.
+    """
+
+    def __init__(self, slow_url_seconds=None, max_slow_urls=10):
+        # Downloads at least this slow are reported individually
+        self.slow_url_seconds = slow_url_seconds if slow_url_seconds is not None else float(
+            os.environ.get('LABEL_SLOW_URL_SECONDS', 1.0)
+        )
+        self.max_slow_urls = max_slow_urls
+
+        self.started = time.perf_counter()
+        self.stages = {}     # Stage name -> seconds, in the order the stages first ran
+        self.counts = {}     # Counter name -> value
+        self.slow_urls = []  # Slowest downloads over the threshold: {'url', 'ms', 'error'}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def span(self, name):
+        """Time a block as stage name, excluding the time of spans nested inside it"""
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(0.0)  # Time spent in nested spans
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.add(name, elapsed - nested)
+
+    def add(self, name, seconds):
+        """Add time to a stage"""
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, value=1):
+        """Add to a counter (rows, labels, cache hits and misses, ...)"""
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def record_url(self, url, seconds, error=None):
+        """Record one download; only the slowest over the threshold are kept"""
+        if seconds < self.slow_url_seconds:
+            return
+        with self._lock:
+            self.slow_urls.append({'url': url, 'ms': round(seconds * 1000, 1), 'error': error})
+            self.slow_urls.sort(key=lambda entry: entry['ms'], reverse=True)
+            del self.slow_urls[self.max_slow_urls:]
+
+    def elapsed(self):
+        """Seconds since the timings were started"""
+        return time.perf_counter() - self.started
+
+    def hit_ratios(self):
+        """Hit ratio of every '<name>_hits' counter that has a '<name>_misses' counter"""
+        ratios = {}
+        for name, hits in self.counts.items():
+            if name.endswith('_hits') and f'{name[:-5]}_misses' in self.counts:
+                lookups = hits + self.counts[f'{name[:-5]}_misses']
+                ratios[name[:-5]] = round(hits / lookups, 3) if lookups else 0.0
+        return ratios
+
+    def server_timing(self):
+        """Server-Timing header value with each stage and the total, in milliseconds"""
+        metrics = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.stages.items()]
+        metrics.append(f'total;dur={self.elapsed() * 1000:.1f}')
+        return ', '.join(metrics)
+
+    def summary(self):
+        """Stage durations (ms), counters, cache hit ratios and slow downloads"""
+        with self._lock:
+            return {
+                'total_ms': round(self.elapsed() * 1000, 1),
+                'stages_ms': {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()},
+                'counts': dict(self.counts),
+                'hit_ratios': self.hit_ratios(),
+                'slow_urls': list(self.slow_urls),
+            }
+
+
+def job_log_line(timings, **fields):
+    """One JSON log line describing a finished upload or job: the given fields plus its timings"""
+    record = dict(fields)
+    record.update(timings.summary())
+    return json.dumps(record, default=str)
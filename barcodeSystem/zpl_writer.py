@@ -0,0 +1,146 @@
+import hashlib
+from PIL import Image
+from reportlab.pdfbase import pdfmetrics
+from reportlab.lib.utils import ImageReader
+
+
+class ZPLCanvas:
+    """
+    Writes ZPL II for Zebra printers through the subset of the ReportLab
+    canvas API that the label generators draw with.
+
+    Coordinates are in points with the origin at the bottom left, exactly as
+    on a ReportLab canvas, and are converted to printer dots with the origin
+    at the top left. Text is placed at its baseline with ^FT and the printer's
+    scalable ^A0 font. Images are downloaded to the printer once per job with
+    ~DG and recalled by name, and order barcodes are encoded by the printer
+    (^BC, ^BX) rather than drawn.
+    """
+
+    def __init__(self, output, pagesize, dpi=203):
+        self.output = output
+        self.dpi = dpi
+        self.page_width, self.page_height = pagesize
+
+        self.font_name = 'Helvetica'
+        self.font_size = 12
+
+        # Commands of the label being drawn, and of the form being recorded (if any)
+        self.commands = []
+        self._form_commands = None
+        self._form_name = None
+        self._forms = {}
+
+        # Graphics stored on the printer in this job: content digest -> graphic name
+        self.graphics = {}
+
+    def dots(self, points):
+        """Convert points to whole printer dots"""
+        return int(round(points * self.dpi / 72.0))
+
+    def _emit(self, command):
+        if self._form_commands is not None:
+            self._form_commands.append(command)
+        else:
+            self.commands.append(command)
+
+    def _write(self, text):
+        self.output.write(text.encode('utf-8'))
+
+    @staticmethod
+    def escape(text):
+        """Escape field data for ^FH so ZPL control characters print literally"""
+        return str(text).replace('\\', '\\5C').replace('^', '\\5E').replace('~', '\\7E')
+
+    def setPageSize(self, size):
+        self.page_width, self.page_height = size
+
+    def setFont(self, font_name, font_size):
+        self.font_name = font_name
+        self.font_size = font_size
+
+    def stringWidth(self, text, font_name=None, font_size=None):
+        """Width in points using the same font metrics as the PDF output, so layout decisions match"""
+        return pdfmetrics.stringWidth(text, font_name or self.font_name, font_size or self.font_size)
+
+    def drawString(self, x, y, text):
+        """Place text with its baseline at (x, y)"""
+        height = self.dots(self.font_size)
+        self._emit(f'^FT{self.dots(x)},{self.dots(self.page_height - y)}'
+                   f'^A0N,{height},{height}^FH\\^FD{self.escape(text)}^FS')
+
+    def _graphic_name(self, img, width_dots, height_dots):
+        """Download a 1-bit graphic to the printer the first time it is used and return its name"""
+        if img.size != (width_dots, height_dots):
+            img = img.resize((width_dots, height_dots), Image.NEAREST)
+
+        # ZPL graphics use 1 for black; threshold so black pixels become set bits and row padding stays white
+        bitmap = img.convert('L').point(lambda v: 255 if v < 128 else 0).convert('1', dither=Image.NONE)
+        data = bitmap.tobytes()
+
+        digest = hashlib.sha1(data + repr(bitmap.size).encode('ascii')).hexdigest()
+        if digest not in self.graphics:
+            name = f'DM{len(self.graphics) + 1:06d}'
+            bytes_per_row = (width_dots + 7) // 8
+            self._write(f'~DGR:{name}.GRF,{len(data)},{bytes_per_row},{data.hex().upper()}\n')
+            self.graphics[digest] = name
+        return self.graphics[digest]
+
+    def drawImage(self, image, x, y, width, height, preserveAspectRatio=False):
+        """Place an image (PIL image or ImageReader) as a stored graphic"""
+        if isinstance(image, ImageReader):
+            image = Image.frombytes('RGB', image.getSize(), image.getRGBData())
+
+        name = self._graphic_name(image, self.dots(width), self.dots(height))
+        top = self.dots(self.page_height - y - height)
+        self._emit(f'^FO{self.dots(x)},{top}^XGR:{name}.GRF,1,1^FS')
+
+    def drawCode128(self, data, module_count, x, y, width, height):
+        """
+        Printer-encoded Code 128 in the width x height box whose bottom-left corner is (x, y).
+
+        module_count is the length of the symbol's module pattern and sets the
+        widest whole-dot module width that fits the box, as in the PDF output.
+        """
+        module_dots = max(self.dots(width) // module_count, 1)
+        top = self.dots(self.page_height - y - height)
+        self._emit(f'^BY{module_dots}^FO{self.dots(x)},{top}'
+                   f'^BCN,{self.dots(height)},N,N,N,A^FH\\^FD{self.escape(data)}^FS')
+
+    def drawDataMatrix(self, data, symbol_size, x, y, size):
+        """Printer-encoded ECC200 DataMatrix of symbol_size modules, centered in the size x size box at (x, y)"""
+        module_dots = max(self.dots(size) // symbol_size, 1)
+        offset = (self.dots(size) - module_dots * symbol_size) // 2
+        top = self.dots(self.page_height - y - size) + offset
+        self._emit(f'^FO{self.dots(x) + offset},{top}'
+                   f'^BXN,{module_dots},200,{symbol_size},{symbol_size}^FH\\^FD{self.escape(data)}^FS')
+
+    def beginForm(self, name):
+        """Record drawing commands under a name instead of placing them"""
+        self._form_name = name
+        self._form_commands = []
+
+    def endForm(self):
+        self._forms[self._form_name] = self._form_commands
+        self._form_name = None
+        self._form_commands = None
+
+    def hasForm(self, name):
+        return name in self._forms
+
+    def doForm(self, name):
+        """Place a recorded form's commands on the current label"""
+        self.commands.extend(self._forms[name])
+
+    def showPage(self, quantity=1):
+        """Finish the current label; the printer prints it quantity times (^PQ)"""
+        if quantity > 1:
+            self.commands.append(f'^PQ{quantity}')
+        self._write(f'^XA^CI28^PW{self.dots(self.page_width)}^LL{self.dots(self.page_height)}^LH0,0'
+                    + ''.join(self.commands) + '^XZ\n')
+        self.commands = []
+
+    def save(self):
+        """Remove this job's graphics from printer memory once every label has printed"""
+        if self.graphics:
+            self._write('^XA' + ''.join(f'^IDR:{name}.GRF' for name in self.graphics.values()) + '^XZ\n')